@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- json_patch.dump_json 의 indent 출력 벤치마크 (기존 재귀 구현 대비)
+- 기존 구현(_legacy_auto_indent, _legacy_partial_indent)을 기준으로 결과가 byte 단위로 같은지 먼저 확인한 뒤 시간 측정
+- pandas 가 설치된 경우 DataFrame 직접 출력과 to_dict('records') 변환 후 출력을 비교
+- 사용법: python benchmarks/bench_json_patch.py [n_items=2000] [repeat=5]
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import decimal
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json_patch
+
+
+###########################################################################################################
+# 기존 구현 (비교 기준)
+###########################################################################################################
+
+
+def _legacy_basic_dump(json_obj, ind=None):
+    return json.dumps(json_obj, ensure_ascii=False, sort_keys=True, cls=json_patch.PatchedJSONEncoder, indent=ind)
+
+
+def _legacy_partial_indent(json_obj, ind=4, max_indent=2, depth=0):
+
+    if (depth >= max_indent) or not json_patch._need_indent(json_obj):
+        return _legacy_basic_dump(json_obj)
+
+    ind_str1 = '\n' + ' ' * ind * depth
+    ind_str2 = '\n' + ' ' * ind * (depth+1)
+
+    if isinstance(json_obj, dict):
+        children = map(lambda k: _legacy_basic_dump(k)+': '+_legacy_partial_indent(json_obj[k], ind, max_indent, depth+1), sorted(json_obj))
+        return ''.join(('{', ind_str2, (','+ind_str2).join(children), ind_str1, '}'))
+    else: # list, tuple
+        children = map(lambda x: _legacy_partial_indent(x, ind, max_indent, depth+1), json_obj)
+        return ''.join(('[', ind_str2, (','+ind_str2).join(children), ind_str1, ']'))
+
+
+def _legacy_auto_indent(json_obj, ind=4, depth=0):
+
+    def need_auto_indent(json_obj):
+        if not json_patch._need_indent(json_obj):
+            return False
+        if isinstance(json_obj, dict):
+            return any(map(json_patch._need_indent, json_obj.values()))
+        return any(map(json_patch._need_indent, json_obj))
+
+    if not need_auto_indent(json_obj):
+        return _legacy_basic_dump(json_obj)
+
+    ind_str1 = '\n' + ' ' * ind * depth
+    ind_str2 = '\n' + ' ' * ind * (depth+1)
+    comma_str = ','+ind_str2
+
+    if isinstance(json_obj, dict):
+        children = map(lambda k: _legacy_basic_dump(k)+': '+_legacy_auto_indent(json_obj[k], ind, depth+1), sorted(json_obj))
+        return ''.join(('{', ind_str2, comma_str.join(children), ind_str1, '}'))
+    else: # list, tuple
+        children = map(lambda x: _legacy_auto_indent(x, ind, depth+1), json_obj)
+        return ''.join(('[', ind_str2, comma_str.join(children), ind_str1, ']'))
+
+
+def legacy_dump_json(json_obj, ind=None, max_indent=0):
+    '''변경 전 json_patch.dump_json'''
+
+    if isinstance(ind, int):
+        if (ind <= 0):
+            ind = None
+    elif isinstance(ind, str):
+        ind = 4 if ind == '\t' else len(ind)
+    else:
+        ind = None
+
+    if (ind == None) or (max_indent == 0):
+        return _legacy_basic_dump(json_obj, ind)
+    if max_indent == 'auto':
+        return _legacy_auto_indent(json_obj, ind)
+    return _legacy_partial_indent(json_obj, ind, max_indent)
+
+
+###########################################################################################################
+# 데이터
+###########################################################################################################
+
+
+_TEXTS = ['삼성전자', '"인용", 부호', 'a:b', '줄\n바꿈\t탭', '\\역슬래시', '\x01제어', 'emoji 😀', '', 'plain']
+
+
+def make_news(n_items, seed=0):
+    '''뉴스/이슈 조회 결과와 비슷한 중첩 구조'''
+
+    rnd = random.Random(seed)
+    return {
+        'date': '2021-10-01',
+        'count': n_items,
+        'items': [{
+            'STOCK': rnd.choice(_TEXTS) + str(i),
+            'CMP_CD': '%06d' % rnd.randrange(1000000),
+            'ISSUE': round(rnd.uniform(0, 100), 4),
+            'rank': i,
+            'has_news': rnd.random() < 0.5,
+            'memo': None,
+            'tags': [rnd.choice(_TEXTS) for _ in range(rnd.randrange(4))],
+            'scores': {'d%d' % d: rnd.randrange(100) for d in range(rnd.randrange(5))},
+            'history': [{'day': d, 'score': rnd.randrange(100), 'title': rnd.choice(_TEXTS)} for d in range(rnd.randrange(3))],
+        } for i in range(n_items)],
+    }
+
+
+def make_random(depth, seed):
+    '''동일성 검사용 임의 트리 (Decimal, datetime, float 특수값, 정수 key, 큰 정수 포함)'''
+
+    rnd = random.Random(seed)
+
+    def leaf():
+        return rnd.choice([
+            rnd.randrange(-10**6, 10**6), 2**70, rnd.random(), 1e16, 1e-7, float('nan'), float('inf'),
+            True, False, None, rnd.choice(_TEXTS), decimal.Decimal('1.5'), datetime(2021, 10, 1, 9, 30),
+            [], {}, (),
+        ])
+
+    def node(d):
+        if d == 0 or rnd.random() < 0.3:
+            return leaf()
+        n = rnd.randrange(4)
+        kind = rnd.random()
+        if kind < 0.4:
+            return [node(d - 1) for _ in range(n)]
+        if kind < 0.5:
+            return tuple(node(d - 1) for _ in range(n))
+        if kind < 0.6:
+            return {rnd.randrange(100): node(d - 1) for _ in range(n)}
+        return {rnd.choice(_TEXTS) + str(rnd.randrange(10)): node(d - 1) for _ in range(n)}
+
+    return node(depth)
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+_OPTIONS = [(4, 'auto'), ('\t', 'auto'), (2, 1), (4, 2), (4, 3), (4, 0), (None, 'auto')]
+
+
+def make_frame(n_rows, seed=0):
+    '''match_issue_score 결과와 비슷한 DataFrame (NaN, NaT 포함)'''
+
+    import numpy as np
+    import pandas as pd
+
+    rnd = np.random.default_rng(seed)
+    df = pd.DataFrame({
+        'WRITE_DT': pd.Timestamp('2021-10-01') + pd.to_timedelta(rnd.integers(0, 86400, n_rows), unit='s'),
+        'STOCK': ['종목%d' % i for i in range(n_rows)],
+        'CMP_CD': ['%06d' % i for i in range(n_rows)],
+        'ISSUE': rnd.uniform(0, 100, n_rows),
+        'total_rank': np.arange(1, n_rows + 1),
+        'HAS_NEWS': rnd.random(n_rows) < 0.5,
+    })
+    df.loc[df.index[::7], 'ISSUE'] = np.nan
+    df.loc[df.index[::11], 'WRITE_DT'] = pd.NaT
+    return df
+
+
+def check_identical(n_trees=500):
+    '''기존 구현과 byte 단위로 같은 결과인지 확인, 다른 경우 AssertionError'''
+
+    objs = [make_news(50, seed=1)] + [make_random(6, seed) for seed in range(n_trees)]
+    for obj in objs:
+        for ind, max_indent in _OPTIONS:
+            expected = legacy_dump_json(obj, ind, max_indent)
+            actual = json_patch.dump_json(obj, ind, max_indent)
+            assert actual == expected, (ind, max_indent, obj)
+    return len(objs) * len(_OPTIONS)
+
+
+def _best(func, repeat):
+    times = []
+    for _ in range(repeat):
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+    return min(times)
+
+
+def main(argv):
+    n_items = int(argv[1]) if len(argv) > 1 else 2000
+    repeat = int(argv[2]) if len(argv) > 2 else 5
+
+    print('identical:   %d cases' % check_identical())
+
+    obj = make_news(n_items)
+    size = len(json_patch.dump_json(obj, 4, 'auto').encode('utf8'))
+    print('data:        %d items, %.1f KB (indent 4, auto)' % (n_items, size / 1024))
+
+    for ind, max_indent in [(4, 'auto'), (4, 2)]:
+        legacy = _best(lambda: legacy_dump_json(obj, ind, max_indent), repeat)
+        single = _best(lambda: json_patch.dump_json(obj, ind, max_indent), repeat)
+        print('max_indent=%-5s legacy %8.2f ms   single-pass %8.2f ms (x%.1f)' % (
+            max_indent, legacy * 1000, single * 1000, legacy / single))
+
+    try:
+        df = make_frame(n_items * 50)
+    except ImportError:
+        return 0
+    for orient in ('records', 'columns'):
+        py = json_patch._array_to_python(df, orient)
+        assert json_patch.dump_json(df, 4, 'auto', orient=orient) == json_patch.dump_json(py, 4, 'auto', orient=orient)
+        converted = _best(lambda: json_patch.dump_json(df.to_dict(orient='records' if orient == 'records' else 'list'),
+                                                       4, 'auto', orient=orient), repeat)
+        direct = _best(lambda: json_patch.dump_json(df, 4, 'auto', orient=orient), repeat)
+        print('frame %d rows, orient=%-8s to_dict %8.2f ms   direct %8.2f ms (x%.1f)' % (
+            len(df), orient, converted * 1000, direct * 1000, converted / direct))
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
@@ -0,0 +1,135 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- json_patch.load_json 의 잘못된 escape 수정 처리량 벤치마크 (기존 반복 re.search 구현 대비)
+- 잘못된 escape(윈도우 경로, 정규식, 불완전한 \\u 등)와 제어문자가 섞인 뉴스 payload 를 생성
+- 기존 구현으로 파싱되는 입력은 결과가 같은지 먼저 확인한 뒤 크기별 처리량(MB/s) 측정
+- 사용법: python benchmarks/bench_load_json.py [max_items=20000] [legacy_max_items=2000]
+'''
+
+import os
+import re
+import sys
+import json
+import time
+import random
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import json_patch
+
+
+###########################################################################################################
+# 기존 구현 (비교 기준)
+###########################################################################################################
+
+
+def _legacy_remove_invalid_escape(text):
+
+    text = text.replace('\b', '')
+
+    while True:
+        m = re.search(r'[^\\](?:\\\\)*(\\)[^\\"/bfnrtu]', text)
+        if not m or not m.groups():
+            break
+        text = text[:m.start(1)]+'\\\\'+text[m.end(1):]
+
+    return text
+
+
+def legacy_load_json(json_str):
+    '''변경 전 json_patch.load_json'''
+
+    try:
+        return json.loads(json_str)
+    except:
+        return json.loads(_legacy_remove_invalid_escape(json_str))
+
+
+###########################################################################################################
+# 데이터
+###########################################################################################################
+
+
+_BAD = ['C:\\data\\news', '\\d+원', '주가\\상승', '\\xff', '\\', '\\\\\\k', '\\a\\c']
+_GOOD = ['\\n', '\\"', '\\\\', '\\u0041', '\\t', '\\/']
+
+
+def make_payload(n_items, seed=0, bad_ratio=0.3, control=False):
+    '''뉴스 목록 JSON 문자열 (raw escape 를 직접 삽입)'''
+
+    rnd = random.Random(seed)
+    items = []
+    for i in range(n_items):
+        title = '삼성전자 이슈 %d ' % i
+        if rnd.random() < bad_ratio:
+            title += rnd.choice(_BAD) + ' '
+        title += rnd.choice(_GOOD)
+        if control and rnd.random() < 0.1:
+            title += '\t줄\n바꿈\b'
+        items.append('{"title": "%s", "score": %d}' % (title, rnd.randrange(100)))
+    return '{"items": [%s]}' % ', '.join(items)
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+def check_identical(n_payloads=300):
+    '''기존 구현이 파싱하는 입력은 결과가 같은지 확인 (기존 구현이 실패하는 입력은 새 구현에서 파싱되는지만 확인)'''
+
+    checked = fixed = 0
+    for seed in range(n_payloads):
+        for text in (make_payload(20, seed), make_payload(20, seed, bad_ratio=0), make_payload(20, seed, control=True),
+                     '"\\u12 \\u004G"', '["a\\', '{"a": "\\\\\\x"}'):
+            try:
+                expected = legacy_load_json(text)
+            except ValueError:
+                try:
+                    json_patch.load_json(text)
+                    fixed += 1
+                except ValueError:
+                    pass
+                continue
+            assert json_patch.load_json(text) == expected, text
+            checked += 1
+    return checked, fixed
+
+
+def _throughput(func, text, min_time=0.2):
+    n = 0
+    t0 = time.perf_counter()
+    while True:
+        func(text)
+        n += 1
+        elapsed = time.perf_counter() - t0
+        if elapsed >= min_time:
+            return len(text.encode('utf8')) * n / elapsed / 1024 / 1024
+
+
+def main(argv):
+    max_items = int(argv[1]) if len(argv) > 1 else 20000
+    legacy_max_items = int(argv[2]) if len(argv) > 2 else 2000
+
+    checked, fixed = check_identical()
+    print('identical:   %d payloads (%d more parsed only by the new engine)' % (checked, fixed))
+
+    n_items = 200
+    while n_items <= max_items:
+        text = make_payload(n_items)
+        n_bad = len(text) - len(text.replace('\\', ''))
+        line = '%6d items %8.1f KB %6d backslashes' % (n_items, len(text.encode('utf8')) / 1024, n_bad)
+        if n_items <= legacy_max_items:
+            line += '   legacy %8.2f MB/s' % _throughput(legacy_load_json, text)
+        else:
+            line += '   legacy %8s     ' % '-'
+        line += '   new %8.2f MB/s' % _throughput(json_patch.load_json, text)
+        print(line)
+        n_items *= 10
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
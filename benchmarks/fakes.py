@@ -0,0 +1,164 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 벤치마크용 fake DB 드라이버 (운영 DB 없이 실행)
+    - cx_Oracle:          makedsn / connect / cursor(execute, fetchall, description)
+    - clickhouse_driver:  Client(execute(SELECT 1 / EXISTS TABLE / LIMIT 0 / DESC), query_dataframe, insert_dataframe)
+- install() 은 repo 모듈을 import 하기 전에 호출해야 함
+  (oracle_client / clickhouse_client 는 드라이버를 lazy_import 하므로 sys.modules 의 fake 를 사용)
+- 조회 결과는 FakeData 에 지정한 데이터를 반환
+- ClickHouse host 별로 장애(down_hosts), insert 행 수(inserted), insert 지연(insert_latency)을 흉내냄
+  (여러 host / shard 에 대한 failover, sharding 확인용)
+'''
+
+import re
+import sys
+import time
+import types
+import threading
+
+
+class FakeData(object):
+    '''fake 드라이버가 반환할 데이터'''
+
+    # Oracle: (컬럼명 목록, 행 tuple 목록)
+    oracle_columns = []
+    oracle_rows = []
+
+    # ClickHouse: stock_master 최근 date 스냅샷 / 종목명 -> 과거 stock_master 행(dict)
+    stock_master = None
+    stock_history = {}
+
+    # ClickHouse: 테이블명 -> [(컬럼명, 타입)]
+    tables = {}
+
+    # ClickHouse 서버: 응답하지 않는 host, host 별 insert 행 수, insert 1회당 지연시간(초, 네트워크 대기)
+    down_hosts = set()
+    inserted = {}
+    insert_latency = 0.0
+
+
+###########################################################################################################
+# cx_Oracle
+###########################################################################################################
+
+
+class _LOB(object):
+
+    def __init__(self, text):
+        self.text = text
+
+    def read(self):
+        return self.text
+
+
+class _OracleCursor(object):
+
+    def __init__(self):
+        self.description = None
+        self._rows = []
+
+    def execute(self, query):
+        self.description = [(x,) for x in FakeData.oracle_columns]
+        self._rows = FakeData.oracle_rows if query.strip().lower().startswith('select') else []
+
+    def fetchall(self):
+        return list(self._rows)
+
+    def close(self):
+        pass
+
+
+class _OracleConnection(object):
+
+    def cursor(self):
+        return _OracleCursor()
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+
+def _make_cx_oracle():
+    module = types.ModuleType('cx_Oracle')
+    module.LOB = _LOB
+    module.CLOB = _LOB
+    module.DatabaseError = type('DatabaseError', (Exception,), {})
+    module.makedsn = lambda ip, port, db=None, service_name=None: f'{ip}:{port}/{db or service_name}'
+    module.connect = lambda user, password, dsn, threaded=True: _OracleConnection()
+    return module
+
+
+###########################################################################################################
+# clickhouse_driver
+###########################################################################################################
+
+
+_LOOKUP_NAME = re.compile(r"CMP_NM_KOR\s*==\s*'(.*)'")
+_EXISTS_TABLE = re.compile(r'EXISTS\s+TABLE\s+([\w.]+)', re.I)
+_TABLE_NAME = re.compile(r'(?:FROM|DESC)\s+([\w.]+)', re.I)
+
+
+_insert_lock = threading.Lock()
+
+
+class _ClickHouseClient(object):
+
+    def __init__(self, host='', port=None, user='default', password='', database='', settings=None):
+        self.host = f'{host}:{port}' if port else host
+        self.database = database
+        self.inserted = 0
+
+    def _check_host(self):
+        if self.host in FakeData.down_hosts:
+            raise ConnectionError(f'Code: 210. Connection refused ({self.host})')
+
+    def execute(self, query, params=None, with_column_types=False, settings=None):
+        self._check_host()
+        if query.strip().upper() == 'SELECT 1':
+            return [(1,)]
+        m = _EXISTS_TABLE.match(query.strip())
+        if m:
+            return [(int(m.group(1).split('.')[-1] in FakeData.tables),)]
+        m = _TABLE_NAME.search(query)
+        table = m.group(1).split('.')[-1] if m else ''
+        if table not in FakeData.tables:
+            raise Exception(f'Table {table} doesn\'t exist')
+        if query.strip().upper().startswith('DESC'):
+            return [(name, kind, '', '', '', '', '') for name, kind in FakeData.tables[table]]
+        return [], FakeData.tables[table]
+
+    def query_dataframe(self, query):
+        import pandas as pd
+
+        self._check_host()
+        m = _LOOKUP_NAME.search(query)
+        if m:
+            row = FakeData.stock_history.get(m.group(1))
+            return pd.DataFrame([row] if row else [], columns=list(FakeData.stock_master.columns))
+        return FakeData.stock_master.copy()
+
+    def insert_dataframe(self, query, df):
+        self._check_host()
+        if FakeData.insert_latency:
+            time.sleep(FakeData.insert_latency)
+        self.inserted += len(df)
+        with _insert_lock:
+            FakeData.inserted[self.host] = FakeData.inserted.get(self.host, 0) + len(df)
+        return len(df)
+
+
+def _make_clickhouse_driver():
+    module = types.ModuleType('clickhouse_driver')
+    module.Client = _ClickHouseClient
+    return module
+
+
+def install():
+    '''fake cx_Oracle / clickhouse_driver 를 sys.modules 에 등록'''
+
+    sys.modules['cx_Oracle'] = _make_cx_oracle()
+    sys.modules['clickhouse_driver'] = _make_clickhouse_driver()
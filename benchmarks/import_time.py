@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 모듈 import 시간 벤치마크 (python -X importtime 기반)
+- 모듈별 cumulative import 시간이 budget(ms) 을 넘거나, import 시점에 무거운 모듈
+  (pandas, numpy, DB 드라이버)이 실제로 로딩되면 실패(exit code 1)
+- 사용법: python benchmarks/import_time.py [repeat]
+'''
+
+import os
+import sys
+import subprocess
+
+
+_REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+
+# 모듈별 import 시간 budget (ms)
+IMPORT_BUDGET_MS = {
+    'json_patch': 40,
+    'config': 50,
+    'instrumentation': 50,
+    'oracle_client.db_client': 80,
+    'oracle_client.db_client_for_stock_news': 80,
+    'clickhouse_client.clickhouse_reader': 80,
+    'clickhouse_client.clickhouse_writer': 80,
+    'issue_stock': 100,
+    'issue_score_processing': 120,
+}
+
+# import 시점에 로딩되면 안되는 모듈
+HEAVY_MODULES = ('pandas', 'numpy', 'clickhouse_driver', 'clickhouse_sqlalchemy', 'cx_Oracle', 'pymysql')
+
+_CHECK_LOADED = '''
+import sys
+import lazy_import
+import {module}
+print(','.join(x for x in {heavy!r} if lazy_import.is_loaded(x)))
+'''
+
+
+def measure(module):
+    '''(cumulative import 시간 ms, import 시점에 로딩된 무거운 모듈 목록)'''
+
+    proc = subprocess.run([sys.executable, '-X', 'importtime', '-c', _CHECK_LOADED.format(module=module, heavy=HEAVY_MODULES)],
+                          cwd=_REPO_DIR, capture_output=True, text=True)
+    if proc.returncode != 0:
+        raise RuntimeError(f'import {module} failed\n{proc.stderr}')
+
+    cumulative_us = None
+    for line in proc.stderr.splitlines():
+        if not line.startswith('import time:'):
+            continue
+        _, _, rest = line.partition(':')
+        parts = [x.strip() for x in rest.split('|')]
+        if len(parts) == 3 and parts[2] == module:
+            cumulative_us = int(parts[1])
+    loaded = [x for x in proc.stdout.strip().split(',') if x]
+    return (cumulative_us or 0) / 1000.0, loaded
+
+
+def main(argv):
+    repeat = int(argv[1]) if len(argv) > 1 else 5
+    failed = False
+
+    print('%-45s %10s %10s  %s' % ('module', 'best(ms)', 'budget', 'heavy modules loaded'))
+    for module, budget in IMPORT_BUDGET_MS.items():
+        results = [measure(module) for _ in range(repeat)]
+        best = min(x[0] for x in results)
+        loaded = results[-1][1]
+        over = best > budget or loaded
+        failed = failed or over
+        print('%-45s %10.1f %10d  %s%s' % (module, best, budget, ','.join(loaded) or '-', '  <== FAIL' if over else ''))
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
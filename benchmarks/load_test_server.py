@@ -0,0 +1,173 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- issue_server 부하 테스트 (운영 DB 없이 로컬 fake 데이터 소스 사용)
+- 서버는 별도 프로세스로 띄우고, asyncio 클라이언트가 keep-alive 연결로 요청을 보냄
+- 결과: 처리량(req/s), 지연시간 p50/p90/p99/max, 상태코드별 건수, 서버 통계(/health)
+- 사용법: python benchmarks/load_test_server.py [requests=5000] [concurrency=50] [--latency=0.05]
+    --latency: fake 데이터 소스의 조회 지연(초), Oracle 조회 시간을 흉내냄
+'''
+
+import os
+import sys
+import time
+import json
+import random
+import asyncio
+import multiprocessing
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+
+N_STOCKS = 2500
+DAYS = ['2021-10-%02d' % x for x in range(1, 21)]
+
+
+class FakeIssueSource(object):
+    '''issue_data_source.DirectSource 와 같은 인터페이스의 결정적(deterministic) fake 데이터'''
+
+    def __init__(self, n_stocks=N_STOCKS, latency=0.0):
+        self.n_stocks = n_stocks
+        self.latency = latency
+        self.queries = 0
+
+    def get_daily_issue_stocks(self, day):
+        self._wait()
+        rnd = random.Random(day)
+        return [{'WRITE_DT': day, 'STOCK': '종목%d' % i, 'ISSUE': round(rnd.uniform(0, 100), 4)}
+                for i in rnd.sample(range(self.n_stocks), self.n_stocks // 3)]
+
+    def get_issue_stocks_by_date(self, start_day, end_day):
+        return [row for day in DAYS if start_day <= day <= end_day for row in self.get_daily_issue_stocks(day)]
+
+    def get_issue_rank(self, day):
+        return []
+
+    def get_stock_master(self):
+        import pandas as pd
+
+        self._wait()
+        return pd.DataFrame({
+            'CMP_NM_KOR': ['종목%d' % i for i in range(self.n_stocks)],
+            'CMP_CD': ['%06d' % i for i in range(self.n_stocks)],
+            'analysis_filter': ['1' if i % 10 else '0' for i in range(self.n_stocks)],
+            'market': ['KOSPI' if i % 2 else 'KOSDAQ' for i in range(self.n_stocks)],
+        })
+
+    def _wait(self):
+        self.queries += 1
+        if self.latency:
+            time.sleep(self.latency)
+
+
+def _run_server(port, latency, ready):
+    import logging
+    from issue_server import IssueServer
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.WARNING)
+
+    async def main():
+        server = await IssueServer(source=FakeIssueSource(latency=latency), port=port).start()
+        ready.put(server.port)
+        await server.serve_forever()
+
+    asyncio.run(main())
+
+
+def _make_paths(n, seed=0):
+    rnd = random.Random(seed)
+    paths = []
+    for _ in range(n):
+        day = rnd.choice(DAYS)
+        kind = rnd.random()
+        if kind < 0.6:
+            paths.append('/score?stock=%s&day=%s' % ('%EC%A2%85%EB%AA%A9' + str(rnd.randrange(N_STOCKS)), day))
+        elif kind < 0.85:
+            stocks = ','.join('%06d' % rnd.randrange(N_STOCKS) for _ in range(50))
+            paths.append('/scores?stocks=%s&day=%s' % (stocks, day))
+        else:
+            paths.append('/top?n=10&day=%s&market=%s' % (day, rnd.choice(['', 'KOSPI', 'KOSDAQ'])))
+    return paths
+
+
+async def _client(port, paths, latencies, statuses, etags):
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        for path in paths:
+            headers = 'Host: localhost\r\n'
+            if path in etags:
+                headers += 'If-None-Match: %s\r\n' % etags[path]
+            t0 = time.perf_counter()
+            writer.write(('GET %s HTTP/1.1\r\n%s\r\n' % (path, headers)).encode('latin-1'))
+            await writer.drain()
+
+            status_line = await reader.readline()
+            length = 0
+            while True:
+                line = await reader.readline()
+                if line in (b'\r\n', b''):
+                    break
+                key, _, value = line.decode('latin-1').partition(':')
+                if key.lower() == 'content-length':
+                    length = int(value)
+                elif key.lower() == 'etag':
+                    etags[path] = value.strip()
+            if length:
+                await reader.readexactly(length)
+
+            latencies.append(time.perf_counter() - t0)
+            status = int(status_line.split()[1])
+            statuses[status] = statuses.get(status, 0) + 1
+    finally:
+        writer.close()
+
+
+async def _load(port, n_requests, concurrency):
+    paths = _make_paths(n_requests)
+    latencies, statuses, etags = [], {}, {}
+    chunks = [paths[i::concurrency] for i in range(concurrency)]
+
+    t0 = time.perf_counter()
+    await asyncio.gather(*[_client(port, x, latencies, statuses, etags) for x in chunks])
+    elapsed = time.perf_counter() - t0
+
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    writer.write(b'GET /health HTTP/1.0\r\n\r\n')
+    health = (await reader.read()).split(b'\r\n\r\n', 1)[1]
+    writer.close()
+    return elapsed, sorted(latencies), statuses, json.loads(health.decode('utf8'))
+
+
+def _percentile(values, p):
+    return values[min(len(values) - 1, int(len(values) * p))]
+
+
+def main(argv):
+    args = [x for x in argv[1:] if not x.startswith('--')]
+    opts = dict(x[2:].partition('=')[::2] for x in argv[1:] if x.startswith('--'))
+    n_requests = int(args[0]) if len(args) > 0 else 5000
+    concurrency = int(args[1]) if len(args) > 1 else 50
+    latency = float(opts.get('latency', 0.05))
+
+    ready = multiprocessing.Queue()
+    proc = multiprocessing.Process(target=_run_server, args=(0, latency, ready), daemon=True)
+    proc.start()
+    try:
+        port = ready.get(timeout=30)
+        elapsed, latencies, statuses, health = asyncio.run(_load(port, n_requests, concurrency))
+    finally:
+        proc.terminate()
+        proc.join()
+
+    print('requests:    %d (concurrency %d, source latency %.3fs)' % (len(latencies), concurrency, latency))
+    print('throughput:  %.1f req/s' % (len(latencies) / elapsed))
+    print('latency ms:  p50 %.2f  p90 %.2f  p99 %.2f  max %.2f' % tuple(
+        x * 1000 for x in (_percentile(latencies, 0.5), _percentile(latencies, 0.9), _percentile(latencies, 0.99), latencies[-1])))
+    print('status:      %s' % ', '.join('%d=%d' % x for x in sorted(statuses.items())))
+    print('server:      %s' % health['stats'])
+    return 0 if set(statuses) <= {200, 304} else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
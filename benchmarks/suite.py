@@ -0,0 +1,402 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 주요 처리 함수 벤치마크 모음 (asv 방식: 파라미터 조합별 측정 -> 이력 저장 -> 이전 결과 대비 회귀 검사)
+    - match_issue_score / match_issue_score_lean: 이슈 행 수 x stock_master 행 수 x 매칭 실패 종목 비율
+    - check_nan: 매칭 실패 종목의 과거 stock_master 조회 및 채움
+    - write_clickhouse: ClickHouseWriter.write_clickhouse (chunk 단위 insert, shard 수별 동시 insert)
+    - oracle_get: OracleClient._get 결과 materialize (_kv_to_dict)
+    - dump_json: json_patch.dump_json (list of dict / DataFrame, indent 유무)
+- DB 드라이버는 benchmarks/fakes.py 의 fake 를 사용하므로 운영 DB 없이 실행
+- 측정값은 파라미터 조합별 최소/중간값(ms), 결과는 history 파일(jsonl)에 한 줄씩 추가
+- 같은 host 의 최근 --baseline 회 결과(최소값의 중간값) 대비 --threshold 비율 이상 느려진 항목이 있으면 실패(exit code 1)
+  (--min-delta ms 이하의 차이는 측정 오차로 보고 무시)
+- 사용법: python benchmarks/suite.py [--quick] [--filter=이름] [--history=path] [--threshold=0.2]
+                                    [--min-delta=1.0] [--baseline=5] [--no-save] [--list]
+'''
+
+import os
+import sys
+import json
+import time
+import random
+import socket
+import logging
+import statistics
+import subprocess
+from datetime import datetime
+
+sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
+
+import fakes
+
+# repo 모듈이 드라이버를 import 하기 전에 fake 등록
+fakes.install()
+
+import json_patch
+import instrumentation
+import issue_score_processing
+from oracle_client.db_client import OracleClient
+from clickhouse_client.clickhouse_reader import ClickHouseReader
+from clickhouse_client.clickhouse_writer import ClickHouseWriter
+
+
+_REPO_DIR = os.path.abspath(os.path.join(os.path.dirname(__file__), '..'))
+DEFAULT_HISTORY = os.path.join(_REPO_DIR, 'benchmarks', 'results', 'history.jsonl')
+
+# 조합별 측정 시간 budget (초) 및 반복 횟수 범위
+TIME_BUDGET = 1.0
+MIN_REPEAT = 3
+MAX_REPEAT = 50
+
+
+###########################################################################################################
+# 벤치마크 등록
+###########################################################################################################
+
+
+_BENCHMARKS = []
+
+
+def benchmark(name, quick=None, **params):
+    '''벤치마크 등록 decorator
+    - 함수는 파라미터를 keyword 인자로 받아 데이터를 준비한 뒤, 측정할 인자 없는 함수를 반환
+    - params: 파라미터명 -> 값 목록 (모든 조합을 측정), quick: --quick 일 때 사용할 params 일부
+    '''
+
+    def register(setup):
+        _BENCHMARKS.append((name, setup, params, quick or {}))
+        return setup
+    return register
+
+
+def _combinations(params):
+    combos = [{}]
+    for key, values in params.items():
+        combos = [dict(c, **{key: v}) for c in combos for v in values]
+    return combos
+
+
+def _case_name(name, params):
+    if not params:
+        return name
+    return name + '[' + ','.join(f'{k}={v}' for k, v in params.items()) + ']'
+
+
+###########################################################################################################
+# 데이터
+###########################################################################################################
+
+
+_CHARS = '가나다라마바사아자차카타파하전자화학바이오제약금융'
+
+
+def make_stock_master(n_rows, seed=0):
+    '''stock_master 최근 date 스냅샷과 비슷한 DataFrame (종목명 일부는 띄어쓰기 포함)'''
+
+    import pandas as pd
+
+    rnd = random.Random(seed)
+    names = []
+    for i in range(n_rows):
+        name = ''.join(rnd.choice(_CHARS) for _ in range(rnd.randrange(2, 6))) + str(i)
+        if rnd.random() < 0.1:
+            name = name[:2] + ' ' + name[2:]
+        names.append(name)
+    return pd.DataFrame({
+        'CMP_NM_KOR': names,
+        'CMP_CD': ['%06d' % i for i in range(n_rows)],
+        'analysis_filter': [rnd.choice('1110') for _ in range(n_rows)],
+        'date': '2021-10-01',
+        'market': [rnd.choice(('KOSPI', 'KOSDAQ')) for _ in range(n_rows)],
+    })
+
+
+def make_issue_score(n_rows, stock_master, unmatched=0.0, seed=0):
+    '''get_issue_score 결과와 비슷한 DataFrame
+    - unmatched 비율만큼 stock_master 에 없는 종목명 사용 (그 중 절반은 과거 stock_master 이력에 존재)
+    - 과거 이력 종목명 -> stock_master 행(dict) 을 함께 반환
+    '''
+
+    import pandas as pd
+
+    rnd = random.Random(seed)
+    master_names = stock_master['CMP_NM_KOR'].tolist()
+    history = {}
+    stocks = []
+    for i in range(n_rows):
+        if rnd.random() < unmatched:
+            name = f'상장폐지{i}'
+            if i % 2 == 0:
+                history[name] = {'CMP_NM_KOR': name, 'CMP_CD': 'H%05d' % i, 'analysis_filter': '1',
+                                 'date': '2020-01-02', 'market': 'KOSDAQ'}
+        else:
+            name = rnd.choice(master_names).replace(' ', '')
+        stocks.append(name)
+    df = pd.DataFrame({
+        'WRITE_DT': '2021-10-01',
+        'STOCK': stocks,
+        'ISSUE': ['%.4f' % rnd.uniform(0, 100) for _ in range(n_rows)],
+    })
+    return df, history
+
+
+def _set_stock_master(stock_master, history):
+    fakes.FakeData.stock_master = stock_master
+    fakes.FakeData.stock_history = history
+    issue_score_processing.set_sources(stock_master_reader=lambda: ClickHouseReader(host='fake', database='web_service_data'))
+
+
+###########################################################################################################
+# 벤치마크
+###########################################################################################################
+
+
+_ISSUE_ROWS = [100, 1000, 10000]
+_MASTER_ROWS = [2500, 25000]
+_UNMATCHED = [0.0, 0.1, 0.3]
+_QUICK_MATCH = {'issue_rows': [1000], 'master_rows': [2500], 'unmatched': [0.1]}
+
+
+@benchmark('match_issue_score', issue_rows=_ISSUE_ROWS, master_rows=_MASTER_ROWS, unmatched=_UNMATCHED, quick=_QUICK_MATCH)
+def bench_match_issue_score(issue_rows, master_rows, unmatched):
+    smd = make_stock_master(master_rows)
+    isd, history = make_issue_score(issue_rows, smd, unmatched)
+    _set_stock_master(smd, history)
+    return lambda: issue_score_processing.match_issue_score(isd, smd, lean=False)
+
+
+@benchmark('match_issue_score_lean', issue_rows=_ISSUE_ROWS, master_rows=_MASTER_ROWS, unmatched=_UNMATCHED, quick=_QUICK_MATCH)
+def bench_match_issue_score_lean(issue_rows, master_rows, unmatched):
+    smd = make_stock_master(master_rows)
+    isd, history = make_issue_score(issue_rows, smd, unmatched)
+    _set_stock_master(smd, history)
+    return lambda: issue_score_processing.match_issue_score(isd, smd, lean=True)
+
+
+@benchmark('check_nan', issue_rows=_ISSUE_ROWS, unmatched=[0.1, 0.3], quick={'issue_rows': [1000], 'unmatched': [0.1]})
+def bench_check_nan(issue_rows, unmatched):
+    smd = make_stock_master(2500)
+    isd, history = make_issue_score(issue_rows, smd, unmatched)
+    _set_stock_master(smd, history)
+
+    # match_issue_score 와 같은 전처리 후 join 결과 (check_nan 이 join_df 를 수정하므로 매번 복사)
+    isd = isd.copy()
+    isd['NAME'] = isd['STOCK'].str.replace(' ', '')
+    isd.set_index('NAME', inplace=True)
+    smd = smd[['CMP_NM_KOR', 'CMP_CD', 'analysis_filter', 'date']].copy()
+    smd['NAME'] = smd['CMP_NM_KOR'].str.replace(' ', '')
+    smd.set_index('NAME', inplace=True)
+    join_df = isd.join(smd)
+    return lambda: issue_score_processing.check_nan(isd, smd, join_df.copy())
+
+
+@benchmark('write_clickhouse', rows=[100, 1000, 10000], quick={'rows': [1000]})
+def bench_write_clickhouse(rows):
+    smd = make_stock_master(2500)
+    isd, _ = make_issue_score(rows, smd)
+    df = issue_score_processing.match_issue_score(isd, smd, lean=False)
+    fakes.FakeData.tables['issue_score'] = [(x, 'String') for x in ('WRITE_DT', 'STOCK', 'ISSUE', 'CMP_CD')]
+    writer = ClickHouseWriter(host='fake', database='somemoney_data')
+    return lambda: writer.write_clickhouse('issue_score', df, chunksize=1000)
+
+
+@benchmark('write_clickhouse_sharded', shards=[1, 2, 4], quick={'shards': [2]})
+def bench_write_clickhouse_sharded(shards):
+    # insert 1회당 2ms 네트워크 대기를 가정, shard 별 insert 는 동시에 실행
+    smd = make_stock_master(2500)
+    isd, _ = make_issue_score(10000, smd)
+    df = issue_score_processing.match_issue_score(isd, smd, lean=False)
+    fakes.FakeData.tables['issue_score'] = [(x, 'String') for x in ('WRITE_DT', 'STOCK', 'ISSUE', 'CMP_CD')]
+    fakes.FakeData.tables['issue_score_local'] = fakes.FakeData.tables['issue_score']
+    writer = ClickHouseWriter(host='fake', database='somemoney_data', local_table_suffix='_local',
+                              shards=' | '.join(f'shard{i}a,shard{i}b' for i in range(shards)))
+
+    def run():
+        fakes.FakeData.insert_latency = 0.002
+        try:
+            writer.write_clickhouse('issue_score', df, chunksize=500)
+        finally:
+            fakes.FakeData.insert_latency = 0.0
+    return run
+
+
+@benchmark('oracle_get', rows=[1000, 10000], quick={'rows': [1000]})
+def bench_oracle_get(rows):
+    rnd = random.Random(0)
+    fakes.FakeData.oracle_columns = ['WRITE_DT', 'STOCK', 'ISSUE', 'TITLE', 'REG_DT']
+    fakes.FakeData.oracle_rows = [('2021-10-01', f'종목{i}', rnd.uniform(0, 100), '이슈 제목 %d' % i, datetime(2021, 10, 1, 9, 30))
+                                  for i in range(rows)]
+    client = OracleClient({'ip': 'fake', 'port': 1521, 'db': 'fake', 'user': 'fake', 'password': ''})
+    return lambda: list(client._get('SELECT * FROM nv_issue_score'))
+
+
+@benchmark('dump_json', data=['records', 'frame'], rows=[1000, 10000], indent=['none', 'auto'],
+           quick={'data': ['records', 'frame'], 'rows': [1000], 'indent': ['auto']})
+def bench_dump_json(data, rows, indent):
+    smd = make_stock_master(max(rows, 2500))
+    isd, _ = make_issue_score(rows, smd)
+    df = issue_score_processing.compute_issue_rank(issue_score_processing.match_issue_score(isd, smd, lean=False), smd, '2021-10-01')
+    obj = df if data == 'frame' else df.to_dict('records')
+    ind, max_indent = (None, 0) if indent == 'none' else (4, 'auto')
+    return lambda: json_patch.dump_json(obj, ind, max_indent)
+
+
+###########################################################################################################
+# 측정 / 이력
+###########################################################################################################
+
+
+def measure(func, time_budget=TIME_BUDGET):
+    '''func 을 time_budget 초 동안 반복 실행 (MIN_REPEAT ~ MAX_REPEAT 회), (최소, 중간값, 횟수) 반환 (초)'''
+
+    times = []
+    started = time.perf_counter()
+    while len(times) < MAX_REPEAT:
+        instrumentation.reset_metrics()
+        t0 = time.perf_counter()
+        func()
+        times.append(time.perf_counter() - t0)
+        if len(times) >= MIN_REPEAT and time.perf_counter() - started >= time_budget:
+            break
+    return min(times), statistics.median(times), len(times)
+
+
+def run(name_filter=None, quick=False, time_budget=TIME_BUDGET):
+    '''등록된 벤치마크를 실행하여 {case 이름: {min_ms, median_ms, repeat}} 반환'''
+
+    results = {}
+    for name, setup, params, quick_params in _BENCHMARKS:
+        if name_filter and name_filter not in name:
+            continue
+        for combo in _combinations(quick_params if quick and quick_params else params):
+            case = _case_name(name, combo)
+            func = setup(**combo)
+            best, median, repeat = measure(func, time_budget)
+            results[case] = {'min_ms': round(best * 1000, 3), 'median_ms': round(median * 1000, 3), 'repeat': repeat}
+            print('%-75s min %10.2f ms   median %10.2f ms   (%d runs)' % (case, best * 1000, median * 1000, repeat))
+    return results
+
+
+def _git_commit():
+    try:
+        return subprocess.check_output(['git', 'rev-parse', '--short', 'HEAD'], cwd=_REPO_DIR,
+                                       stderr=subprocess.DEVNULL).decode().strip()
+    except Exception:
+        return ''
+
+
+def load_history(path):
+    '''history 파일의 실행 기록 목록 (오래된 순)'''
+
+    if not os.path.exists(path):
+        return []
+    records = []
+    with open(path, encoding='utf8') as f:
+        for line in f:
+            line = line.strip()
+            if line:
+                records.append(json.loads(line))
+    return records
+
+
+def save_history(path, record):
+    os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+    with open(path, 'a', encoding='utf8') as f:
+        f.write(json.dumps(record, ensure_ascii=False, sort_keys=True) + '\n')
+
+
+def baseline(records, host, n_runs):
+    '''같은 host 의 최근 n_runs 회 결과에서 case 별 최소값의 중간값 (ms)'''
+
+    values = {}
+    for record in [x for x in records if x.get('host') == host][-n_runs:]:
+        for case, result in record['results'].items():
+            values.setdefault(case, []).append(result['min_ms'])
+    return {case: statistics.median(v) for case, v in values.items()}
+
+
+def find_regressions(results, base, threshold, min_delta_ms):
+    '''baseline 대비 threshold 비율 이상, min_delta_ms 이상 느려진 case 목록 [(case, baseline_ms, 현재_ms)]'''
+
+    regressions = []
+    for case, result in results.items():
+        if case not in base:
+            continue
+        before, now = base[case], result['min_ms']
+        if now - before > min_delta_ms and now > before * (1 + threshold):
+            regressions.append((case, before, now))
+    return regressions
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+def _parse_args(argv):
+    opts = {'quick': False, 'filter': None, 'history': DEFAULT_HISTORY, 'threshold': 0.2,
+            'min-delta': 1.0, 'baseline': 5, 'save': True, 'list': False, 'budget': TIME_BUDGET}
+    for arg in argv[1:]:
+        key, _, value = arg.lstrip('-').partition('=')
+        if key in ('quick', 'list'):
+            opts[key] = True
+        elif key == 'no-save':
+            opts['save'] = False
+        elif key in ('threshold', 'min-delta', 'budget'):
+            opts[key] = float(value)
+        elif key == 'baseline':
+            opts[key] = int(value)
+        elif key in ('filter', 'history'):
+            opts[key] = value
+        else:
+            raise ValueError(f'unknown option: {arg}')
+    return opts
+
+
+def main(argv):
+    try:
+        opts = _parse_args(argv)
+    except ValueError as e:
+        print(e)
+        print(__doc__)
+        return 2
+
+    if opts['list']:
+        for name, _, params, quick_params in _BENCHMARKS:
+            print(name, params, 'quick:', quick_params)
+        return 0
+
+    # 벤치마크 중에는 debug 로그(log_frame 등) 출력 비용 제외
+    logging.basicConfig(level=logging.WARNING)
+    logging.getLogger().setLevel(logging.WARNING)
+
+    host = socket.gethostname()
+    results = run(opts['filter'], opts['quick'], opts['budget'])
+    base = baseline(load_history(opts['history']), host, opts['baseline'])
+    regressions = find_regressions(results, base, opts['threshold'], opts['min-delta'])
+
+    if opts['save']:
+        save_history(opts['history'], {
+            'time': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'commit': _git_commit(),
+            'host': host,
+            'python': sys.version.split()[0],
+            'quick': opts['quick'],
+            'results': results,
+        })
+
+    if not base:
+        print(f'baseline 없음 ({host}) - 회귀 검사 생략')
+        return 0
+    for case, before, now in regressions:
+        print('REGRESSION %-64s %10.2f ms -> %10.2f ms (+%.0f%%)' % (case, before, now, (now / before - 1) * 100))
+    if regressions:
+        return 1
+    print(f'회귀 없음 (threshold {opts["threshold"]:.0%}, baseline {len(base)} cases)')
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main(sys.argv))
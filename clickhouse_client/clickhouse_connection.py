@@ -1,12 +1,57 @@
-import clickhouse_driver
 import os
-import pandas as pd
+import time
 import logging
 
+from lazy_import import lazy_import
+
+# 드라이버는 처음 연결할 때 import
+clickhouse_driver = lazy_import('clickhouse_driver')
+
 logger = logging.getLogger('clickhouse connection')
 
+# 장애로 판단한 host 를 다시 시도하기까지의 시간 (초)
+DOWN_RETRY_SECONDS = 30
+
+# 테이블이 없을 때의 ClickHouse 오류 코드
+UNKNOWN_TABLE = 60
+
+
+def parse_hosts(host):
+    # 'h1,h2:9001' 또는 ['h1', 'h2:9001'] -> [('h1', None), ('h2', 9001)]
+    if isinstance(host, str):
+        host = host.split(',')
+    hosts = []
+    for x in host:
+        name, _, port = x.strip().partition(':')
+        if name:
+            hosts.append((name, int(port) if port else None))
+    return hosts or [('', None)]
+
+
+def is_unknown_table(e):
+    # 테이블이 없어서 난 오류인지 (연결 장애 등과 구분)
+    if getattr(e, 'code', None) == UNKNOWN_TABLE:
+        return True
+    message = str(e)
+    return 'UNKNOWN_TABLE' in message or f'Code: {UNKNOWN_TABLE}.' in message or "doesn't exist" in message
+
+
+def parse_shards(shards):
+    # 'h1,h2 | h3,h4' (shard 는 '|', shard 내 replica 는 ',' 로 구분) -> ['h1,h2', 'h3,h4']
+    if not shards:
+        return []
+    if isinstance(shards, str):
+        shards = shards.split('|')
+    return [x.strip() for x in shards if x.strip()]
+
 
 class ClickHouseConnection:
+    '''
+    host 는 ',' 로 구분한 여러 host (replica) 를 지정할 수 있음
+    - host 가 여러 개면 SELECT 1 로 health check 하여 응답하는 첫번째 host 에 연결
+    - failover(): 현재 host 를 DOWN_RETRY_SECONDS 동안 제외하고 다음 host 로 재연결
+    '''
+
     def __init__(self,
                  host='',
                  user='default',
@@ -15,11 +60,71 @@ class ClickHouseConnection:
                  settings={'use_numpy': True}
                  ):
         self.database = database
+        self.hosts = parse_hosts(host)
+        self.current_host = None
+        self._params = dict(user=user, password=password, database=database, settings=settings)
+        self._down = {}
         self.client = None
         try:
-            self.client = clickhouse_driver.Client(host=host, user=user, password=password, database=database, settings=settings)
+            self.client = self._connect()
         except Exception as e:
             logger.error(f'{e}')
 
     def get_client(self):
-        return self.client
\ No newline at end of file
+        return self.client
+
+    def failover(self):
+        # 현재 host 를 장애로 표시하고 다른 host 로 재연결 (연결할 host 가 없으면 예외)
+        if self.current_host is not None:
+            self._down[self.current_host] = time.monotonic()
+        self.client = None
+        self.client = self._connect()
+        return self.client
+
+    def reconnect_if_down(self):
+        # host 가 여러 개일 때 현재 host 가 응답하지 않으면 다른 host 로 재연결 (재연결했으면 True)
+        if len(self.hosts) == 1:
+            return False
+        try:
+            self.client.execute('SELECT 1')
+            return False
+        except Exception as e:
+            logger.warning(f'health check failed {self.host_name()}: {e}')
+        self.failover()
+        return True
+
+    def host_name(self):
+        if self.current_host is None:
+            return ''
+        name, port = self.current_host
+        return f'{name}:{port}' if port else name
+
+    def _connect(self):
+        # host 가 하나면 health check 없이 연결 (기존 동작)
+        if len(self.hosts) == 1:
+            self.current_host = self.hosts[0]
+            return self._new_client(self.hosts[0])
+
+        for host in self._candidates():
+            client = self._new_client(host)
+            try:
+                client.execute('SELECT 1')
+            except Exception as e:
+                logger.warning(f'health check failed {host[0]}: {e}')
+                self._down[host] = time.monotonic()
+                continue
+            self.current_host = host
+            return client
+        raise Exception(f'no healthy clickhouse host: {",".join(x[0] for x in self.hosts)}')
+
+    def _candidates(self):
+        # 최근 장애 host 는 뒤로 (모두 장애여도 한번씩은 시도)
+        now = time.monotonic()
+        up = [x for x in self.hosts if now - self._down.get(x, -DOWN_RETRY_SECONDS) >= DOWN_RETRY_SECONDS]
+        return up + [x for x in self.hosts if x not in up]
+
+    def _new_client(self, host):
+        name, port = host
+        if port:
+            return clickhouse_driver.Client(host=name, port=port, **self._params)
+        return clickhouse_driver.Client(host=name, **self._params)
@@ -1,6 +1,5 @@
 from clickhouse_client.clickhouse_connection import ClickHouseConnection
 from clickhouse_client.clickhouse_schema import ClickHouseSchema
-import pandas as pd
 import logging
 import os
 import gc
@@ -8,6 +7,8 @@ from config import get_clickhouse_config
 import sys
 from logging.handlers import RotatingFileHandler
 
+from instrumentation import timed_query
+
 logger = logging.getLogger('clickhouse_reader')
 
 
@@ -23,6 +24,15 @@ class ClickHouseReader:
         self.schema = ClickHouseSchema(database=self.database)
 
     def read_financial(self, table_name, cond):
-        df = self.client.query_dataframe(f'SELECT * FROM {table_name} {cond}')
+        with timed_query('clickhouse_select') as q:
+            df = self.client.query_dataframe(f'SELECT * FROM {table_name} {cond}')
+            q['rows'] = len(df)
+        return df
+
+    def read_query(self, query):
+        # 집계 등 SELECT * 형식이 아닌 쿼리
+        with timed_query('clickhouse_select') as q:
+            df = self.client.query_dataframe(query)
+            q['rows'] = len(df)
         return df
     
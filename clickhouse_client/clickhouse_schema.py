@@ -1,11 +1,9 @@
-import clickhouse_driver
-from clickhouse_sqlalchemy import Table, make_session, get_declarative_base, types, engines
-import pandas as pd
 import datetime
 import csv
 import re
 import logging
 from config import get_clickhouse_config
+from clickhouse_client.clickhouse_connection import ClickHouseConnection
 
 
 
@@ -20,7 +18,9 @@ class ClickHouseSchema:
                  settings={'use_numpy': True}
                  ):
         self.database = database
-        self.client = clickhouse_driver.Client(host=host, database=database, settings=settings)
+        # host 가 여러 개면 health check 후 응답하는 host 사용
+        self.connection = ClickHouseConnection(host=host, database=database, settings=settings)
+        self.client = self.connection.get_client()
 
 
     def create_table(self, table_name):
@@ -42,10 +42,75 @@ class ClickHouseSchema:
                 SETTINGS index_granularity = 8192;
             '''
 
+        elif 'issue_rank' == table_name:
+            query = f'''
+                CREATE TABLE issue_rank
+                (
+                    WRITE_DT String,
+                    CMP_CD String,
+                    STOCK String,
+                    MARKET String,
+                    ISSUE Float64,
+                    HAS_NEWS UInt8,
+                    total_rank UInt32,
+                    total_size UInt32,
+                    market_rank UInt32,
+                    market_size UInt32,
+                    decile UInt8,
+                    percentile Float64
+                )
+                ENGINE = ReplacingMergeTree()
+                PRIMARY KEY (WRITE_DT, CMP_CD)
+                ORDER BY (WRITE_DT, CMP_CD)
+                SETTINGS index_granularity = 8192;
+            '''
+
+        elif 'issue_feature' == table_name:
+            query = f'''
+                CREATE TABLE issue_feature
+                (
+                    WRITE_DT String,
+                    CMP_CD String,
+                    STOCK String,
+                    ISSUE Float64,
+                    HAS_NEWS UInt8,
+                    ma5 Float64,
+                    ma20 Float64,
+                    zscore Float64,
+                    pct_rank Float64,
+                    days_since_news Int32
+                )
+                ENGINE = ReplacingMergeTree()
+                PRIMARY KEY (WRITE_DT, CMP_CD)
+                ORDER BY (WRITE_DT, CMP_CD)
+                SETTINGS index_granularity = 8192;
+            '''
+
+        elif 'issue_digest' == table_name:
+            query = f'''
+                CREATE TABLE issue_digest
+                (
+                    WRITE_DT String,
+                    ISSUE_DIGEST String,
+                    MASTER_DIGEST String,
+                    UPDATED_AT String
+                )
+                ENGINE = ReplacingMergeTree()
+                PRIMARY KEY WRITE_DT
+                ORDER BY WRITE_DT
+                SETTINGS index_granularity = 8192;
+            '''
+
         logger.info(f'{query}')
         self.client.execute(query)
 
 
+    def reconnect_if_down(self):
+        # 현재 host 가 응답하지 않으면 다른 host 로 재연결 (host 가 여러 개인 경우)
+        reconnected = self.connection.reconnect_if_down()
+        self.client = self.connection.get_client()
+        return reconnected
+
     def get_columns(self, table_name):
         query = 'SELECT * FROM {} LIMIT 0'.format(table_name)
         _, cols = self.client.execute(query, with_column_types=True)
@@ -1,22 +1,39 @@
-from clickhouse_client.clickhouse_connection import ClickHouseConnection
+from clickhouse_client.clickhouse_connection import ClickHouseConnection, is_unknown_table, parse_shards
 from clickhouse_client.clickhouse_schema import ClickHouseSchema
-import pandas as pd
 import logging
 import os
 import re
 import gc
+import time
 from config import get_clickhouse_config
 import sys
 from logging.handlers import RotatingFileHandler
+from concurrent.futures import ThreadPoolExecutor
+
+from lazy_import import lazy_import
+from instrumentation import timed_query
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 
 logger = logging.getLogger('clickhouse_writer')
 
 
 class ClickHouseWriter:
-    def __init__(self, **argv):
+    '''
+    host 에 insert (host 가 여러 개면 health check / failover)
+    shards 지정 시 shard_key 컬럼 hash 로 행을 나누어 shard 별 local 테이블(table_name + local_table_suffix)에 동시에 insert
+        shards: 'h1,h2 | h3,h4' 형식 (shard 는 '|', shard 내 replica 는 ',' 로 구분) 또는 목록
+    shard 별 insert 결과(행 수, 시간, 초당 행 수)는 shard_stats, 쿼리 계측은 clickhouse_insert_shard{번호}
+    write_clickhouse 오류 처리 (shard 여부와 관계없이 같음)
+        - insert 전 단계(스키마 조회/테이블 생성, shard local 테이블 확인)의 오류는 예외
+        - insert 중 오류는 로그만 남기고 그때까지 기록된 행 수를 반환
+    '''
+
+    def __init__(self, shards=None, shard_key='CMP_CD', local_table_suffix='', **argv):
         self.connection = ClickHouseConnection(**argv)
-        self.client = self.connection.get_client() 
+        self.client = self.connection.get_client()
         self.database = None
         if 'database' in argv:
             self.database = argv['database']
@@ -24,32 +41,158 @@ class ClickHouseWriter:
             logger.error(f'database error {self.database}')
         self.schema = ClickHouseSchema(**argv)
 
+        self.shard_key = shard_key
+        self.local_table_suffix = local_table_suffix or ''
+        self.shards = [ClickHouseConnection(**dict(argv, host=x)) for x in parse_shards(shards)]
+        self.shard_stats = []
+
 
     def write_clickhouse(self, table_name, data, chunksize=10000):
-        try:
-            self.schema.get_columns(table_name)
-            field_types = self.schema.get_schema(table_name)
-        except Exception as e:
-            # 테이블 생성
-            logger.debug(f'get_columns 에러: {e}')
-            self.schema.create_table(table_name)
-            self.schema.get_columns(table_name)
-            field_types = self.schema.get_schema(table_name)
+        field_types = self._field_types(table_name)
 
-        
         names = []
         for row in field_types:
             names += [row[0]]
 
-        
+        if self.shards:
+            return self._write_shards(table_name, data[names], chunksize)
+
+        written = 0
         try:
             logger.debug(f"INSERT INTO {table_name} ({','.join(names)}) VALUES")
-            for idx in range(0, data.shape[0], chunksize): 
-                n = self.client.insert_dataframe(f"INSERT INTO {table_name} VALUES", data.iloc[idx:idx+chunksize, :][names])
+            for idx in range(0, data.shape[0], chunksize):
+                n = self._insert(self.connection, table_name, data.iloc[idx:idx+chunksize, :][names], 'clickhouse_insert')
+                self.client = self.connection.get_client()
                 logger.debug(f'insert rows: {n}')
                 if n == 0:
                     logger.error(f'0 rows written: {table_name}')
+                written += n or 0
         except Exception as e:
             logger.error(f'write clickhouse Error: {e}')
-    
+
+        return written
+
+
+    def delete_day(self, table_name, day, column='WRITE_DT'):
+        # column = day 인 행 삭제 (mutation 이 끝날 때까지 대기, 이후 insert 한 행은 삭제 대상이 아님)
+        # shards 지정 시 각 shard 의 local 테이블에서 삭제, 아직 없는 테이블은 지울 행이 없으므로 생략
+        # 그 외 오류(연결 장애 등)는 예외
+        if self.shards:
+            targets = [(conn, table_name + self.local_table_suffix) for conn in self.shards]
+        else:
+            targets = [(self.connection, table_name)]
+
+        for conn, table in targets:
+            client = conn.get_client()
+            if not client.execute(f'EXISTS TABLE {table}')[0][0]:
+                logger.debug(f'delete_day: {table} 없음 ({conn.host_name()}) - 생략')
+                continue
+            with timed_query('clickhouse_delete'):
+                client.execute(f'ALTER TABLE {table} DELETE WHERE {column} = %(day)s',
+                               {'day': day}, settings={'mutations_sync': 1})
+
+
+    def _field_types(self, table_name):
+        # 테이블이 없을 때(UNKNOWN_TABLE)만 생성 (create_table 은 DROP 후 CREATE)
+        # 연결 장애 등 그 외 오류는 다른 host 에서 다시 조회하고, 모두 실패하면 예외 (운영 테이블을 다시 만들지 않도록)
+        error = None
+        for attempt in range(max(1, len(self.schema.connection.hosts))):
+            try:
+                self.schema.get_columns(table_name)
+                return self.schema.get_schema(table_name)
+            except Exception as e:
+                error = e
+                if is_unknown_table(e) or not self.schema.reconnect_if_down():
+                    break
+
+        if not is_unknown_table(error):
+            raise error
+
+        # 테이블 생성
+        logger.debug(f'get_columns 에러: {error}')
+        self.schema.create_table(table_name)
+        self.schema.get_columns(table_name)
+        return self.schema.get_schema(table_name)
+
+
+    def shard_index(self, data):
+        # shard_key 값의 hash 로 정한 shard 번호 (실행마다 같은 값, 같은 key 는 항상 같은 shard)
+        # shard_key 컬럼이 없는 테이블(issue_digest 등)은 모두 첫번째 shard
+        if self.shard_key not in data.columns:
+            return np.zeros(len(data), dtype=np.int64)
+        keys = data[self.shard_key].astype(str).to_numpy(dtype=object)
+        return pd.util.hash_array(keys) % len(self.shards)
+
+
+    def _write_shards(self, table_name, data, chunksize):
+        # shard 별로 나눈 행을 shard 마다 thread 하나로 동시에 insert (한 shard 의 실패는 다른 shard 에 영향 없음)
+        local_table = table_name + self.local_table_suffix
+        self._check_local_tables(local_table)
+        shard = self.shard_index(data)
+
+        with ThreadPoolExecutor(max_workers=len(self.shards), thread_name_prefix='clickhouse_shard') as executor:
+            futures = [executor.submit(self._write_shard, i, local_table, data[shard == i], chunksize)
+                       for i in range(len(self.shards))]
+            self.shard_stats = [f.result() for f in futures]
+
+        for st in self.shard_stats:
+            if st['error']:
+                logger.error(f"write clickhouse shard {st['shard']} ({st['host']}) Error: {st['error']}")
+            else:
+                logger.debug(f"shard {st['shard']} ({st['host']}): {st['rows']} rows, {st['rows_per_sec']:.0f} rows/s")
+        return sum(st['rows'] for st in self.shard_stats)
+
+
+    def _check_local_tables(self, local_table):
+        # shard 의 local 테이블은 만들지 않음 (replica 구성에 맞는 engine 은 클러스터 설정에 따라 다름)
+        # local 테이블이 없는 shard 가 있으면 insert 전에 설정 오류로 실패 (응답하지 않는 shard 는 insert 에서 처리)
+        missing = []
+        for i, conn in enumerate(self.shards):
+            try:
+                exists = conn.get_client().execute(f'EXISTS TABLE {local_table}')[0][0]
+            except Exception as e:
+                logger.warning(f'shard {i} ({conn.host_name()}) local table check failed: {e}')
+                continue
+            if not exists:
+                missing.append(f'{i} ({conn.host_name()})')
+        if missing:
+            raise Exception(f"local table {local_table} does not exist on shard {', '.join(missing)} - "
+                            f"create it on every shard replica or check shards/local_table_suffix config")
+
+
+    def _write_shard(self, i, table_name, data, chunksize):
+        conn = self.shards[i]
+        written = 0
+        error = None
+        t0 = time.perf_counter()
+        try:
+            for idx in range(0, data.shape[0], chunksize):
+                written += self._insert(conn, table_name, data.iloc[idx:idx+chunksize, :], f'clickhouse_insert_shard{i}') or 0
+        except Exception as e:
+            error = f'{e}'
+        seconds = time.perf_counter() - t0
+        return {
+            'shard': i,
+            'host': conn.host_name(),
+            'rows': written,
+            'seconds': seconds,
+            'rows_per_sec': written / seconds if seconds > 0 else 0.0,
+            'error': error,
+        }
+
+
+    def _insert(self, conn, table_name, chunk, metric):
+        # 실패하면 같은 shard 의 다른 host 로 failover 하여 재시도 (host 가 하나면 재시도 없음)
+        # 실패한 insert 가 일부 반영되었을 수 있으나 ReplacingMergeTree 에서 중복 제거됨
+        for attempt in range(len(conn.hosts)):
+            try:
+                with timed_query(metric) as q:
+                    n = conn.get_client().insert_dataframe(f"INSERT INTO {table_name} VALUES", chunk)
+                    q['rows'] = n
+                return n
+            except Exception as e:
+                if attempt + 1 >= len(conn.hosts):
+                    raise
+                logger.warning(f'insert failed {conn.host_name()}: {e} - failover')
+                conn.failover()
 
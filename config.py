@@ -1,4 +1,5 @@
 import configparser
+import functools
 import logging
 import urllib.parse
 
@@ -29,4 +30,11 @@ def get_clickhouse_config(file_name):
         cfg.read(file_name)
     except Exception as e:
         logger.error(f'config {e}')
-    return cfg
\ No newline at end of file
+    return cfg
+
+
+@functools.lru_cache(maxsize=None)
+def get_cached_config(file_name):
+    '''처음 호출될 때 한번만 파싱 (import 시점에 db.config 를 읽지 않기 위함)'''
+
+    return get_clickhouse_config(file_name)
@@ -0,0 +1,321 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 파이프라인 단계별 계측 모듈
+- 단계별 실행시간(wall time), 입출력 행 수, peak RSS 를 기록
+- Oracle / ClickHouse 클라이언트의 쿼리 지연시간을 기록
+- 실행 결과를 JSON 요약 파일 또는 Prometheus textfile 형식으로 내보냄
+'''
+
+import os
+import sys
+import json
+import time
+import logging
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+try:
+    import resource
+except ImportError:  # windows
+    resource = None
+
+
+logger = logging.getLogger('instrumentation')
+
+# 실행 요약을 내보낼 경로 (환경변수로 지정된 경우에만 파일 생성)
+METRICS_JSON_ENV = 'ISSUE_METRICS_JSON'
+METRICS_PROM_ENV = 'ISSUE_METRICS_PROM'
+
+_PROM_PREFIX = 'issue_pipeline'
+
+
+###########################################################################################################
+# public function/class
+###########################################################################################################
+
+
+def log_frame(log, title, df, level=logging.DEBUG):
+    '''DataFrame 덤프를 로그 레벨이 활성화된 경우에만 포맷팅'''
+
+    if log.isEnabledFor(level):
+        log.log(level, '%s\n%s', title, df)
+
+
+def peak_rss_bytes():
+    '''프로세스 시작 이후의 peak RSS (bytes)'''
+
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # linux 는 KB, macOS 는 bytes 단위
+    return peak if sys.platform == 'darwin' else peak * 1024
+
+
+def current_rss_bytes():
+    '''현재 RSS (bytes), /proc 를 읽을 수 없으면 None'''
+
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError, IndexError, AttributeError):
+        return None
+
+
+class StageRecord(object):
+    '''단계 하나의 계측 결과'''
+
+    def __init__(self, name, rows_in=None):
+        self.name = name
+        self.rows_in = rows_in
+        self.rows_out = None
+        self.seconds = None
+        self.peak_rss = None
+        self.rss_delta = None
+        self.error = None
+
+    def to_dict(self):
+        return {
+            'stage': self.name,
+            'seconds': self.seconds,
+            'rows_in': self.rows_in,
+            'rows_out': self.rows_out,
+            'peak_rss_bytes': self.peak_rss,
+            'rss_delta_bytes': self.rss_delta,
+            'error': self.error,
+        }
+
+
+class QueryStats(object):
+    '''클라이언트별 쿼리 지연시간 누적값'''
+
+    def __init__(self):
+        self.count = 0
+        self.errors = 0
+        self.seconds = 0.0
+        self.max_seconds = 0.0
+        self.rows = 0
+
+    def add(self, seconds, rows=None, error=False):
+        self.count += 1
+        self.seconds += seconds
+        self.max_seconds = max(self.max_seconds, seconds)
+        if rows:
+            self.rows += rows
+        if error:
+            self.errors += 1
+
+    def to_dict(self):
+        return {
+            'count': self.count,
+            'errors': self.errors,
+            'seconds': self.seconds,
+            'max_seconds': self.max_seconds,
+            'rows': self.rows,
+            'rows_per_second': self.rows / self.seconds if self.rows and self.seconds > 0 else None,
+        }
+
+
+class RunMetrics(object):
+    '''한 번의 실행(run) 동안 수집된 계측 정보'''
+
+    def __init__(self):
+        self.started_at = datetime.now()
+        self.stages = []
+        self.queries = {}
+        self._lock = threading.Lock()
+
+    @contextmanager
+    def stage(self, name, rows_in=None):
+        '''
+        단계 계측용 context manager
+            with metrics.stage('match_issue_score', rows_in=len(df)) as st:
+                ...
+                st.rows_out = len(result)
+        '''
+
+        record = StageRecord(name, rows_in)
+        rss_before = current_rss_bytes()
+        t0 = time.perf_counter()
+        try:
+            yield record
+        except BaseException as e:
+            record.error = repr(e)
+            raise
+        finally:
+            record.seconds = time.perf_counter() - t0
+            record.peak_rss = peak_rss_bytes()
+            rss_after = current_rss_bytes()
+            if rss_before is not None and rss_after is not None:
+                record.rss_delta = rss_after - rss_before
+            with self._lock:
+                self.stages.append(record)
+            for hook in _stage_hooks:
+                hook(record)
+            logger.info('[stage] %s: %.3fs rows %s -> %s, peak_rss %s',
+                        name, record.seconds, record.rows_in, record.rows_out, _fmt_bytes(record.peak_rss))
+
+    def record_query(self, client, seconds, rows=None, error=False):
+        with self._lock:
+            stats = self.queries.get(client)
+            if stats is None:
+                stats = self.queries[client] = QueryStats()
+            stats.add(seconds, rows, error)
+
+    def summary(self):
+        with self._lock:
+            return {
+                'started_at': self.started_at.strftime('%Y-%m-%d %H:%M:%S'),
+                'peak_rss_bytes': peak_rss_bytes(),
+                'stages': [x.to_dict() for x in self.stages],
+                'queries': {k: v.to_dict() for k, v in sorted(self.queries.items())},
+            }
+
+    def write_json(self, path):
+        _atomic_write(path, json.dumps(self.summary(), ensure_ascii=False, indent=4))
+
+    def write_prometheus(self, path):
+        '''node_exporter textfile collector 형식으로 기록'''
+
+        _atomic_write(path, self.to_prometheus())
+
+    def to_prometheus(self):
+        summary = self.summary()
+
+        # 같은 단계가 여러 번 실행된 경우 시간은 합산, 행 수는 마지막 값을 사용
+        stages = {}
+        for st in summary['stages']:
+            agg = stages.setdefault(st['stage'], {'seconds': 0.0, 'rows_in': None, 'rows_out': None,
+                                                 'peak_rss_bytes': None, 'errors': 0})
+            agg['seconds'] += st['seconds'] or 0.0
+            for k in ('rows_in', 'rows_out', 'peak_rss_bytes'):
+                if st[k] is not None:
+                    agg[k] = st[k]
+            if st['error']:
+                agg['errors'] += 1
+
+        lines = []
+
+        def metric(name, help_text, samples, label):
+            lines.append('# HELP %s_%s %s' % (_PROM_PREFIX, name, help_text))
+            lines.append('# TYPE %s_%s gauge' % (_PROM_PREFIX, name))
+            for key, value in samples:
+                if value is not None:
+                    lines.append('%s_%s{%s="%s"} %s' % (_PROM_PREFIX, name, label, key, value))
+
+        metric('stage_seconds', 'wall time per stage', [(k, v['seconds']) for k, v in stages.items()], 'stage')
+        metric('stage_rows_in', 'input rows per stage', [(k, v['rows_in']) for k, v in stages.items()], 'stage')
+        metric('stage_rows_out', 'output rows per stage', [(k, v['rows_out']) for k, v in stages.items()], 'stage')
+        metric('stage_peak_rss_bytes', 'process peak rss after stage',
+               [(k, v['peak_rss_bytes']) for k, v in stages.items()], 'stage')
+        metric('stage_errors', 'failed stage count', [(k, v['errors']) for k, v in stages.items()], 'stage')
+
+        queries = summary['queries']
+        metric('query_count', 'queries per client', [(k, v['count']) for k, v in queries.items()], 'client')
+        metric('query_errors', 'failed queries per client', [(k, v['errors']) for k, v in queries.items()], 'client')
+        metric('query_seconds_sum', 'total query latency per client',
+               [(k, v['seconds']) for k, v in queries.items()], 'client')
+        metric('query_seconds_max', 'max query latency per client',
+               [(k, v['max_seconds']) for k, v in queries.items()], 'client')
+        metric('query_rows', 'rows returned/written per client', [(k, v['rows']) for k, v in queries.items()], 'client')
+        metric('query_rows_per_second', 'rows per second of query time per client (per shard for sharded insert)',
+               [(k, v['rows_per_second']) for k, v in queries.items()], 'client')
+
+        lines.append('# HELP %s_last_run_timestamp_seconds run start time' % _PROM_PREFIX)
+        lines.append('# TYPE %s_last_run_timestamp_seconds gauge' % _PROM_PREFIX)
+        lines.append('%s_last_run_timestamp_seconds %s' % (_PROM_PREFIX, self.started_at.timestamp()))
+        return '\n'.join(lines) + '\n'
+
+
+# 프로세스 단위 기본 metrics
+_metrics = RunMetrics()
+
+# 단계 종료 시 호출할 함수 목록 (profiling 모듈 등에서 등록)
+_stage_hooks = []
+
+
+def get_metrics():
+    return _metrics
+
+
+def reset_metrics():
+    global _metrics
+    _metrics = RunMetrics()
+    return _metrics
+
+
+def add_stage_hook(hook):
+    '''단계 종료 시점마다 hook(StageRecord) 를 호출'''
+
+    _stage_hooks.append(hook)
+
+
+def remove_stage_hook(hook):
+    if hook in _stage_hooks:
+        _stage_hooks.remove(hook)
+
+
+def stage(name, rows_in=None):
+    return _metrics.stage(name, rows_in)
+
+
+def record_query(client, seconds, rows=None, error=False):
+    _metrics.record_query(client, seconds, rows, error)
+
+
+@contextmanager
+def timed_query(client):
+    '''
+    쿼리 지연시간 계측용 context manager
+        with timed_query('oracle') as q:
+            rows = cur.fetchall()
+            q['rows'] = len(rows)
+    '''
+
+    info = {'rows': None}
+    t0 = time.perf_counter()
+    try:
+        yield info
+    except BaseException:
+        record_query(client, time.perf_counter() - t0, info['rows'], error=True)
+        raise
+    record_query(client, time.perf_counter() - t0, info['rows'])
+
+
+def export_metrics(json_path=None, prom_path=None):
+    '''실행 요약을 파일로 내보냄 (인자가 없으면 환경변수의 경로를 사용)'''
+
+    json_path = json_path or os.environ.get(METRICS_JSON_ENV)
+    prom_path = prom_path or os.environ.get(METRICS_PROM_ENV)
+
+    try:
+        if json_path:
+            _metrics.write_json(json_path)
+            logger.info(f'metrics json: {json_path}')
+        if prom_path:
+            _metrics.write_prometheus(prom_path)
+            logger.info(f'metrics textfile: {prom_path}')
+    except Exception as e:
+        logger.error(f'export metrics error {e}')
+
+
+###########################################################################################################
+# private function
+###########################################################################################################
+
+
+def _atomic_write(path, text):
+    dir_name = os.path.dirname(os.path.abspath(path))
+    os.makedirs(dir_name, exist_ok=True)
+    tmp_path = '%s.%d.tmp' % (path, os.getpid())
+    with open(tmp_path, 'w', encoding='utf8') as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+def _fmt_bytes(n):
+    if n is None:
+        return '-'
+    return '%.1fMB' % (n / 1024.0 / 1024.0)
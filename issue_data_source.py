@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- issue_stock 조회용 데이터 소스
+    - get_daily_issue_stocks(day):              Oracle nv_issue_score 일자별 행
+    - get_issue_stocks_by_date(start, end):     Oracle nv_issue_score 기간 행
+    - get_issue_rank(day):                      ClickHouse issue_rank 사전 계산 순위 (없으면 [])
+    - get_issue_aliases(day):                   ClickHouse issue_score 뉴스 종목명 -> 종목코드
+    - get_stock_master():                       ClickHouse stock_master 최근 date DataFrame
+- DirectSource: 조회할 때마다 Oracle 에 새로 연결 (배치/스크립트용)
+- PooledSource: Oracle 연결을 pool 로 재사용 (issue_server 등 상주 프로세스용)
+'''
+
+import queue
+import logging
+import threading
+
+
+logger = logging.getLogger('issue_data_source')
+
+
+class DirectSource(object):
+    '''조회마다 DBClientForIssueStock 을 새로 생성'''
+
+    def _client(self):
+        from oracle_client.db_client_for_stock_news import DBClientForIssueStock
+        return DBClientForIssueStock()
+
+    def get_daily_issue_stocks(self, day):
+        return self._client().get_daily_issue_stocks(day)
+
+    def get_issue_stocks_by_date(self, start_day, end_day):
+        return self._client().get_issue_stocks_by_date(start_day, end_day)
+
+    def get_issue_rank(self, day):
+        import issue_score_processing
+        return issue_score_processing.read_issue_rank(day)
+
+    def get_issue_aliases(self, day):
+        import issue_score_processing
+        return issue_score_processing.read_issue_aliases(day)
+
+    def get_stock_master(self):
+        import issue_score_processing
+        return issue_score_processing.get_stock_master()
+
+
+class PooledSource(DirectSource):
+    '''
+    Oracle 연결 pool (최대 size 개)
+        - 연결은 필요할 때 생성하고, 사용 후 pool 에 반환하여 재사용
+        - 조회 중 예외가 발생한 연결은 버림
+    '''
+
+    def __init__(self, size=4, factory=None, timeout=30):
+        self.size = size
+        self.factory = factory or super(PooledSource, self)._client
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+
+    def get_daily_issue_stocks(self, day):
+        return self._run(lambda db: db.get_daily_issue_stocks(day))
+
+    def get_issue_stocks_by_date(self, start_day, end_day):
+        return self._run(lambda db: db.get_issue_stocks_by_date(start_day, end_day))
+
+    def close(self):
+        while True:
+            try:
+                self._idle.get_nowait()._close()
+            except queue.Empty:
+                break
+
+    def _run(self, func):
+        if not self._slots.acquire(timeout=self.timeout):
+            raise TimeoutError(f'no free oracle connection in {self.timeout}s')
+        try:
+            try:
+                db = self._idle.get_nowait()
+            except queue.Empty:
+                db = self.factory()
+            try:
+                rows = func(db)
+            except Exception:
+                db._close()
+                raise
+            self._idle.put(db)
+            return rows
+        finally:
+            self._slots.release()
@@ -0,0 +1,303 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 일자별 이슈점수(nv_issue_score) 인메모리 캐시
+- 일자별로 한번만 조회하여 DataFrame, 순위(total_rank), 종목명 인덱스를 미리 계산해 둠
+    ==> 종목별 조회는 dict lookup (O(1))
+- TTL + LRU 방식으로 제거: 오늘 데이터는 짧은 TTL, 지난 일자는 LRU 에서 밀려날 때까지 유지
+- 같은 일자에 대한 동시 miss 는 한번의 조회만 수행 (single flight)
+'''
+
+import time
+import hashlib
+import logging
+import threading
+from collections import OrderedDict
+from datetime import datetime
+
+from lazy_import import lazy_import
+
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger('issue_day_cache')
+
+
+###########################################################################################################
+# public class
+###########################################################################################################
+
+
+class DayEntry(object):
+    '''하루치 이슈점수 (미리 계산된 순위 및 종목명 인덱스 포함)'''
+
+    def __init__(self, day, rows):
+        self.day = day
+        self.rows = rows
+        self.loaded_at = time.monotonic()
+        self.digest = _rows_digest(rows)
+
+        df = pd.DataFrame(rows)
+        if df.empty:
+            df = pd.DataFrame(columns=['WRITE_DT', 'STOCK', 'ISSUE'])
+        df['total_rank'] = df['ISSUE'].rank(ascending=False)
+        self.df = df
+
+        # 종목명 -> (이슈점수, 순위), 같은 종목명이 여러번 나오면 첫번째 행 사용
+        self.index = {}
+        for name, score, rank in zip(df['STOCK'].tolist(), df['ISSUE'].tolist(), df['total_rank'].tolist()):
+            self.index.setdefault(name, (score, rank))
+
+        # 일괄 조회(reindex)용 종목명 unique 인덱스 DataFrame
+        self.scores = df.drop_duplicates('STOCK').set_index('STOCK')[['ISSUE', 'total_rank']]
+
+        # 띄어쓰기 제거한 종목명 -> 종목명 (stock_master 종목명과 매칭용)
+        self.norm_names = {}
+        for name in self.index:
+            self.norm_names.setdefault(name.replace(' ', ''), name)
+
+    def __len__(self):
+        return len(self.df)
+
+    def lookup(self, stock_name):
+        '''(이슈점수, 순위), 해당일에 뉴스가 없는 종목은 None'''
+
+        return self.index.get(stock_name)
+
+
+class RankEntry(object):
+    '''
+    하루치 사전 계산 순위 (issue_score_processing.compute_issue_rank 결과, issue_rank 테이블)
+    aliases: 뉴스 종목명 -> 종목코드 행 목록 (issue_score 의 STOCK, CMP_CD), 별칭으로 매칭된 뉴스 종목명도 조회 가능
+    '''
+
+    def __init__(self, day, rows, aliases=()):
+        self.day = day
+        self.rows = rows
+        self.loaded_at = time.monotonic()
+        aliases = list(aliases)
+        self.digest = _rows_digest(rows + aliases)
+
+        df = pd.DataFrame(rows)
+        self.df = df
+        self.total_size = int(df['total_size'].iloc[0]) if len(df) else 0
+
+        # 순위에 없는 종목의 중립 순위 (total_rank = total_size/2 와 같이 가운데)
+        #  - market_rank: 시장을 알 수 없으므로 종목별 시장 크기 중앙값의 절반
+        #  - decile: 가운데 순위의 decile (5)
+        market_size = df['market_size'] if 'market_size' in df.columns else pd.Series([self.total_size])
+        self.neutral_market_rank = round(float(market_size.median()) / 2) if len(df) else 0
+        self.neutral_decile = 5
+
+        # 종목명(띄어쓰기 제거) / 종목코드 -> 행 dict
+        self.index = {}
+        for row in df.to_dict('records'):
+            self.index.setdefault(row['STOCK'].replace(' ', ''), row)
+            self.index.setdefault(row['CMP_CD'], row)
+        for alias in aliases:
+            row = self.index.get(alias['CMP_CD'])
+            if row is not None:
+                self.index.setdefault(alias['STOCK'].replace(' ', ''), row)
+
+        # 일괄 조회(reindex)용: 종목코드, 종목명, 뉴스 종목명(띄어쓰기 제거) 인덱스 DataFrame
+        if len(df):
+            n = len(df)
+            alias_df = pd.DataFrame(aliases, columns=['STOCK', 'CMP_CD'])
+            alias_pos = pd.Index(df['CMP_CD']).get_indexer(alias_df['CMP_CD'])
+            keys = pd.concat([df['CMP_CD'], df['STOCK'].str.replace(' ', '', regex=False),
+                              alias_df['STOCK'][alias_pos >= 0].astype(str).str.replace(' ', '', regex=False)],
+                             ignore_index=True)
+            by_key = df.iloc[np.concatenate([np.arange(n), np.arange(n), alias_pos[alias_pos >= 0]])].reset_index(drop=True)
+            by_key.index = keys
+            self.by_key = by_key[~by_key.index.duplicated()]
+        else:
+            self.by_key = df
+
+    def __len__(self):
+        return len(self.df)
+
+    def lookup(self, stock):
+        '''종목명 또는 종목코드의 순위 정보, 없으면 None'''
+
+        return self.index.get(stock) or self.index.get(stock.replace(' ', ''))
+
+
+class DayCache(object):
+    '''
+    loader(day) -> rows 결과를 entry_class(DayEntry 등) 로 캐싱
+        - maxsize:   최대 보관 일자 수 (LRU)
+        - ttl:       지난 일자의 TTL (초), None 이면 만료 없음
+        - today_ttl: 조회 시점에 끝나지 않은 일자(오늘 이후) 및 결과가 비어있는 일자의 TTL (초)
+                     (자정이 지나도 끝난 뒤 다시 조회할 때까지 today_ttl 유지)
+    '''
+
+    def __init__(self, loader, maxsize=32, ttl=None, today_ttl=60, entry_class=DayEntry):
+        self.loader = loader
+        self.entry_class = entry_class
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.today_ttl = today_ttl
+
+        self._entries = OrderedDict()
+        self._inflight = {}
+        self._lock = threading.Lock()
+
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, day):
+        with self._lock:
+            entry = self._entries.get(day)
+            if entry is not None and not self._expired(entry):
+                self._entries.move_to_end(day)
+                self.hits += 1
+                return entry
+
+            self.misses += 1
+            flight = self._inflight.get(day)
+            leader = flight is None
+            if leader:
+                flight = self._inflight[day] = _Flight()
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            entry = self._new_entry(day, list(self.loader(day)))
+        except BaseException as e:
+            with self._lock:
+                del self._inflight[day]
+            flight.fail(e)
+            raise
+
+        with self._lock:
+            self._entries[day] = entry
+            self._entries.move_to_end(day)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+            del self._inflight[day]
+        flight.done(entry)
+        logger.debug(f'day cache loaded {day}: {len(entry)} rows')
+        return entry
+
+    def put(self, day, rows):
+        '''이미 조회한 rows 로 day 의 캐시를 채움 (기간 조회 결과를 일자별로 나누어 넣을 때 사용)'''
+
+        entry = self._new_entry(day, list(rows))
+        with self._lock:
+            self._entries[day] = entry
+            self._entries.move_to_end(day)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        return entry
+
+    def cached(self, day):
+        '''day 가 만료되지 않은 상태로 캐시에 있는지 여부'''
+
+        with self._lock:
+            entry = self._entries.get(day)
+            return entry is not None and not self._expired(entry)
+
+    def invalidate(self, day=None):
+        '''day 의 캐시를 제거 (None 이면 전체)'''
+
+        with self._lock:
+            if day is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(day, None)
+
+    def _new_entry(self, day, rows):
+        entry = self.entry_class(day, rows)
+        # 조회 시점에 아직 끝나지 않은 일자 (일부 데이터만 있을 수 있음)
+        entry.open_day = day >= _today()
+        return entry
+
+    def _expired(self, entry):
+        if entry.open_day or not entry.rows:
+            ttl = self.today_ttl
+        else:
+            ttl = self.ttl
+        return ttl is not None and time.monotonic() - entry.loaded_at > ttl
+
+
+class TTLValue(object):
+    '''loader() 결과 하나를 ttl 초 동안 캐싱 (동시 miss 는 한번만 조회)'''
+
+    def __init__(self, loader, ttl=3600):
+        self.loader = loader
+        self.ttl = ttl
+        self._value = None
+        self._loaded_at = None
+        self._flight = None
+        self._lock = threading.Lock()
+
+    def get(self):
+        with self._lock:
+            if self._loaded_at is not None and time.monotonic() - self._loaded_at <= self.ttl:
+                return self._value
+            flight = self._flight
+            leader = flight is None
+            if leader:
+                flight = self._flight = _Flight()
+
+        if not leader:
+            return flight.wait()
+
+        try:
+            value = self.loader()
+        except BaseException as e:
+            with self._lock:
+                self._flight = None
+            flight.fail(e)
+            raise
+
+        with self._lock:
+            self._value = value
+            self._loaded_at = time.monotonic()
+            self._flight = None
+        flight.done(value)
+        return value
+
+    def invalidate(self):
+        with self._lock:
+            self._loaded_at = None
+
+
+###########################################################################################################
+# private function/class
+###########################################################################################################
+
+
+def _rows_digest(rows):
+    # 내용이 같으면 같은 값 (HTTP ETag 등 변경 여부 판단용)
+    return hashlib.blake2b(repr(rows).encode('utf8'), digest_size=8).hexdigest()
+
+
+def _today():
+    return datetime.today().strftime('%Y-%m-%d')
+
+
+class _Flight(object):
+    '''진행중인 조회 - 뒤따라온 요청은 결과를 기다림'''
+
+    def __init__(self):
+        self._event = threading.Event()
+        self._result = None
+        self._error = None
+
+    def done(self, result):
+        self._result = result
+        self._event.set()
+
+    def fail(self, error):
+        self._error = error
+        self._event.set()
+
+    def wait(self):
+        self._event.wait()
+        if self._error is not None:
+            raise self._error
+        return self._result
@@ -0,0 +1,383 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 종목별 이슈점수 시계열 특성 (종목 x 일자 dense 행렬, numpy)
+    - ma5, ma20:        5/20 일 이동평균 (일자 수가 부족하면 있는 일자만으로 평균)
+    - zscore:           종목 자신의 최근 ZSCORE_WINDOW 일 대비 z-score (표준편차 0 이면 0)
+    - pct_rank:         해당 일자 전체 종목 대비 백분위 (100 이 최상위, issue_rank.percentile 과 같은 방식)
+    - days_since_news:  마지막 뉴스 이후 경과일 (달력 기준, 뉴스가 없었으면 -1)
+- 뉴스가 없는 날의 점수는 NEUTRAL_SCORE, 일자 축은 데이터가 있는 일자
+- 증분 갱신: 최근 HISTORY_DAYS 일의 행렬만 유지하고, 새 일자는 열 하나를 추가하여 그 열의 특성만 계산
+  (이전 상태는 ClickHouse issue_feature 테이블의 최근 일자 행으로 복원)
+- 결과는 issue_score 와 같은 DB 의 issue_feature 테이블에 기록
+
+usage:
+    python issue_features.py backfill 2021-09-01 2021-10-20     # 기간 전체 계산 후 기록
+    python issue_features.py update [2021-10-21]                # 하루치 증분 계산 후 기록
+'''
+
+import sys
+import logging
+from datetime import datetime, timedelta
+
+from lazy_import import lazy_import
+
+import instrumentation
+import issue_score_processing
+from instrumentation import log_frame
+
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger('issue_features')
+
+NEUTRAL_SCORE = issue_score_processing.NEUTRAL_SCORE
+MA_WINDOWS = (5, 20)
+ZSCORE_WINDOW = 20
+
+# 증분 갱신 시 유지하는 일자(열) 수
+HISTORY_DAYS = max(MA_WINDOWS + (ZSCORE_WINDOW,))
+# 증분 갱신 상태를 issue_feature 테이블에서 읽어올 때의 달력 기준 조회 기간 (휴일 포함 여유)
+STATE_LOOKBACK_DAYS = HISTORY_DAYS * 2
+
+# 전체 계산 시 한번에 계산하는 열(일자) 수
+_CHUNK_COLS = 32
+
+FEATURE_TABLE = 'issue_feature'
+FEATURE_COLUMNS = ['WRITE_DT', 'CMP_CD', 'STOCK', 'ISSUE', 'HAS_NEWS'] + ['ma%d' % x for x in MA_WINDOWS] + \
+                  ['zscore', 'pct_rank', 'days_since_news']
+
+
+###########################################################################################################
+# public function/class
+###########################################################################################################
+
+
+class IssueFeatures(object):
+    '''
+    종목 x 일자 이슈점수 행렬
+        - values:      일자별 점수 (뉴스가 없는 날은 NEUTRAL_SCORE)
+        - news:        일자별 뉴스 여부
+        - prior_news:  행렬 첫 일자 이전의 마지막 뉴스 일자 (day number, 없으면 -1)
+    '''
+
+    def __init__(self, history=HISTORY_DAYS):
+        self.history = history
+        self.codes = np.array([], dtype=object)
+        self.names = np.array([], dtype=object)
+        self.dates = []
+        self.day_numbers = np.array([], dtype=np.int64)
+        self.values = np.empty((0, 0))
+        self.news = np.empty((0, 0), dtype=bool)
+        self.prior_news = np.array([], dtype=np.int64)
+        self._rows = {}
+
+    @classmethod
+    def build(cls, frame, universe=None, history=HISTORY_DAYS):
+        '''
+        긴 형태(일자/종목별 행) DataFrame 으로 행렬 구성
+            - frame:    WRITE_DT, CMP_CD, STOCK, ISSUE 컬럼 (match_issue_score 결과 또는 issue_feature 행)
+                        HAS_NEWS 컬럼이 없으면 모든 행을 뉴스로 간주
+                        days_since_news 컬럼이 있으면 행렬 이전의 마지막 뉴스 일자를 복원
+            - universe: CMP_CD, CMP_NM_KOR 컬럼, 뉴스가 없어도 포함할 종목 (stock_master)
+        '''
+
+        features = cls(history)
+        has_rows = frame is not None and not frame.empty
+        if has_rows:
+            write_dt = _day_strings(frame['WRITE_DT'])
+            features.dates = sorted(set(write_dt.tolist()))
+            features.day_numbers = _day_numbers(features.dates)
+            features.values = np.empty((0, len(features.dates)))
+            features.news = np.empty((0, len(features.dates)), dtype=bool)
+
+        if universe is not None:
+            features._add_stocks(universe['CMP_CD'].to_numpy(dtype=object), universe['CMP_NM_KOR'].to_numpy(dtype=object))
+        if not has_rows:
+            return features
+
+        codes = frame['CMP_CD'].to_numpy(dtype=object)
+        features._add_stocks(codes, frame['STOCK'].to_numpy(dtype=object))
+
+        rows = features._row_index(codes)
+        cols = np.searchsorted(np.array(features.dates, dtype=object), write_dt)
+        has_news = frame['HAS_NEWS'].to_numpy(dtype=bool) if 'HAS_NEWS' in frame.columns else np.ones(len(frame), dtype=bool)
+        features.values[rows, cols] = pd.to_numeric(frame['ISSUE']).to_numpy(dtype=float)
+        features.news[rows, cols] = has_news
+
+        if 'days_since_news' in frame.columns:
+            # 각 행 기준 마지막 뉴스 일자 중 행렬 첫 일자 이전인 것
+            since = frame['days_since_news'].to_numpy(dtype=np.int64)
+            last = np.where(since >= 0, features.day_numbers[cols] - since, -1)
+            before = last < features.day_numbers[0]
+            np.maximum.at(features.prior_news, rows[before], last[before])
+        return features
+
+    def __len__(self):
+        return len(self.codes)
+
+    def compute(self, start=0):
+        '''start 번째 열부터 마지막 열까지 전체 특성 계산 (긴 형태 DataFrame)'''
+
+        return self._features(np.arange(start, len(self.dates)))
+
+    def append_day(self, day, frame):
+        '''
+        day 일자 열을 추가하고 그 열의 특성만 계산
+            - frame: day 일자의 WRITE_DT, CMP_CD, STOCK, ISSUE (match_issue_score 결과)
+            - 마지막 일자와 같은 day 이면 마지막 열을 교체 (재실행), 더 이전 일자는 ValueError
+        '''
+
+        if self.dates and day <= self.dates[-1]:
+            if day != self.dates[-1]:
+                raise ValueError(f'{day} is before the last feature day {self.dates[-1]}')
+            self.dates = self.dates[:-1]
+            self.day_numbers = self.day_numbers[:-1]
+            self.values = self.values[:, :-1]
+            self.news = self.news[:, :-1]
+
+        if frame is not None and not frame.empty:
+            self._add_stocks(frame['CMP_CD'].to_numpy(dtype=object), frame['STOCK'].to_numpy(dtype=object))
+
+        column = np.full(len(self.codes), float(NEUTRAL_SCORE))
+        news = np.zeros(len(self.codes), dtype=bool)
+        if frame is not None and not frame.empty:
+            rows = self._row_index(frame['CMP_CD'].to_numpy(dtype=object))
+            column[rows] = pd.to_numeric(frame['ISSUE']).to_numpy(dtype=float)
+            news[rows] = True
+
+        self.dates = self.dates + [day]
+        self.day_numbers = np.append(self.day_numbers, _day_numbers([day]))
+        self.values = np.concatenate([self.values, column[:, None]], axis=1)
+        self.news = np.concatenate([self.news, news[:, None]], axis=1)
+        self._trim()
+
+        return self._features(np.array([len(self.dates) - 1]))
+
+    ###################################################################################################
+    # private
+    ###################################################################################################
+
+    def _add_stocks(self, codes, names):
+        new_codes, first = np.unique(codes, return_index=True)
+        keep = np.array([x not in self._rows for x in new_codes.tolist()], dtype=bool)
+        if not keep.any():
+            return
+        new_codes = new_codes[keep]
+        new_names = names[first[keep]]
+
+        for i, code in enumerate(new_codes.tolist(), start=len(self.codes)):
+            self._rows[code] = i
+        self.codes = np.concatenate([self.codes, new_codes])
+        self.names = np.concatenate([self.names, new_names])
+        self.prior_news = np.concatenate([self.prior_news, np.full(len(new_codes), -1, dtype=np.int64)])
+
+        pad = (len(new_codes), len(self.dates))
+        self.values = np.concatenate([self.values, np.full(pad, float(NEUTRAL_SCORE))])
+        self.news = np.concatenate([self.news, np.zeros(pad, dtype=bool)])
+
+    def _row_index(self, codes):
+        return np.fromiter((self._rows[x] for x in codes.tolist()), dtype=np.int64, count=len(codes))
+
+    def _trim(self):
+        # history 일자보다 오래된 열은 제거하고, 제거한 열의 마지막 뉴스 일자는 prior_news 에 반영
+        drop = len(self.dates) - self.history
+        if drop <= 0:
+            return
+        self.prior_news = self._last_news_before(drop)
+        self.dates = self.dates[drop:]
+        self.day_numbers = self.day_numbers[drop:]
+        self.values = self.values[:, drop:]
+        self.news = self.news[:, drop:]
+
+    def _last_news_before(self, col):
+        # col 번째 열 이전의 마지막 뉴스 일자 (day number, 없으면 -1)
+        if col <= 0:
+            return self.prior_news
+        news_days = np.where(self.news[:, :col], self.day_numbers[:col], -1)
+        return np.maximum(news_days.max(axis=1), self.prior_news)
+
+    def _features(self, cols):
+        '''cols 열들의 특성, 계산에 필요한 최근 window 열만 잘라서 사용'''
+
+        if len(cols) == 0 or len(self.codes) == 0:
+            return pd.DataFrame(columns=FEATURE_COLUMNS)
+        if len(cols) > _CHUNK_COLS:
+            # (종목, 일자, window) 임시 배열 크기를 제한하기 위해 열을 나눠서 계산
+            return pd.concat([self._features(cols[i:i+_CHUNK_COLS]) for i in range(0, len(cols), _CHUNK_COLS)],
+                             ignore_index=True)
+
+        lo = max(int(cols[0]) - HISTORY_DAYS + 1, 0)
+        hi = int(cols[-1]) + 1
+        values = self.values[:, lo:hi]
+        local = cols - lo
+
+        current = values[:, local]
+        columns = {}
+        for w in MA_WINDOWS:
+            columns['ma%d' % w] = np.nanmean(_window_view(values, w, local), axis=2)
+
+        # 표준편차 0 (점수 변화 없음) 이면 z-score 0
+        window = _window_view(values, ZSCORE_WINDOW, local)
+        std = np.nanstd(window, axis=2)
+        zscore = np.zeros_like(current)
+        np.divide(current - np.nanmean(window, axis=2), std, out=zscore, where=std > 1e-9)
+        columns['zscore'] = zscore
+
+        columns['pct_rank'] = pd.DataFrame(current).rank(axis=0, pct=True).to_numpy() * 100
+
+        news_days = np.where(self.news[:, lo:hi], self.day_numbers[lo:hi], -1)
+        last_news = np.maximum(np.maximum.accumulate(news_days, axis=1)[:, local], self._last_news_before(lo)[:, None])
+        columns['days_since_news'] = np.where(last_news >= 0, self.day_numbers[cols] - last_news, -1).astype(np.int32)
+
+        # 열(일자) 순서로 펼침
+        n, m = len(self.codes), len(cols)
+        result = pd.DataFrame({
+            'WRITE_DT': np.repeat(np.array(self.dates, dtype=object)[cols], n),
+            'CMP_CD': np.tile(self.codes, m),
+            'STOCK': np.tile(self.names, m),
+            'ISSUE': current.T.ravel(),
+            'HAS_NEWS': self.news[:, cols].T.ravel().astype(np.uint8),
+        })
+        for name, value in columns.items():
+            result[name] = value.T.ravel()
+        return result[FEATURE_COLUMNS]
+
+
+def build_features(start_day, end_day, stock_master_df=None):
+    '''start_day ~ end_day 기간의 nv_issue_score 로 행렬을 구성하고 전체 특성 계산 (backfill)'''
+
+    with instrumentation.stage('build_features') as st:
+        if stock_master_df is None:
+            stock_master_df = issue_score_processing.get_stock_master()
+        features = _load_range(start_day, end_day, stock_master_df)
+        result = features.compute()
+        st.rows_out = len(result)
+    log_frame(logger, '### issue_feature ###', result)
+    return result
+
+
+def update_features(day, issue_score_match, stock_master_df):
+    '''
+    day 일자 특성 증분 계산
+        - 이전 상태는 issue_feature 테이블의 최근 HISTORY_DAYS 일자 행으로 복원
+        - 테이블에 이전 일자가 없으면 nv_issue_score 에서 STATE_LOOKBACK_DAYS 기간을 읽어 구성
+    '''
+
+    with instrumentation.stage('update_features', rows_in=len(issue_score_match)) as st:
+        features = load_state(day, stock_master_df)
+        result = features.append_day(day, issue_score_match)
+        st.rows_out = len(result)
+    log_frame(logger, '### issue_feature ###', result)
+    return result
+
+
+def load_state(day, stock_master_df):
+    '''day 이전 최근 HISTORY_DAYS 일자 상태'''
+
+    start_day = _shift_day(day, -STATE_LOOKBACK_DAYS)
+    end_day = _shift_day(day, -1)
+    universe = _universe(stock_master_df)
+
+    try:
+        rows = read_features(start_day, end_day)
+    except Exception as e:
+        logger.warning(f'{FEATURE_TABLE} 조회 실패 - nv_issue_score 로 상태 구성: {e}')
+        rows = None
+
+    if rows is not None and not rows.empty:
+        features = IssueFeatures.build(rows, universe)
+    else:
+        if rows is not None:
+            logger.info(f'{FEATURE_TABLE} 에 {start_day} ~ {end_day} 행 없음 - nv_issue_score 로 상태 구성')
+        features = _load_range(start_day, end_day, stock_master_df)
+    features._trim()
+    return features
+
+
+def read_features(start_day, end_day):
+    '''issue_feature 테이블의 start_day ~ end_day 행'''
+
+    reader = issue_score_processing._clickhouse_reader()
+    table_name = f"{issue_score_processing._conf()['db_somemoney_data']}.{FEATURE_TABLE}"
+    return reader.read_financial(table_name=table_name, cond=f" FINAL WHERE WRITE_DT >= '{start_day}' AND WRITE_DT <= '{end_day}'")
+
+
+def write_features(features_df):
+    issue_score_processing.write_output(features_df, table_name=FEATURE_TABLE)
+
+
+###########################################################################################################
+# private function
+###########################################################################################################
+
+
+def _load_range(start_day, end_day, stock_master_df):
+    db = issue_score_processing._sources['issue_db']()
+    issue_score_df = pd.DataFrame(db.get_issue_stocks_by_date(start_day, end_day))
+    if issue_score_df.empty:
+        return IssueFeatures.build(None, _universe(stock_master_df))
+
+    issue_score_match = issue_score_processing.match_issue_score(issue_score_df, stock_master_df)
+    return IssueFeatures.build(issue_score_match, _universe(stock_master_df))
+
+
+def _universe(stock_master_df):
+    # issue_rank 와 같은 종목 범위 (analysis_filter == 1)
+    universe = stock_master_df.loc[stock_master_df['analysis_filter'].astype(str) == '1']
+    return universe.drop_duplicates('CMP_CD')[['CMP_CD', 'CMP_NM_KOR']]
+
+
+def _window_view(values, window, cols):
+    '''cols 열 기준 최근 window 열의 (종목, len(cols), window) 배열, 앞쪽이 부족한 부분은 NaN'''
+
+    padded = np.concatenate([np.full((len(values), window - 1), np.nan), values], axis=1)
+    return np.lib.stride_tricks.sliding_window_view(padded, window, axis=1)[:, cols]
+
+
+def _day_strings(write_dt):
+    if pd.api.types.is_datetime64_any_dtype(write_dt):
+        return write_dt.dt.strftime('%Y-%m-%d').to_numpy(dtype=object)
+    return write_dt.astype(str).str.slice(0, 10).to_numpy(dtype=object)
+
+
+def _day_numbers(days):
+    return np.array(days, dtype='datetime64[D]').astype(np.int64)
+
+
+def _shift_day(day, days):
+    return (datetime.strptime(day, '%Y-%m-%d') + timedelta(days=days)).strftime('%Y-%m-%d')
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.DEBUG)
+
+    usage = '''
+        usage1: %s backfill start_day end_day
+        usage2: %s update [day]     (기본값: 오늘)
+    ''' % (sys.argv[0], sys.argv[0])
+
+    if len(sys.argv) < 2 or sys.argv[1] not in ('backfill', 'update'):
+        sys.stderr.write(usage)
+        sys.exit(1)
+
+    stock_master_df = issue_score_processing.get_stock_master()
+    if sys.argv[1] == 'backfill':
+        if len(sys.argv) < 4:
+            sys.stderr.write(usage)
+            sys.exit(1)
+        write_features(build_features(sys.argv[2], sys.argv[3], stock_master_df))
+    else:
+        day = sys.argv[2] if len(sys.argv) > 2 else datetime.today().strftime('%Y-%m-%d')
+        issue_score_match = issue_score_processing.match_issue_score(issue_score_processing.get_issue_score(day), stock_master_df)
+        write_features(update_features(day, issue_score_match, stock_master_df))
+
+    instrumentation.export_metrics()
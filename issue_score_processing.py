@@ -1,21 +1,106 @@
 import os
 import sys
 import copy
+import time
 import logging
+import threading
+import concurrent.futures
 from datetime import timedelta, datetime
 
-import pandas as pd
+from lazy_import import lazy_import
 
 from oracle_client.db_client_for_stock_news import DBClientForIssueStock
 from clickhouse_client.clickhouse_reader import ClickHouseReader
 from clickhouse_client.clickhouse_writer import ClickHouseWriter
-from config import get_clickhouse_config
+from clickhouse_client.clickhouse_connection import is_unknown_table
+from config import get_cached_config
 
 import json_patch
+import issue_sinks
+import instrumentation
+import profiling
+from instrumentation import log_frame
+
+# pandas/numpy 는 처음 사용하는 시점에 import
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
 
 _SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
 logger = logging.getLogger('issue_score_processing')
-conf = get_clickhouse_config('./db.config')
+CONFIG_FILE = './db.config'
+
+# stock_master 의 시장 구분(KOSPI/KOSDAQ) 컬럼, 없으면 전체를 하나의 시장('ALL')으로 취급
+MARKET_COLUMN = 'market'
+# 해당일에 뉴스가 없는 종목에 부여하는 중립 점수
+NEUTRAL_SCORE = 50
+
+# 변경 감지 digest 를 저장하는 테이블, 결과 테이블별 ClickHouse ORDER BY key (clickhouse_schema.py)
+#  - key 에 WRITE_DT 가 있는 테이블은 일자 단위로 다시 기록 (day 행을 지우고 전체 insert)
+#  - issue_score 는 key 가 STOCK 뿐이라 (일자 간 같은 종목 행이 합쳐짐) 일자 단위 비교/삭제 없이 항상 전체 기록
+DIGEST_TABLE = 'issue_digest'
+TABLE_KEYS = {
+    'issue_score': ('STOCK',),
+    'issue_rank': ('WRITE_DT', 'CMP_CD'),
+    'issue_feature': ('WRITE_DT', 'CMP_CD'),
+}
+MASTER_DIGEST_QUERY = (
+    "SELECT toString(max(date)) AS date, count() AS cnt, toString(sum(cityHash64(CMP_NM_KOR, CMP_CD, analysis_filter))) AS hash"
+    " FROM stock_master WHERE date=(SELECT date FROM web_service_data.stock_master ORDER BY date desc limit 1)"
+)
+
+# 소스 동시 조회(fetch_sources) 의 thread 수 및 전체 제한시간(초)
+FETCH_WORKERS = 4
+FETCH_TIMEOUT = float(os.environ.get('ISSUE_FETCH_TIMEOUT', '600'))
+
+# ISSUE_LEAN_MODE=1 이면 categorical/bool/date 컬럼을 사용하는 메모리 절약 매칭을 기본으로 사용
+LEAN_MODE = os.environ.get('ISSUE_LEAN_MODE', '') == '1'
+
+
+def _conf():
+    # db.config 는 처음 사용할 때 파싱
+    return get_cached_config(CONFIG_FILE)['ClickHouse']
+
+
+def _clickhouse_reader():
+    conf = _conf()
+    return ClickHouseReader(host=conf['host'], 
+                            database=conf['db_web_service_data'], 
+                            user=conf['user'], 
+                            password=conf['password'])
+
+
+def _clickhouse_writer():
+    conf = _conf()
+    # host: ',' 로 구분한 여러 host 지정 가능 (failover)
+    # shards: 'h1,h2 | h3,h4' 형식으로 지정하면 shard_key(기본 CMP_CD) 기준으로 나누어 shard 별 local 테이블에 insert
+    return ClickHouseWriter(host=conf['host'], 
+                            database=conf['db_somemoney_data'], 
+                            user=conf['user'], 
+                            password=conf['password'],
+                            shards=conf.get('shards'),
+                            shard_key=conf.get('shard_key', 'CMP_CD'),
+                            local_table_suffix=conf.get('local_table_suffix', ''))
+
+
+# 데이터 소스 생성 함수 (record/replay 모드 등에서 set_sources 로 교체)
+_sources = {
+    'issue_db': DBClientForIssueStock,
+    'stock_master_reader': _clickhouse_reader,
+}
+
+
+# warm_aliases 로 미리 조회한 종목명 -> (CMP_CD, analysis_filter), 이력에도 없는 종목은 None
+_alias_cache = {}
+_alias_lock = threading.Lock()
+
+
+def set_sources(issue_db=None, stock_master_reader=None):
+    # issue_db: get_daily_issue_stocks(day) 를 제공하는 객체의 생성 함수
+    # stock_master_reader: read_financial(table_name, cond) 를 제공하는 객체의 생성 함수
+    # 인자가 None 이면 기본 소스(Oracle / ClickHouse)로 되돌림
+    _sources['issue_db'] = issue_db or DBClientForIssueStock
+    _sources['stock_master_reader'] = stock_master_reader or _clickhouse_reader
+    clear_alias_cache()
 
 
 def get_issue_score(day=None):
@@ -24,90 +109,91 @@ def get_issue_score(day=None):
     if not day:
         day = datetime.today().strftime('%Y-%m-%d')
 
-    # oracle nv_issue_score 정보를 가져옴
-    db = DBClientForIssueStock()
-    rows = db.get_daily_issue_stocks(day)
+    with instrumentation.stage('get_issue_score') as st:
+        # oracle nv_issue_score 정보를 가져옴
+        db = _sources['issue_db']()
+        rows = db.get_daily_issue_stocks(day)
 
-    df = pd.DataFrame(rows)
-    logger.debug(df)
+        df = pd.DataFrame(rows)
+        st.rows_out = len(df)
+    log_frame(logger, '### issue_score ###', df)
     return df
 
 
 def get_stock_master():
-    reader = ClickHouseReader(host=conf['ClickHouse']['host'], 
-                              database=conf['ClickHouse']['db_web_service_data'], 
-                              user=conf['ClickHouse']['user'], 
-                              password=conf['ClickHouse']['password'])
+    with instrumentation.stage('get_stock_master') as st:
+        reader = _sources['stock_master_reader']()
 
-    # clickhouse stock_master 최근 date 정보를 가져옴
-    df = reader.read_financial(table_name='stock_master', cond=" WHERE date=(SELECT date FROM web_service_data.stock_master ORDER BY date desc limit 1)")
-    logger.debug(df)
+        # clickhouse stock_master 최근 date 정보를 가져옴
+        df = reader.read_financial(table_name='stock_master', cond=" WHERE date=(SELECT date FROM web_service_data.stock_master ORDER BY date desc limit 1)")
+        st.rows_out = len(df)
+    log_frame(logger, '### stock_master ###', df)
 
     return df
 
 
-def match_issue_score(issue_score_df, stock_master_df):
-    # issue_scoer_df 전처리 - 띄어쓰기 제거
-    isd = issue_score_df.copy()
+def match_issue_score(issue_score_df, stock_master_df, lean=None):
+    if lean is None:
+        lean = LEAN_MODE
+    if lean:
+        return match_issue_score_lean(issue_score_df, stock_master_df)
 
-    # 테스트 코드
-    # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'동화약품', 'ISSUE':'13.1313'}, ignore_index=True)
-    # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'우리은행', 'ISSUE':'14.1414'}, ignore_index=True)
-    # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'KR모터스', 'ISSUE':'12.1212'}, ignore_index=True)
+    with instrumentation.stage('match_issue_score', rows_in=len(issue_score_df)) as st:
+        # issue_scoer_df 전처리 - 띄어쓰기 제거
+        isd = issue_score_df.copy()
 
-    isd['NAME'] = isd['STOCK'].str.replace(" ","")
-    isd.set_index('NAME', inplace=True)
+        # 테스트 코드
+        # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'동화약품', 'ISSUE':'13.1313'}, ignore_index=True)
+        # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'우리은행', 'ISSUE':'14.1414'}, ignore_index=True)
+        # isd = isd.append({'WRITE_DT':'2021-10-20', 'STOCK':'KR모터스', 'ISSUE':'12.1212'}, ignore_index=True)
 
-    # stock_master 전처리 - 띄어쓰기 제거
-    smd = stock_master_df[['CMP_NM_KOR','CMP_CD','analysis_filter','date']].copy()
-    smd['NAME'] = smd['CMP_NM_KOR'].str.replace(" ","")
-    smd.set_index('NAME', inplace=True)
+        isd['NAME'] = isd['STOCK'].str.replace(" ","")
+        isd.set_index('NAME', inplace=True)
 
-    # issue_scoer_df, stock_master Join
-    join_df = isd.join(smd)
-    logger.debug('### join_df ###')
-    logger.debug(join_df)
+        # stock_master 전처리 - 띄어쓰기 제거
+        smd = stock_master_df[['CMP_NM_KOR','CMP_CD','analysis_filter','date']].copy()
+        smd['NAME'] = smd['CMP_NM_KOR'].str.replace(" ","")
+        smd.set_index('NAME', inplace=True)
 
-    # CMP_CD 결측값 체크
-    nan_cnt = join_df['CMP_CD'].isnull().sum()
-    if nan_cnt > 0:
-        logger.debug(f'결측값 {nan_cnt}개 발생')
-        join_df = check_nan(isd, smd, join_df)
-    else:
-        logger.debug(f'결측값 없음')
+        # issue_scoer_df, stock_master Join
+        join_df = isd.join(smd)
+        log_frame(logger, '### join_df ###', join_df)
+
+        # CMP_CD 결측값 체크
+        nan_cnt = join_df['CMP_CD'].isnull().sum()
+        if nan_cnt > 0:
+            logger.debug(f'결측값 {nan_cnt}개 발생')
+            join_df = check_nan(isd, smd, join_df)
+        else:
+            logger.debug(f'결측값 없음')
 
-    # analysis_filter값이 1인것만 추출
-    join_df = join_df.loc[join_df['analysis_filter'] == '1']
-    result = join_df[['WRITE_DT', 'STOCK', 'ISSUE', 'CMP_CD']].copy()
-    logger.debug('### result ###')
-    logger.debug(result)
+        # analysis_filter값이 1인것만 추출
+        join_df = join_df.loc[join_df['analysis_filter'] == '1']
+        result = join_df[['WRITE_DT', 'STOCK', 'ISSUE', 'CMP_CD']].copy()
+        st.rows_out = len(result)
+    log_frame(logger, '### result ###', result)
 
     return result
 
 
 def check_nan(isd, smd, join_df):
-    logger.debug('### check_nan ###')
-    logger.debug(join_df.loc[join_df['CMP_CD'].isnull()])
+    nan_mask = join_df['CMP_CD'].isnull()
+    log_frame(logger, '### check_nan ###', join_df.loc[nan_mask])
 
-    nan_stock_list = join_df.loc[join_df['CMP_CD'].isnull(),'STOCK']
+    with instrumentation.stage('check_nan', rows_in=int(nan_mask.sum())) as st:
+        nan_stock_list = join_df.loc[nan_mask,'STOCK']
 
-    reader = ClickHouseReader(host=conf['ClickHouse']['host'], 
-                              database=conf['ClickHouse']['db_web_service_data'], 
-                              user=conf['ClickHouse']['user'], 
-                              password=conf['ClickHouse']['password'])
-    
-    for stock in nan_stock_list:
-        df = reader.read_financial(table_name='stock_master', cond=f" WHERE CMP_NM_KOR == '{stock}' ORDER BY date desc LIMIT 1")
-        if not df.empty:
-            join_df.loc[join_df['STOCK']==stock, 'CMP_CD'] = df['CMP_CD'][0]
-            join_df.loc[join_df['STOCK']==stock, 'analysis_filter'] = df['analysis_filter'][0]
+        for stock, (cmp_cd, analysis_filter) in lookup_missing_stocks(nan_stock_list).items():
+            join_df.loc[join_df['STOCK']==stock, 'CMP_CD'] = cmp_cd
+            join_df.loc[join_df['STOCK']==stock, 'analysis_filter'] = analysis_filter
 
+        nan_cnt = join_df['CMP_CD'].isnull().sum()
+        st.rows_out = st.rows_in - int(nan_cnt)
 
-    nan_cnt = join_df['CMP_CD'].isnull().sum()
     if nan_cnt > 0:
         logger.debug('#############################################################################################################################')
         logger.debug(f'예외 결측값 {nan_cnt}개 발생')
-        logger.debug(join_df.loc[join_df['CMP_CD'].isnull()])
+        log_frame(logger, '### 예외 결측값 ###', join_df.loc[join_df['CMP_CD'].isnull()])
         logger.debug('#############################################################################################################################')
     else:
         logger.debug(f'예외 결측값 없음')
@@ -115,30 +201,483 @@ def check_nan(isd, smd, join_df):
     return join_df
 
 
-def write_clickhouse(issue_score_match):
+def lookup_missing_stocks(stocks):
+    # stock_master 최근 date 에 없는 종목명을 전체 이력에서 조회 (warm_aliases 로 미리 조회한 종목은 캐시 사용)
+    # return: {종목명: (CMP_CD, analysis_filter)}
+
+    reader = None
+
+    found = {}
+    for stock in stocks:
+        if stock in found:
+            continue
+        with _alias_lock:
+            cached = stock in _alias_cache
+            value = _alias_cache.get(stock)
+        if not cached:
+            if reader is None:
+                reader = _sources['stock_master_reader']()
+            value = _lookup_alias(reader, stock)
+        if value is not None:
+            found[stock] = value
+    return found
+
+
+def clear_alias_cache():
+    with _alias_lock:
+        _alias_cache.clear()
+
+
+def missing_stocks(issue_score_df, stock_master_df):
+    # stock_master 최근 date 에 없는 종목명 (띄어쓰기 제거 후 비교, match_issue_score 의 결측 종목과 같음)
+    master_names = set(stock_master_df['CMP_NM_KOR'].str.replace(' ', '', regex=False))
+    stocks = pd.unique(issue_score_df['STOCK'].to_numpy())
+    return [x for x in stocks if x.replace(' ', '') not in master_names]
+
+
+def warm_aliases(stocks, executor, deadline=None):
+    # 결측 종목의 이력 조회를 executor 에서 동시에 실행하여 캐시 (thread 별 reader 사용)
+    # deadline(time.monotonic 기준)까지 끝나지 않은 조회는 취소하고, 실패/취소된 종목은 check_nan 에서 다시 조회
+    # return: 캐시한 종목 수
+    local = threading.local()
+
+    def lookup(stock):
+        reader = getattr(local, 'reader', None)
+        if reader is None:
+            reader = local.reader = _sources['stock_master_reader']()
+        return _lookup_alias(reader, stock)
+
+    futures = {stock: executor.submit(lookup, stock) for stock in stocks}
     try:
-        writer = ClickHouseWriter(host=conf['ClickHouse']['host'], 
-                                    database=conf['ClickHouse']['db_somemoney_data'], 
-                                    user=conf['ClickHouse']['user'], 
-                                    password=conf['ClickHouse']['password'])
+        results = _wait_all(futures, deadline)
+    except Exception as e:
+        logger.warning(f'alias 조회 실패 - check_nan 에서 다시 조회: {e!r}')
+        results = {k: f.result() for k, f in futures.items() if f.done() and not f.cancelled() and f.exception() is None}
+
+    with _alias_lock:
+        _alias_cache.update(results)
+    return len(results)
+
+
+def fetch_sources(day, timeout=FETCH_TIMEOUT, workers=FETCH_WORKERS):
+    # nv_issue_score(Oracle) 와 stock_master(ClickHouse) 를 동시에 조회한 뒤 결측 종목 이력 조회(alias) 캐시를 채움
+    #  - 전체 timeout 초 안에 끝나지 않으면 남은 작업을 취소하고 TimeoutError
+    #  - 한 소스라도 실패하면 나머지를 취소하고 그 예외를 전파 (fetch_sources stage 에 오류 기록)
+    # return: (issue_score_df, stock_master_df)
+    deadline = time.monotonic() + timeout
+    clear_alias_cache()
+
+    with instrumentation.stage('fetch_sources') as st:
+        executor = concurrent.futures.ThreadPoolExecutor(max_workers=workers, thread_name_prefix='fetch')
+        try:
+            results = _wait_all({
+                'issue_score': executor.submit(get_issue_score, day),
+                'stock_master': executor.submit(get_stock_master),
+            }, deadline)
+            issue_score_df, stock_master_df = results['issue_score'], results['stock_master']
+
+            if not issue_score_df.empty and not stock_master_df.empty:
+                n_alias = warm_aliases(missing_stocks(issue_score_df, stock_master_df), executor, deadline)
+                logger.debug(f'alias 캐시 {n_alias}개')
+            st.rows_out = len(issue_score_df)
+        finally:
+            # 실행 중인 조회는 중단할 수 없으므로 기다리지 않음 (시작 전 작업은 _wait_all 에서 취소됨)
+            executor.shutdown(wait=False)
+
+    return issue_score_df, stock_master_df
+
+
+def _lookup_alias(reader, stock):
+    df = reader.read_financial(table_name='stock_master', cond=f" WHERE CMP_NM_KOR == '{stock}' ORDER BY date desc LIMIT 1")
+    if df.empty:
+        return None
+    return (df['CMP_CD'][0], df['analysis_filter'][0])
+
+
+def _wait_all(futures, deadline=None):
+    # futures: {이름: Future}, 모두 끝나면 {이름: 결과}
+    # 하나라도 실패하거나 deadline 을 넘기면 남은 작업을 취소하고 예외 발생
+    timeout = None if deadline is None else max(deadline - time.monotonic(), 0)
+    done, pending = concurrent.futures.wait(futures.values(), timeout=timeout, return_when=concurrent.futures.FIRST_EXCEPTION)
+    for f in pending:
+        f.cancel()
+
+    for name, f in futures.items():
+        if f in done and f.exception() is not None:
+            raise f.exception()
+    if pending:
+        names = [name for name, f in futures.items() if f in pending]
+        raise TimeoutError(f'{len(names)} fetch timed out: {", ".join(map(str, names[:5]))}')
+    return {name: f.result() for name, f in futures.items()}
+
+
+def match_issue_score_lean(issue_score_df, stock_master_df):
+    # 메모리 절약 매칭
+    #  - NAME(띄어쓰기 제거한 종목명), CMP_CD: stock_master 와 코드를 공유하는 categorical
+    #  - STOCK: categorical, analysis_filter: bool, WRITE_DT: datetime64 (date)
+    #  - 중간 DataFrame 복사 없이 코드 배열로 left join 후 필요한 행만 한번에 구성
+    with instrumentation.stage('match_issue_score', rows_in=len(issue_score_df)) as st:
+        master_names = pd.Categorical(stock_master_df['CMP_NM_KOR'].str.replace(' ', '', regex=False))
+        categories = master_names.categories
+        master_codes = master_names.codes
+        master_cmp_cd = pd.Categorical(stock_master_df['CMP_CD'])
+        master_filter = (stock_master_df['analysis_filter'] == '1').to_numpy(dtype=bool)
+
+        stripped = issue_score_df['STOCK'].str.replace(' ', '', regex=False).to_numpy(dtype=object)
+        issue_names = pd.Categorical(stripped, categories=categories)
+        left_idx, right_idx = _join_codes(issue_names.codes, master_codes, len(categories))
+
+        matched = right_idx >= 0
+        cmp_cd = master_cmp_cd.take(right_idx, allow_fill=True)
+        analysis_filter = np.zeros(len(right_idx), dtype=bool)
+        analysis_filter[matched] = master_filter[right_idx[matched]]
+
+        # CMP_CD 결측값 체크
+        stock = issue_score_df['STOCK'].to_numpy()[left_idx]
+        nan_cnt = int((~matched).sum())
+        if nan_cnt > 0:
+            logger.debug(f'결측값 {nan_cnt}개 발생')
+            cmp_cd, analysis_filter = _fill_missing_lean(stock, matched, cmp_cd, analysis_filter)
+        else:
+            logger.debug(f'결측값 없음')
+
+        # analysis_filter값이 True 인것만 추출
+        rows = left_idx[analysis_filter]
+
+        # NAME: stock_master 에 없어 이력(alias)으로 매칭된 종목도 일반 모드와 같이 띄어쓰기 제거한 종목명
+        names = issue_names[rows]
+        unmatched = pd.isnull(names)
+        if unmatched.any():
+            names = names.add_categories(sorted(set(stripped[rows][unmatched]) - set(categories)))
+            names[unmatched] = stripped[rows][unmatched]
+
+        result = pd.DataFrame({
+            'WRITE_DT': pd.to_datetime(issue_score_df['WRITE_DT'].to_numpy()[rows]),
+            'STOCK': pd.Categorical(issue_score_df['STOCK'].to_numpy()[rows]),
+            'ISSUE': pd.to_numeric(issue_score_df['ISSUE'].to_numpy()[rows]),
+            'CMP_CD': cmp_cd[analysis_filter],
+        }, index=pd.CategoricalIndex(names, name='NAME'))
+        st.rows_out = len(result)
+    log_frame(logger, '### result ###', result)
 
-        writer.write_clickhouse('issue_score', issue_score_match, chunksize=eval(conf['ClickHouse']['chunksize']))
-        logger.debug("완료!!")
+    return result
 
+
+def _join_codes(left_codes, right_codes, n_categories):
+    # categorical 코드 기준 left join 의 (left 행 번호, right 행 번호) 배열
+    # right 에 같은 이름이 여러 개면 DataFrame.join 과 동일하게 행이 늘어나고, 매칭 실패는 right 행 번호 -1
+
+    valid = right_codes >= 0
+    counts = np.bincount(right_codes[valid], minlength=n_categories)
+    order = np.flatnonzero(valid)[np.argsort(right_codes[valid], kind='stable')]
+    starts = np.cumsum(counts) - counts
+
+    left_counts = np.zeros(len(left_codes), dtype=np.int64)
+    has_code = left_codes >= 0
+    left_counts[has_code] = counts[left_codes[has_code]]
+    n_rep = np.maximum(left_counts, 1)
+
+    left_idx = np.repeat(np.arange(len(left_codes)), n_rep)
+    offsets = np.arange(len(left_idx)) - np.repeat(np.cumsum(n_rep) - n_rep, n_rep)
+    hit = left_counts[left_idx] > 0
+    right_idx = np.full(len(left_idx), -1, dtype=np.int64)
+    right_idx[hit] = order[starts[left_codes[left_idx[hit]]] + offsets[hit]]
+    return left_idx, right_idx
+
+
+def _fill_missing_lean(stock, matched, cmp_cd, analysis_filter):
+    # check_nan 의 lean 버젼: 결측 종목만 조회하여 categorical 에 카테고리를 추가한 뒤 채움
+    with instrumentation.stage('check_nan', rows_in=int((~matched).sum())) as st:
+        found = lookup_missing_stocks(pd.unique(stock[~matched]))
+        if found:
+            new_codes = sorted(set(x[0] for x in found.values()) - set(cmp_cd.categories))
+            if new_codes:
+                cmp_cd = cmp_cd.add_categories(new_codes)
+            for name, (code, flt) in found.items():
+                mask = (~matched) & (stock == name)
+                cmp_cd[mask] = code
+                analysis_filter[mask] = (str(flt) == '1')
+
+        nan_cnt = int(pd.isnull(cmp_cd).sum())
+        st.rows_out = st.rows_in - nan_cnt
+
+    if nan_cnt > 0:
+        logger.debug(f'예외 결측값 {nan_cnt}개 발생')
+    else:
+        logger.debug(f'예외 결측값 없음')
+    return cmp_cd, analysis_filter
+
+
+def to_clickhouse_frame(df):
+    # lean 모드의 categorical/datetime 컬럼을 issue_score 테이블(String) 형식으로 변환
+    # 일반 모드 DataFrame 은 그대로 반환
+    converted = {}
+    for col in df.columns:
+        if isinstance(df[col].dtype, pd.CategoricalDtype):
+            converted[col] = df[col].astype(object)
+        elif pd.api.types.is_datetime64_any_dtype(df[col]):
+            converted[col] = df[col].dt.strftime('%Y-%m-%d')
+    if not converted:
+        return df
+    return df.assign(**converted)
+
+
+def compute_issue_rank(issue_score_match, stock_master_df, day):
+    # stock_master 전체(analysis_filter == 1) 기준 순위 사전 계산
+    #  - 뉴스가 없는 종목은 NEUTRAL_SCORE 부여 (HAS_NEWS = 0)
+    #  - total_rank: 전체 순위, market_rank: 시장(KOSPI/KOSDAQ)별 순위 (1 이 이슈점수 최상위)
+    #  - decile: 전체 순위 기준 1(상위 10%) ~ 10, percentile: 이슈점수 백분위 (100 이 최상위)
+    with instrumentation.stage('compute_issue_rank', rows_in=len(stock_master_df)) as st:
+        universe = stock_master_df.loc[stock_master_df['analysis_filter'].astype(str) == '1'].drop_duplicates('CMP_CD')
+
+        if MARKET_COLUMN in universe.columns:
+            market = universe[MARKET_COLUMN].astype(str).to_numpy()
+        else:
+            logger.warning(f'stock_master 에 {MARKET_COLUMN} 컬럼 없음 - market_rank 는 전체 기준')
+            market = np.full(len(universe), 'ALL', dtype=object)
+
+        matched = issue_score_match.drop_duplicates('CMP_CD')
+        score_map = pd.Series(pd.to_numeric(matched['ISSUE']).to_numpy(dtype=float),
+                              index=matched['CMP_CD'].astype(object).to_numpy())
+        issue = score_map.reindex(universe['CMP_CD'].to_numpy()).to_numpy()
+        has_news = ~np.isnan(issue)
+
+        rank = pd.DataFrame({
+            'WRITE_DT': day,
+            'CMP_CD': universe['CMP_CD'].to_numpy(),
+            'STOCK': universe['CMP_NM_KOR'].to_numpy(),
+            'MARKET': market,
+            'ISSUE': np.where(has_news, issue, NEUTRAL_SCORE),
+            'HAS_NEWS': has_news.astype(np.uint8),
+        })
+
+        total_rank = rank['ISSUE'].rank(ascending=False)
+        by_market = rank.groupby('MARKET')['ISSUE']
+        rank['total_rank'] = total_rank.round().astype(np.uint32)
+        rank['total_size'] = np.uint32(len(rank))
+        rank['market_rank'] = by_market.rank(ascending=False).round().astype(np.uint32)
+        rank['market_size'] = by_market.transform('size').astype(np.uint32)
+        rank['decile'] = np.ceil(total_rank / max(len(rank), 1) * 10).clip(1, 10).astype(np.uint8)
+        rank['percentile'] = rank['ISSUE'].rank(pct=True) * 100
+        st.rows_out = len(rank)
+    log_frame(logger, '### issue_rank ###', rank)
+
+    return rank
+
+
+def read_issue_rank(day):
+    # compute_issue_rank 결과(issue_rank 테이블)의 day 일자 행
+    reader = _clickhouse_reader()
+    df = reader.read_financial(table_name=f"{_conf()['db_somemoney_data']}.issue_rank", cond=f" FINAL WHERE WRITE_DT = '{day}'")
+    return df.to_dict('records')
+
+
+def read_issue_aliases(day):
+    # 뉴스 종목명(issue_score.STOCK) -> 매칭된 종목코드 (check_nan 별칭 매칭 포함)
+    # issue_score 는 STOCK 기준으로 일자 간 합쳐지므로 day 까지 기록된 종목명 전체의 가장 최근 매칭
+    reader = _clickhouse_reader()
+    df = reader.read_query(f"SELECT STOCK, argMax(CMP_CD, WRITE_DT) AS CMP_CD FROM {_conf()['db_somemoney_data']}.issue_score"
+                           f" WHERE WRITE_DT <= '{day}' GROUP BY STOCK")
+    return df.to_dict('records')
+
+
+def _clickhouse_sink():
+    return issue_sinks.ClickHouseSink(_clickhouse_writer, chunksize=int(_conf()['chunksize']), convert=to_clickhouse_frame,
+                                      day_reader=_read_clickhouse_day)
+
+
+def get_sink(spec=None):
+    # ISSUE_SINKS 환경변수(기본 clickhouse)에 지정된 sink, 여러 개면 같은 결과를 모든 sink 에 기록 (변경 감지는 첫번째 sink 기준)
+    return issue_sinks.build_sink(spec, clickhouse=_clickhouse_sink)
+
+
+def write_clickhouse(issue_score_match, table_name='issue_score'):
+    return _clickhouse_sink().write(table_name, issue_score_match)
+
+
+def write_output(df, table_name='issue_score', sink=None):
+    # 결과를 sink(없으면 get_sink())에 기록
+    return (sink or get_sink()).write(table_name, df)
+
+
+def get_day_digest(day):
+    # nv_issue_score 의 day 행과 stock_master 최근 date 스냅샷의 digest (DB 에서 집계, 행을 가져오지 않음)
+    # 소스가 digest 조회를 지원하지 않거나(replay 등) 조회에 실패하면 None (변경 감지 없이 처리)
+    with instrumentation.stage('get_day_digest'):
+        try:
+            db = _sources['issue_db']()
+            reader = _sources['stock_master_reader']()
+            if not hasattr(db, 'get_daily_issue_digest') or not hasattr(reader, 'read_query'):
+                return None
+            issue = db.get_daily_issue_digest(day)
+            master = reader.read_query(MASTER_DIGEST_QUERY).iloc[0]
+        except Exception as e:
+            logger.warning(f'digest 조회 실패 - 변경 감지 없이 처리: {e}')
+            return None
+
+    return {
+        'WRITE_DT': day,
+        'ISSUE_DIGEST': f"{issue['CNT']}:{issue['HASH']}",
+        'MASTER_DIGEST': f"{master['date']}:{master['cnt']}:{master['hash']}",
+    }
+
+
+def read_digest(day, sink=None):
+    # 이전 실행에서 sink(없으면 get_sink()) 에 저장한 day 의 digest (없거나 조회 실패 시 None)
+    try:
+        df = read_day(DIGEST_TABLE, day, sink)
     except Exception as e:
-        logger.error(f'error {e}')
-    
-    return 
+        logger.warning(f'{DIGEST_TABLE} 조회 실패: {e}')
+        return None
+    if df.empty:
+        return None
+    return df.iloc[-1].to_dict()
+
+
+def is_unchanged(digest, previous):
+    return (digest is not None and previous is not None
+            and digest['ISSUE_DIGEST'] == previous['ISSUE_DIGEST']
+            and digest['MASTER_DIGEST'] == previous['MASTER_DIGEST'])
+
+
+def write_digest(digest, sink):
+    df = pd.DataFrame([dict(digest, UPDATED_AT=datetime.now().strftime('%Y-%m-%d %H:%M:%S'))])
+    return sink.write(DIGEST_TABLE, df) > 0
+
+
+def read_day(table_name, day, sink=None):
+    # sink(없으면 get_sink(), 여러 sink 면 첫번째 sink) 에 기록된 결과 테이블의 day 일자 행
+    return (sink or get_sink()).read_day(table_name, day)
+
+
+def _read_clickhouse_day(table_name, day):
+    # 결과 테이블(somemoney_data)의 day 일자 행
+    reader = _clickhouse_reader()
+    return reader.read_financial(table_name=f"{_conf()['db_somemoney_data']}.{table_name}", cond=f" FINAL WHERE WRITE_DT = '{day}'")
+
+
+def changed_rows(df, previous, keys):
+    # previous(이전에 기록된 같은 일자 행) 대비 새로 추가되었거나 값이 바뀐 행 (bool 배열)
+    #  - 값은 ClickHouse 테이블 형식으로 변환한 뒤, 숫자로 변환되는 컬럼은 float 로 비교
+    if previous is None or previous.empty:
+        return np.ones(len(df), dtype=bool)
+
+    keys = list(keys)
+    new = to_clickhouse_frame(df).reset_index(drop=True)
+    old = previous.drop_duplicates(keys, keep='last').reset_index(drop=True)
+    columns = [x for x in new.columns if x in old.columns]
+
+    old_index = pd.MultiIndex.from_frame(old[keys].astype(str))
+    pos = old_index.get_indexer(pd.MultiIndex.from_frame(new[keys].astype(str)))
+    old_hash = _row_hash(old, columns)
+    new_hash = _row_hash(new, columns)
+    return (pos < 0) | (old_hash[np.maximum(pos, 0)] != new_hash)
+
+
+def removed_rows(df, previous, keys):
+    # previous 에는 있으나 df 에서 없어진 key 의 수
+    if previous is None or previous.empty:
+        return 0
+    keys = list(keys)
+    old_index = pd.MultiIndex.from_frame(previous[keys].astype(str)).unique()
+    new_index = pd.MultiIndex.from_frame(to_clickhouse_frame(df)[keys].astype(str))
+    return int((~old_index.isin(new_index)).sum())
+
+
+def write_day(sink, table_name, df, day, incremental=False):
+    # key 에 WRITE_DT 가 있는 테이블은 이전에 기록된 day 행을 지우고 day 행 전체를 기록 (없어진 key 도 반영)
+    #  - incremental 이면 이전 행과 비교하여 바뀐 행/없어진 key 가 없을 때 기록 생략
+    # key 에 WRITE_DT 가 없는 테이블(issue_score)은 항상 전체 기록
+    # return: 기록 성공 여부
+    keys = TABLE_KEYS.get(table_name, ('WRITE_DT', 'CMP_CD'))
+    if issue_sinks.PARTITION_COLUMN not in keys:
+        return sink.write(table_name, df) >= len(df)
+
+    try:
+        previous = read_day(table_name, day, sink)
+    except Exception as e:
+        if is_unknown_table(e):
+            # 처음 기록하는 테이블 (write_clickhouse 에서 생성)
+            previous = pd.DataFrame()
+        else:
+            logger.warning(f'{table_name} 이전 행 조회 실패 - day 전체 교체: {e}')
+            previous = None
+
+    if previous is not None and previous.empty:
+        return sink.write(table_name, df) >= len(df)
+
+    if incremental and previous is not None:
+        changed = int(changed_rows(df, previous, keys).sum())
+        removed = removed_rows(df, previous, keys)
+        logger.info(f'{table_name} {day}: 변경 {changed}, 삭제 {removed} / {len(df)} 행')
+        if changed == 0 and removed == 0:
+            return True
+    return sink.replace_day(table_name, df, day) >= len(df)
+
+
+def _row_hash(df, columns):
+    values = {}
+    for col in columns:
+        num = pd.to_numeric(df[col], errors='coerce')
+        values[col] = num.astype(float) if num.notna().sum() == df[col].notna().sum() else df[col].astype(str)
+    return pd.util.hash_pandas_object(pd.DataFrame(values, index=df.index), index=False).to_numpy()
 
 
 
 
 
 if __name__ == '__main__':
+    # Oracle 연결을 먼저 시작 (나머지 초기화와 겹치도록, ORACLE_PREWARM=0 이면 생략)
+    if os.environ.get('ORACLE_PREWARM', '1') != '0':
+        DBClientForIssueStock.prewarm()
+
+    import issue_features
+
     logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.DEBUG)
 
-    issue_score_df = get_issue_score()
-    stock_master_df = get_stock_master()
+    # --profile[=DIR] 또는 ISSUE_PROFILE_DIR 지정 시 프로파일링
+    argv, profile_dir = profiling.pop_profile_arg(sys.argv)
+
+    # [day] 지정 시 해당 일자 재처리, --force 는 digest 가 같아도 전체 처리
+    args = [x for x in argv[1:] if not x.startswith('--')]
+    force = '--force' in argv
 
-    issue_score_match = match_issue_score(issue_score_df, stock_master_df)
-    write_clickhouse(issue_score_match)
\ No newline at end of file
+    try:
+        with profiling.profile_run('issue_score_processing', profile_dir):
+            day = args[0] if args else datetime.today().strftime('%Y-%m-%d')
+            # ISSUE_SINKS=clickhouse,parquet 이면 ClickHouse 와 로컬 parquet 파일에 함께 기록
+            sink = get_sink()
+
+            # nv_issue_score / stock_master 가 이전 실행과 같으면 match/write 생략, 바뀐 경우 바뀐 테이블의 일자 행만 다시 기록
+            digest = get_day_digest(day)
+            previous = None if force else read_digest(day, sink)
+
+            if is_unchanged(digest, previous):
+                logger.info(f'{day} 변경 없음 (issue {digest["ISSUE_DIGEST"]}, master {digest["MASTER_DIGEST"]}) - 생략')
+            else:
+                incremental = previous is not None
+
+                # Oracle / ClickHouse 동시 조회 (결측 종목 이력 조회 포함)
+                issue_score_df, stock_master_df = fetch_sources(day)
+
+                issue_score_match = match_issue_score(issue_score_df, stock_master_df)
+                ok = write_day(sink, 'issue_score', issue_score_match, day, incremental)
+
+                # 전체 종목 기준 순위/decile 사전 계산 (issue_stock 조회용)
+                issue_rank = compute_issue_rank(issue_score_match, stock_master_df, day)
+                ok = write_day(sink, 'issue_rank', issue_rank, day, incremental) and ok
+
+                # 종목별 시계열 특성 (이동평균/z-score/백분위/뉴스 경과일) 증분 계산
+                try:
+                    issue_feature = issue_features.update_features(day, issue_score_match, stock_master_df)
+                    ok = write_day(sink, issue_features.FEATURE_TABLE, issue_feature, day, incremental) and ok
+                except Exception as e:
+                    logger.error(f'issue_feature error {e}')
+                    ok = False
+
+                # 모든 결과가 기록된 경우에만 digest 저장 (실패한 일자는 다음 실행에서 다시 처리)
+                if digest is not None and ok:
+                    write_digest(digest, sink)
+    finally:
+        # ISSUE_METRICS_JSON / ISSUE_METRICS_PROM 환경변수가 지정된 경우 실행 요약 기록 (실패한 실행 포함)
+        instrumentation.export_metrics()
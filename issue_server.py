@@ -0,0 +1,311 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- issue_stock 조회용 asyncio HTTP 서버 (표준 라이브러리만 사용)
+- 프로세스가 상주하므로 import / Oracle 연결 / 일자별 캐시를 요청마다 다시 만들지 않음
+- endpoints (GET, 응답은 JSON)
+    /score?stock=삼성전자[&day=YYYY-mm-dd]
+    /scores?stocks=삼성전자,005930[&day=YYYY-mm-dd]     (POST /scores 로 {"stocks": [...], "day": ...} 도 가능)
+    /top[?day=YYYY-mm-dd&n=3&market=KOSPI&analysis_only=1]
+    /health
+- 같은 요청이 동시에 들어오면 한번만 계산 (request coalescing)
+- 응답에 ETag 를 붙이고, 해당 일자 데이터(및 stock_master 매칭 정보)가 바뀌지 않았으면 If-None-Match 요청에 304 응답
+
+usage:
+    python issue_server.py [--host=127.0.0.1] [--port=8080] [--pool=4] [--workers=8]
+'''
+
+import sys
+import json
+import asyncio
+import hashlib
+import logging
+import urllib.parse
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+
+import json_patch
+import issue_stock
+from issue_data_source import PooledSource
+
+
+logger = logging.getLogger('issue_server')
+
+_MAX_LINE = 8192
+_MAX_HEADERS = 100
+_MAX_BODY = 1024 * 1024
+
+_STATUS_TEXT = {
+    200: 'OK',
+    304: 'Not Modified',
+    400: 'Bad Request',
+    404: 'Not Found',
+    405: 'Method Not Allowed',
+    413: 'Payload Too Large',
+    500: 'Internal Server Error',
+}
+
+
+class HttpError(Exception):
+
+    def __init__(self, status, message=''):
+        super(HttpError, self).__init__(message)
+        self.status = status
+        self.message = message or _STATUS_TEXT.get(status, '')
+
+
+class IssueServer(object):
+    '''
+    issue_stock 함수들을 HTTP 로 제공
+        - source:  issue_data_source.PooledSource 등 데이터 소스 (None 이면 issue_stock 기본 소스)
+        - workers: 캐시 miss 시 DB 조회를 수행할 스레드 수
+    '''
+
+    def __init__(self, source=None, host='127.0.0.1', port=8080, workers=8):
+        if source is not None:
+            issue_stock.set_data_source(source)
+        self.host = host
+        self.port = port
+        self.executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='issue_server')
+        self.server = None
+
+        self._inflight = {}
+        self.stats = {'requests': 0, 'not_modified': 0, 'coalesced': 0, 'errors': 0}
+
+        self._routes = {
+            '/score': self._score,
+            '/scores': self._scores,
+            '/top': self._top,
+        }
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host, self.port, limit=_MAX_LINE)
+        self.port = self.server.sockets[0].getsockname()[1]
+        logger.info(f'issue_server listening on {self.host}:{self.port}')
+        return self
+
+    async def serve_forever(self):
+        if self.server is None:
+            await self.start()
+        async with self.server:
+            await self.server.serve_forever()
+
+    async def close(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+        self.executor.shutdown(wait=False)
+
+    ###################################################################################################
+    # http
+    ###################################################################################################
+
+    async def _handle(self, reader, writer):
+        try:
+            while True:
+                request = await self._read_request(reader)
+                if request is None:
+                    break
+                method, target, version, headers, body = request
+
+                status, extra_headers, payload = await self._respond(method, target, headers, body)
+                keep_alive = version == 'HTTP/1.1' and headers.get('connection', '').lower() != 'close'
+                # HEAD 는 GET 과 같은 헤더(Content-Length 포함)에 본문만 제외
+                writer.write(_build_response(status, extra_headers, payload, keep_alive, with_body=method != 'HEAD'))
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        except HttpError as e:
+            # 요청을 해석할 수 없는 경우 (잘못된 요청 줄/헤더, 너무 긴 줄 등) 응답 후 연결 종료
+            try:
+                writer.write(_build_response(e.status, {}, _error_body(e), False))
+                await writer.drain()
+            except ConnectionError:
+                pass
+        finally:
+            try:
+                writer.close()
+            except Exception:
+                pass
+
+    async def _read_request(self, reader):
+        line = await _read_line(reader)
+        if not line:
+            return None
+        try:
+            method, target, version = line.decode('latin-1').rstrip('\r\n').split(' ', 2)
+        except ValueError:
+            raise HttpError(400, 'invalid request line')
+
+        headers = {}
+        for _ in range(_MAX_HEADERS):
+            line = await _read_line(reader)
+            if line in (b'\r\n', b'\n', b''):
+                break
+            key, _, value = line.decode('latin-1').partition(':')
+            headers[key.strip().lower()] = value.strip()
+        else:
+            raise HttpError(400, 'too many headers')
+
+        try:
+            length = int(headers.get('content-length') or 0)
+        except ValueError:
+            raise HttpError(400, 'invalid content-length')
+        if length < 0:
+            raise HttpError(400, 'invalid content-length')
+        if length > _MAX_BODY:
+            raise HttpError(413)
+        body = await reader.readexactly(length) if length else b''
+        return method.upper(), target, version, headers, body
+
+    async def _respond(self, method, target, headers, body):
+        self.stats['requests'] += 1
+        url = urllib.parse.urlsplit(target)
+        params = {k: v[-1] for k, v in urllib.parse.parse_qs(url.query).items()}
+
+        try:
+            if url.path == '/health':
+                return 200, {}, json_patch.dump_json({'status': 'ok', 'stats': self.stats}).encode('utf8')
+
+            route = self._routes.get(url.path)
+            if route is None:
+                raise HttpError(404)
+            if method == 'POST' and url.path == '/scores':
+                params.update(_parse_json_body(body))
+            elif method not in ('GET', 'HEAD'):
+                raise HttpError(405)
+
+            day = params.get('day') or datetime.today().strftime('%Y-%m-%d')
+            _check_day(day)
+            params['day'] = day
+
+            # 일자 데이터 + stock_master 버젼 + 요청 파라미터로 ETag 를 만들어 계산 전에 304 여부 판단
+            version = await self._run(('version', day), issue_stock.get_day_version, day)
+            request_key = json.dumps([url.path, sorted(params.items())], ensure_ascii=False)
+            etag = '"%s-%s"' % (version, hashlib.blake2b(request_key.encode('utf8'), digest_size=8).hexdigest())
+            if etag in _split_etags(headers.get('if-none-match', '')):
+                self.stats['not_modified'] += 1
+                return 304, {'ETag': etag}, b''
+
+            result = await self._run((request_key, version), route, params)
+            payload = json_patch.dump_json(result).encode('utf8')
+            return 200, {'ETag': etag, 'Cache-Control': 'no-cache'}, payload
+
+        except HttpError as e:
+            return e.status, {}, _error_body(e)
+        except Exception as e:
+            self.stats['errors'] += 1
+            logger.exception(f'{method} {target} failed')
+            return 500, {}, _error_body(HttpError(500, str(e)))
+
+    async def _run(self, key, func, *args):
+        '''executor 에서 func 실행, 같은 key 가 진행중이면 그 결과를 함께 기다림'''
+
+        future = self._inflight.get(key)
+        if future is None:
+            future = asyncio.get_running_loop().run_in_executor(self.executor, func, *args)
+            self._inflight[key] = future
+            future.add_done_callback(lambda _: self._inflight.pop(key, None))
+        else:
+            self.stats['coalesced'] += 1
+        return await asyncio.shield(future)
+
+    ###################################################################################################
+    # routes (executor 스레드에서 실행)
+    ###################################################################################################
+
+    def _score(self, params):
+        stock = params.get('stock')
+        if not stock:
+            raise HttpError(400, 'stock is required')
+        return issue_stock.get_issue_score(stock, params['day'])
+
+    def _scores(self, params):
+        stocks = params.get('stocks')
+        if isinstance(stocks, str):
+            stocks = [x.strip() for x in stocks.split(',') if x.strip()]
+        if not stocks:
+            raise HttpError(400, 'stocks is required')
+        return issue_stock.get_issue_scores(stocks, params['day'])
+
+    def _top(self, params):
+        try:
+            n = int(params.get('n', 3))
+        except ValueError:
+            raise HttpError(400, 'n must be an integer')
+        analysis_only = str(params.get('analysis_only', '')).lower() in ('1', 'true', 'y')
+        return issue_stock.get_issue_stocks(params['day'], top_n=n, market=params.get('market') or None,
+                                            analysis_only=analysis_only)
+
+
+###########################################################################################################
+# private function
+###########################################################################################################
+
+
+async def _read_line(reader):
+    # _MAX_LINE 보다 긴 줄은 413 (StreamReader limit 초과 시 ValueError)
+    try:
+        return await reader.readline()
+    except (ValueError, asyncio.LimitOverrunError):
+        raise HttpError(413, 'request line or header too long')
+
+
+def _build_response(status, headers, payload, keep_alive, with_body=True):
+    lines = ['HTTP/1.1 %d %s' % (status, _STATUS_TEXT.get(status, ''))]
+    if status != 304:
+        lines.append('Content-Type: application/json; charset=utf-8')
+    lines.append('Content-Length: %d' % len(payload))
+    lines.append('Connection: %s' % ('keep-alive' if keep_alive else 'close'))
+    for k, v in headers.items():
+        lines.append('%s: %s' % (k, v))
+    return ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1') + (payload if with_body else b'')
+
+
+def _error_body(error):
+    return json_patch.dump_json({'error': error.message}).encode('utf8')
+
+
+def _parse_json_body(body):
+    try:
+        data = json_patch.load_json(body.decode('utf8'))
+    except Exception:
+        raise HttpError(400, 'invalid json body')
+    if not isinstance(data, dict):
+        raise HttpError(400, 'json body must be an object')
+    return data
+
+
+def _check_day(day):
+    try:
+        datetime.strptime(day, '%Y-%m-%d')
+    except (TypeError, ValueError):
+        raise HttpError(400, 'day must be YYYY-mm-dd')
+
+
+def _split_etags(value):
+    return {x.strip() for x in value.split(',') if x.strip()}
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+
+    opts = dict(x[2:].partition('=')[::2] for x in sys.argv[1:] if x.startswith('--'))
+
+    server = IssueServer(source=PooledSource(size=int(opts.get('pool', 4))),
+                         host=opts.get('host', '127.0.0.1'),
+                         port=int(opts.get('port', 8080)),
+                         workers=int(opts.get('workers', 8)))
+    try:
+        asyncio.run(server.serve_forever())
+    except KeyboardInterrupt:
+        pass
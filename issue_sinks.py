@@ -0,0 +1,293 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- issue_score_processing 결과(issue_score, issue_rank, issue_feature)를 기록하는 sink
+    - ClickHouseSink:  ClickHouseWriter 로 테이블에 insert
+    - ParquetSink:     로컬 디렉토리에 일자(WRITE_DT) 파티션 parquet / arrow(IPC) 파일로 저장
+                       root_dir/{table}/WRITE_DT={day}/part-0.parquet
+                       STOCK, CMP_CD 는 dictionary 인코딩 (lean 모드의 categorical 은 코드 배열을 복사 없이 사용)
+    - MultiSink:       여러 sink 에 같은 DataFrame 을 기록 (한 sink 의 실패가 다른 sink 에 영향 없음)
+                       이전 기록 조회(read_day)는 첫번째 sink (primary) 에서
+- 사용할 sink 는 ISSUE_SINKS 환경변수 (예: clickhouse,parquet), 파일 저장 위치는 ISSUE_PARQUET_DIR 환경변수
+- 저장된 파일은 read_dataset 으로 기간/컬럼을 지정하여 읽음 (DB 재조회 없이 분석용으로 사용)
+- parquet / arrow 저장에는 pyarrow 가 필요
+'''
+
+import os
+import glob
+import logging
+
+from lazy_import import lazy_import
+
+import instrumentation
+
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+pa = lazy_import('pyarrow')
+pq = lazy_import('pyarrow.parquet')
+ds = lazy_import('pyarrow.dataset')
+
+logger = logging.getLogger('issue_sinks')
+
+SINKS_ENV = 'ISSUE_SINKS'
+PARQUET_DIR_ENV = 'ISSUE_PARQUET_DIR'
+DEFAULT_SINKS = 'clickhouse'
+DEFAULT_PARQUET_DIR = './issue_parquet'
+
+PARTITION_COLUMN = 'WRITE_DT'
+DICTIONARY_COLUMNS = ('STOCK', 'CMP_CD')
+
+# file_format -> (파일 확장자, pyarrow.dataset format)
+_FILE_FORMATS = {
+    'parquet': ('parquet', 'parquet'),
+    'arrow': ('arrow', 'ipc'),
+}
+
+
+###########################################################################################################
+# public function/class
+###########################################################################################################
+
+
+class Sink(object):
+    '''sink 의 부모 class'''
+
+    name = 'sink'
+
+    def write(self, table_name, df):
+        '''df 를 table_name 에 기록하고 기록한 행 수를 반환 (오류 시 -1, 행이 없는 df 의 기록 성공(0)과 구분)'''
+
+        raise Exception('write() method not implemented')
+
+    def replace_day(self, table_name, df, day):
+        '''
+        day 일자 행을 모두 df 로 교체 (df 에 없는 기존 행은 삭제)
+        기본 구현은 write (일자 파티션 파일을 통째로 교체하는 sink 등)
+        '''
+
+        return self.write(table_name, df)
+
+    def read_day(self, table_name, day):
+        '''이전에 기록한 table_name 의 day 일자 행 (DataFrame, 기록한 적 없으면 빈 DataFrame), 조회 실패 시 예외'''
+
+        raise NotImplementedError(f'{self.name} sink does not support read_day')
+
+
+class ClickHouseSink(Sink):
+    '''ClickHouseWriter 로 기록 (오류는 로그만 남기고 -1 반환)'''
+
+    name = 'clickhouse'
+
+    def __init__(self, writer_factory, chunksize=10000, convert=None, day_reader=None):
+        # writer_factory: ClickHouseWriter 생성 함수 (기록할 때마다 연결)
+        # convert: ClickHouse 테이블 형식으로 변환하는 함수 (lean 모드 categorical/datetime -> String 등)
+        # day_reader: day_reader(table_name, day) -> 기록된 day 일자 행 DataFrame (read_day 용)
+        self.writer_factory = writer_factory
+        self.chunksize = chunksize
+        self.convert = convert
+        self.day_reader = day_reader
+
+    def read_day(self, table_name, day):
+        if self.day_reader is None:
+            return super(ClickHouseSink, self).read_day(table_name, day)
+        return self.day_reader(table_name, day)
+
+    def write(self, table_name, df):
+        return self._write(table_name, df)
+
+    def replace_day(self, table_name, df, day):
+        # day 행을 지운 뒤 전체 insert (key 에 WRITE_DT 가 있는 테이블만 사용, 삭제 실패 시 insert 하지 않음)
+        return self._write(table_name, df, day)
+
+    def _write(self, table_name, df, day=None):
+        # write_clickhouse 는 insert 전 단계(스키마 조회, shard local 테이블 확인)의 오류는 예외,
+        # insert 중 오류는 로그만 남기고 기록된 행 수를 반환 (행 수가 모자라면 write_day 에서 실패로 판단)
+        written = -1
+        with instrumentation.stage('write_clickhouse', rows_in=len(df)) as st:
+            try:
+                writer = self.writer_factory()
+                if day is not None:
+                    writer.delete_day(table_name, day)
+                data = self.convert(df) if self.convert else df
+                written = st.rows_out = writer.write_clickhouse(table_name, data, chunksize=self.chunksize) if len(data) else 0
+                logger.debug("완료!!")
+            except Exception as e:
+                logger.error(f'error {table_name}: {e}')
+                st.rows_out = 0
+        return written
+
+
+class ParquetSink(Sink):
+    '''일자 파티션 parquet / arrow 파일로 기록 (같은 일자 파티션은 덮어씀, 오류는 로그만 남기고 -1 반환)'''
+
+    def __init__(self, root_dir=None, file_format='parquet', partition_column=PARTITION_COLUMN,
+                 dictionary_columns=DICTIONARY_COLUMNS):
+        if file_format not in _FILE_FORMATS:
+            raise ValueError(f'unknown file format: {file_format}')
+        self.root_dir = root_dir or os.environ.get(PARQUET_DIR_ENV) or DEFAULT_PARQUET_DIR
+        self.file_format = file_format
+        self.partition_column = partition_column
+        self.dictionary_columns = dictionary_columns
+        self.name = file_format
+
+    def write(self, table_name, df):
+        written = -1
+        with instrumentation.stage(f'write_{self.file_format}', rows_in=len(df)) as st:
+            try:
+                written = st.rows_out = self._write(table_name, df)
+            except Exception as e:
+                logger.error(f'{self.file_format} error {table_name}: {e}')
+                st.rows_out = 0
+        return written
+
+    def replace_day(self, table_name, df, day):
+        # 일자 파티션 파일은 write 로 통째로 교체, 행이 없으면 파티션 파일 삭제
+        if df.empty:
+            path = self.partition_path(table_name, day)
+            try:
+                if os.path.exists(path):
+                    os.remove(path)
+            except Exception as e:
+                logger.error(f'{self.file_format} error {table_name}: {e}')
+                return -1
+            return 0
+        return self.write(table_name, df)
+
+    def read_day(self, table_name, day):
+        return read_dataset(table_name, day, day, root_dir=self.root_dir, file_format=self.file_format)
+
+    def partition_path(self, table_name, day):
+        ext, _ = _FILE_FORMATS[self.file_format]
+        return os.path.join(self.root_dir, table_name, f'{self.partition_column}={day}', f'part-0.{ext}')
+
+    def _write(self, table_name, df):
+        if df.empty:
+            return 0
+
+        # 파티션 컬럼은 디렉토리 이름으로만 저장 (hive 방식)
+        days = _partition_values(df[self.partition_column])
+        table = to_arrow(df.drop(columns=[self.partition_column]), self.dictionary_columns)
+
+        codes, uniques = pd.factorize(days)
+        for i, day in enumerate(uniques):
+            part = table if len(uniques) == 1 else table.take(np.flatnonzero(codes == i))
+            path = self.partition_path(table_name, day)
+            _write_file(part, path, self.file_format)
+            logger.debug(f'{path}: {part.num_rows} rows')
+        return table.num_rows
+
+
+class MultiSink(Sink):
+    '''여러 sink 에 같은 DataFrame 을 기록하고, 모든 sink 에 기록된 행 수(최소값)를 반환'''
+
+    name = 'multi'
+
+    def __init__(self, sinks):
+        self.sinks = list(sinks)
+
+    def write(self, table_name, df):
+        return self._write_all(table_name, lambda sink: sink.write(table_name, df))
+
+    def replace_day(self, table_name, df, day):
+        return self._write_all(table_name, lambda sink: sink.replace_day(table_name, df, day))
+
+    def read_day(self, table_name, day):
+        # 변경 감지는 첫번째 sink 에 기록된 행 기준
+        return self.sinks[0].read_day(table_name, day)
+
+    def _write_all(self, table_name, write):
+        written = []
+        for sink in self.sinks:
+            try:
+                written.append(write(sink))
+            except Exception as e:
+                logger.error(f'{sink.name} sink error {table_name}: {e}')
+                written.append(-1)
+        return min(written) if written else 0
+
+
+def build_sink(spec=None, clickhouse=None, root_dir=None):
+    '''
+    spec('clickhouse,parquet' 형식, 없으면 ISSUE_SINKS 환경변수) 의 sink 를 생성
+    clickhouse: ClickHouseSink 생성 함수, root_dir: parquet / arrow 저장 위치
+    '''
+
+    spec = spec or os.environ.get(SINKS_ENV) or DEFAULT_SINKS
+    sinks = []
+    for name in (x.strip().lower() for x in spec.split(',')):
+        if not name:
+            continue
+        if name == 'clickhouse':
+            if clickhouse is None:
+                raise ValueError('clickhouse sink factory is not given')
+            sinks.append(clickhouse())
+        elif name in _FILE_FORMATS:
+            sinks.append(ParquetSink(root_dir, file_format=name))
+        else:
+            raise ValueError(f'unknown sink: {name}')
+
+    if len(sinks) == 1:
+        return sinks[0]
+    return MultiSink(sinks)
+
+
+def to_arrow(df, dictionary_columns=DICTIONARY_COLUMNS):
+    '''DataFrame -> pyarrow.Table (index 제외, dictionary_columns 는 dictionary 인코딩)'''
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    for name in dictionary_columns:
+        i = table.schema.get_field_index(name)
+        if i < 0 or pa.types.is_dictionary(table.schema.field(i).type):
+            continue
+        table = table.set_column(i, name, table.column(i).dictionary_encode())
+    return table
+
+
+def read_dataset(table_name, start_day=None, end_day=None, columns=None, root_dir=None, file_format='parquet'):
+    '''ParquetSink 로 저장한 table_name 의 start_day ~ end_day 행 (DataFrame, STOCK/CMP_CD 는 categorical)'''
+
+    root_dir = root_dir or os.environ.get(PARQUET_DIR_ENV) or DEFAULT_PARQUET_DIR
+    ext, dataset_format = _FILE_FORMATS[file_format]
+    table_dir = os.path.join(root_dir, table_name)
+
+    # parquet / arrow 파일이 같은 파티션 디렉토리에 있을 수 있으므로 확장자로 구분 (쓰는 중인 .tmp 파일 제외)
+    paths = sorted(glob.glob(os.path.join(table_dir, f'{PARTITION_COLUMN}=*', f'*.{ext}')))
+    if not paths:
+        return pd.DataFrame(columns=columns)
+    partitioning = ds.partitioning(pa.schema([(PARTITION_COLUMN, pa.string())]), flavor='hive')
+    dataset = ds.dataset(paths, format=dataset_format, partitioning=partitioning, partition_base_dir=table_dir)
+
+    cond = None
+    if start_day:
+        cond = ds.field(PARTITION_COLUMN) >= start_day
+    if end_day:
+        cond = ds.field(PARTITION_COLUMN) <= end_day if cond is None else cond & (ds.field(PARTITION_COLUMN) <= end_day)
+    return dataset.to_table(columns=columns, filter=cond).to_pandas()
+
+
+###########################################################################################################
+# private function
+###########################################################################################################
+
+
+def _partition_values(col):
+    # 파티션 디렉토리 이름으로 쓸 일자 문자열 (lean 모드의 datetime64 는 YYYY-mm-dd)
+    if pd.api.types.is_datetime64_any_dtype(col):
+        return col.dt.strftime('%Y-%m-%d').to_numpy()
+    return col.astype(str).to_numpy()
+
+
+def _write_file(table, path, file_format):
+    # 임시 파일에 쓴 뒤 교체 (읽는 쪽에서 쓰다 만 파일이 보이지 않도록)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    tmp_path = path + '.tmp'
+    if file_format == 'parquet':
+        pq.write_table(table, tmp_path)
+    else:
+        # 압축하지 않은 IPC 파일은 memory map 으로 복사 없이 읽을 수 있음
+        with pa.OSFile(tmp_path, 'wb') as f:
+            with pa.ipc.new_file(f, table.schema) as writer:
+                writer.write_table(table)
+    os.replace(tmp_path, path)
@@ -1,82 +1,265 @@
 import os
+import re
 import sys
 import copy
 import logging
 from datetime import timedelta, datetime
 
-import pandas as pd
+from lazy_import import lazy_import
 
-from db_client_for_stock_news import DBClientForIssueStock
+from issue_data_source import DirectSource
+from issue_day_cache import DayCache, RankEntry, TTLValue
+from issue_topn import DayScores, MasterInfo, top_movers
 import json_patch
+import profiling
+
+# pandas 는 처음 사용하는 시점에 import
+pd = lazy_import('pandas')
 
 _SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
+logger = logging.getLogger('issue_stock')
 
 
-def get_issue_score(stock_name, day=None):
-    # day: iso-date format (YYYY-mm-dd)
+# 조회 데이터 소스 (issue_server 등에서 set_data_source 로 교체)
+_data_source = DirectSource()
+
+
+def set_data_source(source):
+    # source: issue_data_source.DirectSource 와 같은 인터페이스의 객체
+    global _data_source
+    _data_source = source
+    _day_cache.invalidate()
+    _rank_cache.invalidate()
+    _master_cache.invalidate()
 
-    if not day:
-        day = datetime.today().strftime('%Y-%m-%d')
 
-    db = DBClientForIssueStock()
-    rows = db.get_daily_issue_stocks(day)
+def _load_daily_issue_stocks(day):
+    return _data_source.get_daily_issue_stocks(day)
     # row examples:
     #    {'WRITE_DT': '2020-12-24', 'STOCK': '삼성전자', 'ISSUE': 7.0688}
     #    {'WRITE_DT': '2020-12-24', 'STOCK': '삼성증권', 'ISSUE': 5.0295}
     # 주의할 점: 해당일에 뉴스가 있는 종목들에 대해서만 결과가 존재
 
-    df = pd.DataFrame(rows)
-    df.set_index('STOCK', inplace=True)
-    # TODO: 뉴스 있는 종목만 나오므로 전체 순위 구하는 것은 수정해야함
-    df['total_rank'] = df['ISSUE'].rank(ascending=False)
 
-    # TODO: 코스피/코스닥 필터링 후 market_rank 구하기
+# 일자별 조회 결과 캐시 (오늘 데이터는 1분, 지난 일자는 LRU 에서 밀려날 때까지 유지)
+_day_cache = DayCache(_load_daily_issue_stocks, maxsize=32, ttl=None, today_ttl=60)
 
 
-    # TODO: market_rank 및 decile 정보 추가하기
+def _load_daily_issue_rank(day):
+    # issue_score_processing 일일 작업이 사전 계산한 전체 종목 순위 (아직 없으면 빈 결과)
     try:
-        item = df.loc[stock_name]
+        return _data_source.get_issue_rank(day)
+    except Exception as e:
+        logger.warning(f'issue_rank 조회 실패 {day}: {e}')
+        return []
+
+
+def _rank_entry(day, rows):
+    # 순위 행 + 뉴스 종목명(별칭 매칭 포함) -> 종목코드 (순위가 없으면 조회하지 않음)
+    aliases = []
+    if rows:
+        try:
+            aliases = _data_source.get_issue_aliases(day)
+        except Exception as e:
+            logger.warning(f'issue_score 종목명 조회 실패 {day}: {e}')
+    return RankEntry(day, rows, aliases)
+
+
+# 일자별 사전 계산 순위 캐시
+_rank_cache = DayCache(_load_daily_issue_rank, maxsize=32, ttl=None, today_ttl=60, entry_class=_rank_entry)
+
+
+def _load_stock_master():
+    # 종목코드/시장/analysis_filter 매칭 정보 (stock_master 최근 date 기준)
+    import issue_score_processing
+
+    return MasterInfo(_data_source.get_stock_master(), market_column=issue_score_processing.MARKET_COLUMN)
+
+
+# stock_master 매칭 정보 캐시 (1시간)
+_master_cache = TTLValue(_load_stock_master, ttl=3600)
+
+# 종목코드(CMP_CD) 형식: 6자리 숫자 (앞에 'A' 가 붙는 경우 포함)
+_CMP_CD_PATTERN = re.compile(r'^A?\d{6}$')
+
+
+def get_day_version(day):
+    # day 의 조회 데이터(이슈점수 행 + 사전 계산 순위 + stock_master 매칭 정보) 버젼, 데이터가 바뀌지 않으면 같은 값
+    # stock_master 는 종목코드 조회, 시장 필터 및 top 결과의 종목코드에 쓰이므로 포함 (조회 실패 시 '0')
+    master_digest = _get_day_scores(day).master_digest
+    return '%s-%s-%s' % (_day_cache.get(day).digest, _rank_cache.get(day).digest, master_digest or '0')
+
+
+def get_issue_score(stock_name, day=None):
+    # day: iso-date format (YYYY-mm-dd)
+
+    if not day:
+        day = datetime.today().strftime('%Y-%m-%d')
+
+    # 일일 작업이 사전 계산한 전체 종목 기준 순위가 있으면 사용 (total_rank, market_rank, decile)
+    rank_entry = _rank_cache.get(day)
+    if len(rank_entry):
+        item = rank_entry.lookup(stock_name)
+        if item is not None:
+            return {
+                'name': '이슈분석',
+                'score': item['ISSUE'], # 뉴스가 없는 종목은 중립 점수
+                'total_rank': int(item['total_rank']),
+                'market_rank': int(item['market_rank']),
+                'decile': int(item['decile']),
+            }
+        return {
+            'name': '이슈분석',
+            'score': 50,
+            'total_rank': round(rank_entry.total_size/2),
+            'market_rank': rank_entry.neutral_market_rank,
+            'decile': rank_entry.neutral_decile,
+        }
+
+    # 사전 계산 전(당일 배치 실행 전 등)에는 뉴스 있는 종목만으로 순위 계산
+    # 일자별 DataFrame 및 total_rank 는 캐시에서 미리 계산됨
+    entry = _day_cache.get(day)
+    item = entry.lookup(stock_name)
+    if item is not None:
+        score, total_rank = item
         return {
             'name': '이슈분석',
             #'score': (100.0 + item['ISSUE']) / 2, # 점수 정규화
-            'score': item['ISSUE'], # 뉴스분석단에서 점수를 이미 정규화함
-            'total_rank': round(item['total_rank']),
+            'score': score, # 뉴스분석단에서 점수를 이미 정규화함
+            'total_rank': round(total_rank),
         }
-    except:
+    else:
         return {
             'name': '이슈분석',
             'score': 50,
-            'total_rank': round(len(df)/2), # TODO: market_size/2
+            'total_rank': round(len(entry)/2),
         }
 
 
-def get_issue_stocks(day=None, top_n=3):
+def get_issue_scores(stocks, day=None, as_frame=False):
+    # stocks: 종목명 또는 종목코드(CMP_CD) 목록
+    # 하루치 데이터를 한번 조회한 뒤 reindex 로 일괄 매칭 (뉴스가 없는 종목은 score 50, total_rank len/2)
+    # return: {입력값: get_issue_score 와 같은 형식의 dict}, as_frame=True 이면 입력값 인덱스의 DataFrame
+
+    if not day:
+        day = datetime.today().strftime('%Y-%m-%d')
+
+    stocks = list(stocks)
+
+    # 사전 계산 순위가 있으면 종목코드/종목명 모두 한번의 reindex 로 매칭
+    rank_entry = _rank_cache.get(day)
+    if len(rank_entry):
+        df = rank_entry.by_key.reindex([str(x).replace(' ', '') for x in stocks])
+        df.index = pd.Index(stocks, name='key')
+        df['found'] = df['ISSUE'].notna()
+        df['score'] = df['ISSUE'].fillna(50)
+        df['total_rank'] = df['total_rank'].fillna(rank_entry.total_size/2).round().astype(int)
+        df['market_rank'] = df['market_rank'].fillna(rank_entry.neutral_market_rank).astype(int)
+        df['decile'] = df['decile'].fillna(rank_entry.neutral_decile).astype(int)
+        df = df[['STOCK', 'CMP_CD', 'score', 'total_rank', 'market_rank', 'decile', 'found']]
+        if as_frame:
+            return df
+        return {key: {
+            'name': '이슈분석',
+            'score': score,
+            'total_rank': total_rank,
+            'market_rank': market_rank,
+            'decile': decile,
+        } for key, score, total_rank, market_rank, decile in zip(
+            stocks, df['score'].tolist(), df['total_rank'].tolist(), df['market_rank'].tolist(), df['decile'].tolist())}
+
+    entry = _day_cache.get(day)
+
+    # 종목코드는 stock_master 종목명을 거쳐 해당일 종목명(STOCK)으로 변환
+    keys = stocks
+    if any(isinstance(x, str) and _CMP_CD_PATTERN.match(x) for x in stocks):
+        code_to_name = _master_cache.get().code_to_name
+        keys = [entry.norm_names.get(code_to_name[x], code_to_name[x]) if x in code_to_name else x for x in stocks]
+
+    df = entry.scores.reindex(keys)
+    df.index = pd.Index(stocks, name='key')
+    df.insert(0, 'STOCK', keys)
+    df['found'] = df['ISSUE'].notna()
+    df['score'] = df['ISSUE'].fillna(50)
+    df['total_rank'] = df['total_rank'].fillna(len(entry)/2).round().astype(int)
+    df = df[['STOCK', 'score', 'total_rank', 'found']]
+
+    if as_frame:
+        return df
+
+    return {key: {
+        'name': '이슈분석',
+        'score': score,
+        'total_rank': total_rank,
+    } for key, score, total_rank in zip(stocks, df['score'].tolist(), df['total_rank'].tolist())}
+
+
+def _get_day_scores(day):
+    # 일자별 점수 배열은 day cache 항목에 만들어 두고, day cache 또는 stock_master 캐시가 갱신되면 다시 생성
+    # stock_master 조회에 실패하면 이전 점수 배열을 그대로 쓰고, 없으면 매칭 정보 없이 만들되 캐싱하지 않음
+    entry = _day_cache.get(day)
+    day_scores = getattr(entry, 'day_scores', None)
+    try:
+        master = _master_cache.get()
+    except Exception as e:
+        if day_scores is not None:
+            return day_scores
+        logger.warning(f'stock_master 조회 실패 - 종목코드/시장 필터 없이 진행: {e}')
+        return DayScores(day, entry.rows, None)
+    if day_scores is None or day_scores.master_digest != master.digest:
+        day_scores = entry.day_scores = DayScores(day, entry.rows, master)
+    return day_scores
+
+
+def get_issue_stocks(day=None, top_n=3, market=None, analysis_only=False):
     # day: iso-date format (YYYY-mm-dd)
+    # market: 'KOSPI' / 'KOSDAQ' 등 시장 필터, analysis_only: analysis_filter == 1 인 종목만
 
     if not day:
         day = datetime.today().strftime('%Y-%m-%d')
 
-    db = DBClientForIssueStock()
-    rows = db.get_daily_issue_stocks(day)
+    #'score': (100.0 + x['ISSUE']) / 2, # 점수 정규화 - 뉴스분석단에서 점수를 이미 정규화함
+    return _get_day_scores(day).top(top_n, market=market, analysis_only=analysis_only)
 
-    top_n = sorted(rows, key=lambda x: x['ISSUE'], reverse=True)[:top_n]
 
-    # TODO: stock_code 추가하기
-    return [{
-        'date': x['WRITE_DT'],
-        'stock_name': x['STOCK'],
-        #'score': (100.0 + x['ISSUE']) / 2, # 점수 정규화
-        'score': item['ISSUE'], # 뉴스분석단에서 점수를 이미 정규화함
-    } for x in top_n]
+def get_top_movers(start_day, end_day, top_n=3, market=None, analysis_only=False, ascending=False):
+    # start_day ~ end_day 기간의 이슈점수 상승폭 상위 종목 (ascending=True 이면 하락폭 상위)
+    # start_day, end_day: iso-date format (YYYY-mm-dd), 기간은 일자별 캐시 크기(_day_cache.maxsize) 이내
+    # 변화폭은 시작일 대비 마지막 일자 점수, 기간 중 최고/최저/평균 점수 및 뉴스가 있던 일수도 함께 반환
+
+    return top_movers(_range_day_scores(start_day, end_day),
+                      n=top_n, market=market, analysis_only=analysis_only, ascending=ascending)
+
+
+def _range_day_scores(start_day, end_day):
+    # 기간의 일자순 점수 배열 목록
+    # 캐시에 없는 일자가 있으면 기간 전체를 한번에 조회하여 일자별로 캐시에 채움 (일자별 조회 반복 없음)
+    days = [x.strftime('%Y-%m-%d') for x in pd.date_range(start_day, end_day)]
+    if len(days) > _day_cache.maxsize:
+        raise ValueError(f'top movers 기간은 {_day_cache.maxsize}일 이내: {start_day} ~ {end_day}')
+
+    if not all(_day_cache.cached(x) for x in days):
+        by_day = {x: [] for x in days}
+        for row in _data_source.get_issue_stocks_by_date(start_day, end_day):
+            by_day.setdefault(str(row['WRITE_DT'])[:10], []).append(row)
+        for x in days:
+            if not _day_cache.cached(x):
+                _day_cache.put(x, by_day[x])
+    return [_get_day_scores(x) for x in days]
 
 
 if __name__ == '__main__':
 
     logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.DEBUG)
 
-    #stocks = get_issue_stocks('2020-12-01')
-    stocks = get_issue_stocks()
-    json_patch.print_json(stocks)
+    # --profile[=DIR] 또는 ISSUE_PROFILE_DIR 지정 시 프로파일링
+    argv, profile_dir = profiling.pop_profile_arg(sys.argv)
+
+    with profiling.profile_run('issue_stock', profile_dir):
+        #stocks = get_issue_stocks('2020-12-01')
+        stocks = get_issue_stocks()
+        json_patch.print_json(stocks)
+
+        issue_info = get_issue_score('삼성전자')
+        json_patch.print_json(issue_info)
 
-    issue_info = get_issue_score('삼성전자')
-    json_patch.print_json(issue_info)
@@ -0,0 +1,187 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 이슈점수 상위 N 종목 조회
+- 일자별로 점수 배열(numpy)과 종목코드/시장/analysis_filter 배열을 한번만 구성해두고
+  조회 시에는 필터 마스크 + np.argpartition 으로 상위 N 개만 선택 (전체 정렬 없음)
+- 여러 일자 구간의 점수 변화(top movers) 계산
+'''
+
+import hashlib
+import logging
+
+from lazy_import import lazy_import
+
+
+np = lazy_import('numpy')
+pd = lazy_import('pandas')
+
+logger = logging.getLogger('issue_topn')
+
+# 해당일에 뉴스가 없는 종목의 중립 점수 (top movers 계산용)
+NEUTRAL_SCORE = 50
+
+
+###########################################################################################################
+# public function/class
+###########################################################################################################
+
+
+class MasterInfo(object):
+    '''stock_master 에서 종목명 매칭에 필요한 정보만 추출'''
+
+    def __init__(self, stock_master_df, market_column='market'):
+        names = stock_master_df['CMP_NM_KOR'].str.replace(' ', '', regex=False)
+        if market_column in stock_master_df.columns:
+            market = stock_master_df[market_column].astype(str)
+        else:
+            market = pd.Series(None, index=stock_master_df.index, dtype=object)
+
+        by_name = pd.DataFrame({
+            'CMP_CD': stock_master_df['CMP_CD'].to_numpy(),
+            'MARKET': market.to_numpy(),
+            'analysis_filter': (stock_master_df['analysis_filter'].astype(str) == '1').to_numpy(),
+        }, index=names.to_numpy())
+        self.by_name = by_name[~by_name.index.duplicated()]
+
+        # 매칭 정보(종목명/종목코드/시장/analysis_filter)가 같으면 같은 값 (조회 응답의 ETag 용)
+        hashed = pd.util.hash_pandas_object(by_name, index=True).to_numpy()
+        self.digest = hashlib.blake2b(hashed.tobytes(), digest_size=8).hexdigest()
+
+        # CMP_CD -> 띄어쓰기 제거한 종목명
+        self.code_to_name = dict(zip(stock_master_df['CMP_CD'].tolist(), names.tolist()))
+
+
+class DayScores(object):
+    '''하루치 뉴스 종목의 점수 배열 및 필터용 배열'''
+
+    def __init__(self, day, rows, master=None):
+        self.day = day
+        self.master_digest = master.digest if master is not None else None
+        df = pd.DataFrame(rows)
+        if df.empty:
+            df = pd.DataFrame(columns=['WRITE_DT', 'STOCK', 'ISSUE'])
+
+        self.names = df['STOCK'].to_numpy(dtype=object)
+        self.dates = df['WRITE_DT'].astype(str).to_numpy(dtype=object)
+        self.scores = pd.to_numeric(df['ISSUE']).to_numpy(dtype=float)
+
+        if master is not None and len(df):
+            info = master.by_name.reindex(df['STOCK'].str.replace(' ', '', regex=False).to_numpy())
+            self.codes = info['CMP_CD'].to_numpy(dtype=object)
+            self.markets = info['MARKET'].to_numpy(dtype=object)
+            self.analysis_filter = info['analysis_filter'].fillna(False).to_numpy(dtype=bool)
+        else:
+            self.codes = np.full(len(df), None, dtype=object)
+            self.markets = np.full(len(df), None, dtype=object)
+            self.analysis_filter = np.zeros(len(df), dtype=bool)
+
+    def __len__(self):
+        return len(self.scores)
+
+    def top(self, n=3, market=None, analysis_only=False):
+        '''
+        상위 n 개 종목 (점수 내림차순)
+            - market:        'KOSPI' / 'KOSDAQ' 등 시장 필터
+            - analysis_only: analysis_filter == 1 인 종목만
+        '''
+
+        idx = self._filter(market, analysis_only)
+        selected = idx[_top_indices(self.scores[idx], n)]
+        return [{
+            'date': self.dates[i],
+            'stock_name': self.names[i],
+            'stock_code': self.codes[i],
+            'score': float(self.scores[i]),
+        } for i in selected]
+
+    def _filter(self, market, analysis_only):
+        mask = np.ones(len(self.scores), dtype=bool)
+        if market:
+            mask &= self.markets == market
+        if analysis_only:
+            mask &= self.analysis_filter
+        return np.flatnonzero(mask)
+
+
+def top_movers(day_scores, n=3, market=None, analysis_only=False, ascending=False):
+    '''
+    day_scores: 기간의 일자순 DayScores 목록, 기간 중 점수 변화 상위 n 개
+        - 뉴스가 없던 일자의 점수는 NEUTRAL_SCORE 로 간주
+        - change: 첫 일자 대비 마지막 일자의 점수 변화 (ascending=True 이면 하락폭 상위)
+        - max_score/min_score/mean_score: 기간 중 점수, news_days: 기간 중 뉴스가 있던 일수
+        - 종목코드/시장은 기간 중 마지막으로 매칭된 정보 (기간 중간에만 뉴스가 있던 종목 포함)
+    '''
+
+    if not day_scores:
+        return []
+    first, last = day_scores[0], day_scores[-1]
+
+    # 종목 x 일자 점수 (뉴스가 없던 일자는 NaN)
+    scores = pd.concat([_score_series(x) for x in day_scores], axis=1, keys=range(len(day_scores)))
+    names = scores.index
+    observed = scores.to_numpy(dtype=float).reshape(len(names), len(day_scores))
+    filled = np.where(np.isnan(observed), NEUTRAL_SCORE, observed)
+    delta = filled[:, -1] - filled[:, 0]
+
+    info = _stock_info(day_scores).reindex(names)
+    mask = np.ones(len(names), dtype=bool)
+    if market:
+        mask &= (info['MARKET'] == market).to_numpy()
+    if analysis_only:
+        mask &= info['analysis_filter'].fillna(False).to_numpy(dtype=bool)
+
+    idx = np.flatnonzero(mask)
+    selected = idx[_top_indices(-delta[idx] if ascending else delta[idx], n)]
+
+    codes = info['CMP_CD'].to_numpy(dtype=object)
+    news_days = (~np.isnan(observed)).sum(axis=1)
+    return [{
+        'stock_name': names[i],
+        'stock_code': codes[i] if isinstance(codes[i], str) else None,
+        'start_date': first.day,
+        'end_date': last.day,
+        'start_score': _nan_to_none(observed[i, 0]),
+        'end_score': _nan_to_none(observed[i, -1]),
+        'change': float(delta[i]),
+        'max_score': float(filled[i].max()),
+        'min_score': float(filled[i].min()),
+        'mean_score': float(filled[i].mean()),
+        'news_days': int(news_days[i]),
+    } for i in selected]
+
+
+###########################################################################################################
+# private function
+###########################################################################################################
+
+
+def _top_indices(values, n):
+    '''values 의 상위 n 개 위치 (내림차순), n 이 작으면 argpartition 으로 부분 선택만 수행'''
+
+    if n <= 0 or len(values) == 0:
+        return np.array([], dtype=np.int64)
+    if n < len(values):
+        part = np.argpartition(-values, n - 1)[:n]
+    else:
+        part = np.arange(len(values))
+    return part[np.argsort(-values[part], kind='stable')]
+
+
+def _score_series(day_scores):
+    s = pd.Series(day_scores.scores, index=day_scores.names)
+    return s[~s.index.duplicated()]
+
+
+def _stock_info(day_scores):
+    frames = [pd.DataFrame({'CMP_CD': x.codes, 'MARKET': x.markets, 'analysis_filter': x.analysis_filter}, index=x.names)
+              for x in day_scores if len(x)]
+    if not frames:
+        return pd.DataFrame(columns=['CMP_CD', 'MARKET', 'analysis_filter'])
+    info = pd.concat(frames)
+    return info[~info.index.duplicated(keep='last')]
+
+
+def _nan_to_none(value):
+    return None if value != value else float(value)
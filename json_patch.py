@@ -11,16 +11,22 @@
 
 
 import json
+import math
 import decimal
+import os
 import re
+import sys
+import itertools
+import collections
 from datetime import datetime
+from json.encoder import encode_basestring
 
 
 ###########################################################################################################
 # public function
 ###########################################################################################################
-def print_json(json_obj, ind='\t', max_indent='auto'):
-    print(dump_json(json_obj, ind=ind, max_indent=max_indent))
+def print_json(json_obj, ind='\t', max_indent='auto', orient='records'):
+    print(dump_json(json_obj, ind=ind, max_indent=max_indent, orient=orient))
 
 
 def load_json(json_str):
@@ -29,13 +35,17 @@ def load_json(json_str):
     try:
         json_obj = json.loads(json_str)
     except:
-        json_obj = json.loads(_remove_invalid_escape(json_str))
+        # 잘못된 escape 를 수정하고, 문자열 안의 제어문자(줄바꿈, 탭 등)는 그대로 허용
+        json_obj = json.loads(_remove_invalid_escape(json_str), strict=False)
 
     return json_obj
 
 
-def dump_json(json_obj, ind=None, max_indent=0):
-    '''Build json string from json object'''
+def dump_json(json_obj, ind=None, max_indent=0, orient='records'):
+    '''
+    Build json string from json object
+        - orient: DataFrame 출력 형태, 'records'([{컬럼: 값}, ...]) 또는 'columns'({컬럼: [값, ...]})
+    '''
 
     if isinstance(ind, int):
         if (ind <= 0):
@@ -49,12 +59,11 @@ def dump_json(json_obj, ind=None, max_indent=0):
         ind = None
 
     if (ind == None) or (max_indent == 0):
-        return _basic_dump(json_obj, ind)
+        if (ind == None) and _array_len(json_obj, orient) is not None:
+            return _IndentDumper(ind, 0, orient).dump(json_obj)
+        return _basic_dump(json_obj, ind, orient)
 
-    if max_indent == 'auto':
-        return _auto_indent(json_obj, ind)
-
-    return _partial_indent(json_obj, ind, max_indent)
+    return _IndentDumper(ind, max_indent, orient).dump(json_obj)
 
 
 ###########################################################################################################
@@ -63,21 +72,78 @@ def dump_json(json_obj, ind=None, max_indent=0):
 
 
 class PatchedJSONEncoder(json.JSONEncoder):
+    '''
+    Decimal, datetime 및 numpy/pandas 값 지원
+        - NaN/Infinity 는 json 표준이 아니므로 null (float, numpy 스칼라, DataFrame 모두 같게)
+        - numpy 스칼라/배열, pandas Timestamp/NaT/NA, DataFrame/Series
+        - DataFrame 은 orient 에 따라 'records'([{컬럼: 값}, ...]) 또는 'columns'({컬럼: [값, ...]}) 형태
+        - numpy/pandas 는 이미 import 된 경우에만 확인 (이 모듈에서 import 하지 않음)
+    '''
+
+    def __init__(self, *args, orient='records', **kwargs):
+        kwargs['allow_nan'] = False
+        super(PatchedJSONEncoder, self).__init__(*args, **kwargs)
+        _check_orient(orient)
+        self.orient = orient
+
+    def encode(self, obj):
+        # NaN/Infinity 가 없으면 그대로 (대부분의 경우), 있으면 null 로 바꾼 복사본을 다시 인코딩
+        try:
+            return super(PatchedJSONEncoder, self).encode(obj)
+        except ValueError as e:
+            if not str(e).startswith(_NON_FINITE_ERROR):
+                raise
+            return super(PatchedJSONEncoder, self).encode(_finite(obj))
 
     def default(self, obj):
         if isinstance(obj, decimal.Decimal):
             return float(obj)
+
+        pd = sys.modules.get('pandas')
+        if pd is not None:
+            if obj is pd.NaT or obj is pd.NA:
+                return None
+            if isinstance(obj, (pd.DataFrame, pd.Series)):
+                return _array_to_python(obj, self.orient)
+
         if isinstance(obj, datetime):
             return datetime.strftime(obj, '%Y-%m-%d %H:%M:%S')
+
+        np = sys.modules.get('numpy')
+        if np is not None:
+            if isinstance(obj, np.datetime64):
+                return None if np.isnat(obj) else str(obj.astype('datetime64[s]')).replace('T', ' ')
+            if isinstance(obj, np.generic):
+                value = obj.item()
+                return None if isinstance(value, float) and not math.isfinite(value) else value
+            if isinstance(obj, np.ndarray):
+                return _array_to_python(obj, self.orient)
+
         if callable(obj):
             return str(obj)
         return json.JSONEncoder.default(self, obj)
 
 
-def _basic_dump(json_obj, ind=None):
+def _basic_dump(json_obj, ind=None, orient='records'):
     '''Build json string from basic object'''
 
-    return json.dumps(json_obj, ensure_ascii=False, sort_keys=True, cls=PatchedJSONEncoder, indent=ind)
+    return PatchedJSONEncoder(ensure_ascii=False, sort_keys=True, indent=ind, orient=orient).encode(json_obj)
+
+
+# allow_nan=False 인 json encoder 가 NaN/Infinity 를 만났을 때의 오류 메세지
+_NON_FINITE_ERROR = 'Out of range float values are not JSON compliant'
+
+
+def _finite(json_obj):
+    '''list/tuple/dict 안의 NaN/Infinity float 을 None 으로 바꾼 복사본 (그 외 값은 그대로)'''
+
+    if isinstance(json_obj, float):
+        return json_obj if math.isfinite(json_obj) else None
+    if isinstance(json_obj, dict):
+        return {k: _finite(v) for k, v in json_obj.items()}
+    if isinstance(json_obj, (list, tuple)):
+        return [_finite(x) for x in json_obj]
+    return json_obj
 
 
 def _need_indent(json_obj):
@@ -86,64 +152,291 @@ def _need_indent(json_obj):
     return isinstance(json_obj, (list, tuple, dict)) and len(json_obj) > 0
 
 
-def _partial_indent(json_obj, ind=4, max_indent=2, depth=0):
-    '''Build json string from json object with partial indentation'''
+def _check_orient(orient):
+    if orient not in _ORIENTS:
+        raise ValueError(f'orient must be one of {_ORIENTS}: {orient!r}')
 
-    if (depth >= max_indent) or not _need_indent(json_obj):
-        return _basic_dump(json_obj)
 
-    ind_str1 = '\n' + ' ' * ind * depth
-    ind_str2 = '\n' + ' ' * ind * (depth+1)
+class _IndentDumper(object):
+    '''
+    partial/auto indent 출력을 한번의 순회로 생성
+        - 출력 조각을 하나의 리스트에 모아 마지막에 한번만 join (depth 마다 하위 문자열을 다시 복사하지 않음)
+        - auto: 차일드 중 비어있지 않은 list/dict 가 있는 노드만 들여씀 (노드마다 차일드를 한번만 확인)
+        - 들여쓰지 않는 노드/키/값은 공용 encoder 로 한번에 인코딩 (호출마다 encoder 를 새로 만들지 않음)
+        - DataFrame/Series/ndarray 는 컬럼 단위로 인코딩하고, 결과는 orient 에 따른 list/dict 로 변환한 것과 같음
+    '''
 
-    if isinstance(json_obj, dict):
-        children = map(lambda k: _basic_dump(k)+': '+_partial_indent(json_obj[k], ind, max_indent, depth+1), sorted(json_obj))
-        return ''.join(('{', ind_str2, (','+ind_str2).join(children), ind_str1, '}'))
-    else: # list, tuple
-        children = map(lambda x: _partial_indent(x, ind, max_indent, depth+1), json_obj)
-        return ''.join(('[', ind_str2, (','+ind_str2).join(children), ind_str1, ']'))
+    def __init__(self, ind, max_indent, orient='records'):
+        _check_orient(orient)
+        self.ind = ind
+        self.max_indent = max_indent
+        self.orient = orient
+        self.encoder = _ENCODERS[orient]
+        self.parts = []
+        self._newlines = []
 
+    def dump(self, json_obj):
+        self._dump(json_obj, 0)
+        return ''.join(self.parts)
 
-def _auto_indent(json_obj, ind=4, depth=0):
-    '''Build json string from json object with smart indentation'''
+    def _need_indent(self, json_obj):
+        if type(json_obj) in _LEAF_TYPES:
+            return False
+        if isinstance(json_obj, (list, tuple, dict)):
+            return len(json_obj) > 0
+        return bool(_array_len(json_obj, self.orient))
 
-    def need_auto_indent(json_obj):
-        if not _need_indent(json_obj):
+    def _expand(self, json_obj, depth):
+        if len(json_obj) == 0:
             return False
+        if self.max_indent != 'auto':
+            return depth < self.max_indent
         if isinstance(json_obj, dict):
-            return any(map(_need_indent, json_obj.values()))
-        return any(map(_need_indent, json_obj))
+            return any(map(self._need_indent, json_obj.values()))
+        return any(map(self._need_indent, json_obj))
+
+    def _newline(self, depth):
+        while len(self._newlines) <= depth:
+            self._newlines.append('\n' + ' ' * self.ind * len(self._newlines))
+        return self._newlines[depth]
+
+    def _dump(self, json_obj, depth):
+        append = self.parts.append
+        if type(json_obj) in _LEAF_TYPES:
+            append(_encode_flat(json_obj))
+            return
+        if not isinstance(json_obj, (list, tuple, dict)):
+            if _array_len(json_obj, self.orient) is not None:
+                self._dump_array(json_obj, depth)
+            else:
+                append(_encode_flat(json_obj, self.encoder))
+            return
+        if not self._expand(json_obj, depth):
+            append(_encode_flat(json_obj, self.encoder))
+            return
+
+        ind_str1 = self._newline(depth)
+        ind_str2 = self._newline(depth+1)
+        comma_str = ','+ind_str2
 
-    if not need_auto_indent(json_obj):
-        return _basic_dump(json_obj)
+        if isinstance(json_obj, dict):
+            append('{'+ind_str2)
+            for i, k in enumerate(sorted(json_obj)):
+                if i:
+                    append(comma_str)
+                append(_encode_flat(k, self.encoder))
+                append(': ')
+                self._dump(json_obj[k], depth+1)
+            append(ind_str1+'}')
+        else: # list, tuple
+            append('['+ind_str2)
+            for i, x in enumerate(json_obj):
+                if i:
+                    append(comma_str)
+                self._dump(x, depth+1)
+            append(ind_str1+']')
+
+    def _dump_array(self, json_obj, depth):
+        '''DataFrame/Series/ndarray: 차일드가 모두 한줄로 출력되는 경우 컬럼 단위 인코딩 결과를 그대로 사용'''
+
+        encoded = _encode_array(json_obj, self.orient)
+        if encoded is None:
+            self._dump(_array_to_python(json_obj, self.orient), depth)
+            return
+        items, complex_children = encoded
+
+        if self.max_indent == 'auto':
+            expand = len(items) > 0 and complex_children
+        else:
+            expand = len(items) > 0 and depth < self.max_indent
+            if expand and complex_children and depth+1 < self.max_indent:
+                # 차일드(행/컬럼)도 들여써야 하는 경우
+                self._dump(_array_to_python(json_obj, self.orient), depth)
+                return
 
-    ind_str1 = '\n' + ' ' * ind * depth
-    ind_str2 = '\n' + ' ' * ind * (depth+1)
-    comma_str = ','+ind_str2
+        is_dict = isinstance(items, dict)
+        if is_dict:
+            items = [k+': '+v for k, v in items.items()]
+        if not expand:
+            self.parts.append(''.join(('{' if is_dict else '[', ', '.join(items), '}' if is_dict else ']')))
+            return
 
-    if isinstance(json_obj, dict):
-        children = map(lambda k: _basic_dump(k)+': '+_auto_indent(json_obj[k], ind, depth+1), sorted(json_obj))
-        return ''.join(('{', ind_str2, comma_str.join(children), ind_str1, '}'))
-    else: # list, tuple
-        children = map(lambda x: _auto_indent(x, ind, depth+1), json_obj)
-        return ''.join(('[', ind_str2, comma_str.join(children), ind_str1, ']'))
+        ind_str2 = self._newline(depth+1)
+        self.parts.append(''.join(('{' if is_dict else '[', ind_str2, (','+ind_str2).join(items),
+                                   self._newline(depth), '}' if is_dict else ']')))
 
 
-def _remove_invalid_escape(text):
+_ORIENTS = ('records', 'columns')
 
-    text = text.replace('\b', '')
+_ENCODERS = {x: PatchedJSONEncoder(ensure_ascii=False, sort_keys=True, orient=x) for x in _ORIENTS}
+_ENCODER = _ENCODERS['records']
+
+_CONSTANTS = {None: 'null', True: 'true', False: 'false'}
+
+_LEAF_TYPES = frozenset((str, int, float, bool, type(None)))
 
-    while True:
-        #m = re.search(r'[^\\](\\)[^\\"/bfnrtu]', text)
-        m = re.search(r'[^\\](?:\\\\)*(\\)[^\\"/bfnrtu]', text)
-        if not m or not m.groups():
-            break
-        text = text[:m.start(1)]+'\\\\'+text[m.end(1):]
 
-    return text
+def _encode_flat(json_obj, encoder=_ENCODER):
+    '''_basic_dump(json_obj) 와 같은 결과'''
+
+    t = type(json_obj)
+    if t is str:
+        return encode_basestring(json_obj)
+    if t is int:
+        return int.__repr__(json_obj)
+    if t is bool or json_obj is None:
+        return _CONSTANTS[json_obj]
+    return encoder.encode(json_obj)
+
+
+###########################################################################################################
+# numpy/pandas
+###########################################################################################################
+
+
+def _array_len(json_obj, orient):
+    '''DataFrame/Series/1차원 이상 ndarray 인 경우 list/dict 로 변환했을 때의 길이, 아니면 None'''
+
+    pd = sys.modules.get('pandas')
+    if pd is not None:
+        if isinstance(json_obj, pd.DataFrame):
+            return json_obj.shape[1] if orient == 'columns' else json_obj.shape[0]
+        if isinstance(json_obj, pd.Series):
+            return len(json_obj)
+    np = sys.modules.get('numpy')
+    if np is not None and isinstance(json_obj, np.ndarray) and json_obj.ndim > 0:
+        return len(json_obj)
+    return None
+
+
+def _encode_array(json_obj, orient):
+    '''
+    DataFrame/Series/1차원 ndarray 를 컬럼 단위로 인코딩
+        - 반환값: (list 차일드 문자열 목록 또는 dict 키 문자열 -> 값 문자열, 차일드가 비어있지 않은 list/dict 인지)
+        - 값 중에 비어있지 않은 list/dict 가 있거나 2차원 이상 ndarray 이면 None
+    '''
+
+    pd = sys.modules.get('pandas')
+    if pd is None or not isinstance(json_obj, pd.DataFrame):
+        if json_obj.ndim != 1:
+            return None
+        values = _encode_values(json_obj)
+        return None if values is None else (values, False)
+
+    keys = sorted((str(x), i) for i, x in enumerate(json_obj.columns))
+    columns = []
+    for _, i in keys:
+        values = _encode_values(json_obj.iloc[:, i])
+        if values is None:
+            return None
+        columns.append(values)
+    keys = [encode_basestring(x) for x, _ in keys]
+
+    if orient == 'columns':
+        return {k: '['+', '.join(v)+']' for k, v in zip(keys, columns)}, len(json_obj) > 0
+    if not keys:
+        return ['{}'] * len(json_obj), False
+    template = '{' + ', '.join(k.replace('%', '%%')+': %s' for k in keys) + '}'
+    return [template % row for row in zip(*columns)], True
+
+
+def _encode_values(values):
+    '''1차원 배열/Series 의 값 목록을 json 문자열 목록으로 변환 (NaN/Infinity/NaT/None 은 null)'''
+
+    np = sys.modules['numpy']
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(values, pd.Series):
+        if values.dtype.kind == 'M':
+            text = values.dt.strftime('%Y-%m-%d %H:%M:%S').tolist()
+            return ['"'+x+'"' if isinstance(x, str) else 'null' for x in text]
+        if isinstance(values.dtype, np.dtype) and values.dtype.kind in 'biuf':
+            values = values.to_numpy()
+        else:
+            values = values.to_numpy(dtype=object)
+
+    kind = values.dtype.kind
+    if kind == 'b':
+        return np.where(values, 'true', 'false').tolist()
+    if kind in 'iu':
+        return list(map(int.__repr__, values.tolist()))
+    if kind == 'f':
+        encoded = list(map(float.__repr__, values.tolist()))
+        for i in np.flatnonzero(~np.isfinite(values)).tolist():
+            encoded[i] = 'null'
+        return encoded
+    return _encode_objects(values)
+
+
+def _encode_objects(values):
+    pd = sys.modules.get('pandas')
+    missing = (pd.NaT, pd.NA) if pd is not None else ()
+    encoded = []
+    append = encoded.append
+    for x in values:
+        if type(x) is str:
+            append(encode_basestring(x))
+        elif x is None or (isinstance(x, float) and not math.isfinite(x)) or any(x is m for m in missing):
+            append('null')
+        elif isinstance(x, (list, tuple, dict)) and len(x) > 0:
+            return None
+        elif type(x) not in _LEAF_TYPES and _array_len(x, 'records'):
+            return None
+        else:
+            append(_encode_flat(x))
+    return encoded
+
+
+def _array_to_python(json_obj, orient):
+    '''DataFrame/Series/ndarray 를 list/dict 로 변환 (NaN/Infinity 는 None, 그 외 numpy/pandas 값은 encoder 에서 처리)'''
+
+    pd = sys.modules.get('pandas')
+    if pd is not None and isinstance(json_obj, pd.DataFrame):
+        keys = [str(x) for x in json_obj.columns]
+        columns = [_python_values(json_obj.iloc[:, i]) for i in range(len(keys))]
+        if orient == 'columns':
+            return dict(zip(keys, columns))
+        return [dict(zip(keys, row)) for row in zip(*columns)] if keys else [{} for _ in range(len(json_obj))]
+    if json_obj.ndim == 0:
+        return json_obj.item()
+    if json_obj.ndim > 1:
+        return list(json_obj)
+    return _python_values(json_obj)
+
+
+def _python_values(values):
+    np = sys.modules['numpy']
+    if not isinstance(values, np.ndarray):
+        kind = values.dtype.kind if isinstance(values.dtype, np.dtype) else 'O'
+        values = values.to_numpy() if kind in 'biuf' else values.to_numpy(dtype=object)
+    values = values.tolist() if values.dtype.kind in 'biuf' else list(values)
+    return [None if isinstance(x, float) and not math.isfinite(x) else x for x in values]
+
+
+# 잘못된 escape: '\\' 쌍을 제외한 '\' 뒤에 json escape 문자나 4자리 hex 의 u 가 오지 않는 경우
+_INVALID_ESCAPE = re.compile(r'(?<!\\)((?:\\\\)*)\\(?![\\"/bfnrt]|u[0-9a-fA-F]{4})')
+
+
+def _remove_invalid_escape(text):
+    '''backspace 문자 제거 후 잘못된 escape 의 역슬래시를 두개로 변경 (정규식 한번의 치환으로 전체 수정)'''
+
+    return _INVALID_ESCAPE.sub(r'\1\\\\', text.replace('\b', ''))
 
 
 def _test():
 
+    # NaN/Infinity 는 float, numpy 스칼라, DataFrame 및 indent 여부와 관계없이 null
+    import numpy as np
+    import pandas as pd
+    nan_obj = {'a': float('nan'), 'b': np.float64('inf'), 'c': [np.float32('-inf'), 1.5],
+               'd': pd.DataFrame({'x': [1.0, float('nan'), float('inf')], 'y': ['p', None, 'q']})}
+    expected = {'a': None, 'b': None, 'c': [None, 1.5], 'd': [{'x': 1.0, 'y': 'p'}, {'x': None, 'y': None}, {'x': None, 'y': 'q'}]}
+    for ind, max_indent in ((None, 0), (2, 0), (2, 2)):
+        s = dump_json(nan_obj, ind=ind, max_indent=max_indent)
+        assert json.loads(s, parse_constant=lambda c: c) == expected, s
+        s = dump_json(nan_obj['d'], ind=ind, max_indent=max_indent)
+        assert json.loads(s, parse_constant=lambda c: c) == expected['d'], s
+    sys.stdout.write(dump_json(nan_obj)+'\n')
+
     sys.stdout.write(json.dumps('가', ensure_ascii=False)+'\n')
     sys.stdout.write(json.dumps(u'가', ensure_ascii=False)+'\n')
     sys.stdout.write(json.dumps({'가': '나'}, ensure_ascii=False)+'\n')
@@ -184,10 +477,65 @@ def _parse_params(argv):
     return indent_size, max_depth, per_line
 
 
+def _pop_jobs_arg(argv):
+    '''argv 에서 --jobs=N 인자를 제거하고 (나머지 argv, jobs) 를 반환, 기본값은 cpu 개수'''
+
+    rest = [x for x in argv if not x.startswith('--jobs=')]
+    jobs = [int(x[len('--jobs='):]) for x in argv if x.startswith('--jobs=')]
+    return rest, (jobs[-1] if jobs else None) or os.cpu_count() or 1
+
+
+def _format_lines(lines, indent_size, max_depth):
+    '''JSONL 라인 묶음을 변환하여 하나의 문자열로 반환 (process pool 작업 단위)'''
+
+    return ''.join(dump_json(load_json(line), indent_size, max_depth)+'\n' for line in lines)
+
+
+def _batches(lines, batch_size):
+    lines = iter(lines)
+    while True:
+        batch = list(itertools.islice(lines, batch_size))
+        if not batch:
+            return
+        yield batch
+
+
+def _stream_lines(lines, out, indent_size, max_depth, jobs=1, batch_size=256):
+    '''
+    lines 를 batch_size 라인씩 변환하여 입력 순서대로 out 에 기록
+        - jobs > 1 이고 입력이 한 batch 보다 길면 process pool 에서 변환
+        - 처리중인 batch 는 jobs*2 개까지만 유지하므로 입력 크기와 무관하게 메모리 사용량 일정
+    '''
+
+    batches = _batches(lines, batch_size)
+    head = list(itertools.islice(batches, 2))
+    if jobs <= 1 or len(head) < 2:
+        for batch in itertools.chain(head, batches):
+            out.write(_format_lines(batch, indent_size, max_depth))
+        return
+
+    from concurrent.futures import ProcessPoolExecutor
+
+    with ProcessPoolExecutor(max_workers=jobs) as executor:
+        pending = collections.deque()
+        try:
+            for batch in itertools.chain(head, batches):
+                pending.append(executor.submit(_format_lines, batch, indent_size, max_depth))
+                if len(pending) >= jobs * 2:
+                    out.write(pending.popleft().result())
+            while pending:
+                out.write(pending.popleft().result())
+        except BaseException:
+            for future in pending:
+                future.cancel()
+            raise
+
+
 if __name__ == '__main__':
 
     import sys
     import logging
+    import profiling
     logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.DEBUG)
 
     #_test()
@@ -201,32 +549,39 @@ if __name__ == '__main__':
                            "line" or "file" or "auto"(line 단위 파싱 시도후 실패시 파일 단위 파싱)
         usage2: %s
             ==> indent_size: 4, max_depth: auto, per_line: auto
+        option: --profile[=DIR] (또는 ISSUE_PROFILE_DIR 환경변수)
+            ==> DIR 아래 실행 디렉토리에 cProfile/tracemalloc 결과 기록
+        option: --jobs=N (기본값: cpu 개수)
+            ==> line 단위 변환 시 N 개 프로세스에서 병렬 변환 (출력 순서는 입력 순서와 같음)
     ''' % (sys.argv[0], sys.argv[0])
 
+    # --profile[=DIR] 또는 ISSUE_PROFILE_DIR 지정 시 프로파일링
+    argv, profile_dir = profiling.pop_profile_arg(sys.argv)
+
     try:
-        indent_size, max_depth, per_line = _parse_params(sys.argv)
+        argv, jobs = _pop_jobs_arg(argv)
+        indent_size, max_depth, per_line = _parse_params(argv)
     except:
         sys.stderr.write(usage)
         sys.exit(1)
 
-    if per_line == True:
-        for line in sys.stdin:
-            print(dump_json(load_json(line), indent_size, max_depth))
-
-    elif per_line == False:
-        print(dump_json(load_json(sys.stdin.read()), indent_size, max_depth))
-
-    else: # line 단위 파싱 시도후 실패시 파일 단위 파싱
-        lines = tuple(map(lambda line: line, sys.stdin))
-        try:
-            logging.debug('trying to parse per_line')
-            print(dump_json(load_json(lines[0]), indent_size, max_depth))
-        except:
-            logging.debug('failed to parse per_line')
-            logging.debug('trying to parse per_file')
-            print(dump_json(load_json(' '.join(lines)), indent_size, max_depth))
-            sys.exit(0)
-
-        for line in lines[1:]:
-            print(dump_json(load_json(line), indent_size, max_depth))
-        logging.debug('completed parsing per_line')
+    with profiling.profile_run('json_patch', profile_dir):
+        if per_line == True:
+            _stream_lines(sys.stdin, sys.stdout, indent_size, max_depth, jobs)
+
+        elif per_line == False:
+            print(dump_json(load_json(sys.stdin.read()), indent_size, max_depth))
+
+        else: # 첫 라인만 읽어서 line 단위 파싱 시도후 실패시 파일 단위 파싱
+            first_line = sys.stdin.readline()
+            try:
+                logging.debug('trying to parse per_line')
+                load_json(first_line)
+            except:
+                logging.debug('failed to parse per_line')
+                logging.debug('trying to parse per_file')
+                print(dump_json(load_json(first_line + sys.stdin.read()), indent_size, max_depth))
+                sys.exit(0)
+
+            _stream_lines(itertools.chain([first_line], sys.stdin), sys.stdout, indent_size, max_depth, jobs)
+            logging.debug('completed parsing per_line')
@@ -0,0 +1,67 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 무거운 모듈(pandas, numpy, DB 드라이버 등)을 처음 사용하는 시점에 import 하기 위한 유틸리티
+- 사용법: 모듈 최상단에서 pd = lazy_import('pandas') 와 같이 선언하면
+  pd.DataFrame 처럼 속성에 처음 접근할 때 실제 import 가 일어남
+- 설치되지 않은 모듈은 선언 시점이 아니라 처음 사용하는 시점에 ImportError 발생
+- 여러 스레드가 동시에 처음 사용해도 초기화가 끝난 모듈만 보이도록 함
+    - importlib.util.LazyLoader 는 python 3.12 미만에서 thread-safe 하지 않으므로 사용하지 않고,
+      import_module 을 lock 안에서 호출하는 proxy 를 사용
+    - 다른 스레드가 import 중인(sys.modules 에는 있지만 초기화 중인) 모듈은 그대로 반환하지 않고 proxy 를 반환
+      (proxy 의 import_module 은 import 가 끝날 때까지 기다림)
+'''
+
+import sys
+import types
+import importlib
+import threading
+
+
+def lazy_import(name):
+    '''name 모듈을 lazy 하게 import (이미 import 된 경우 그대로 반환)'''
+
+    if is_loaded(name):
+        return sys.modules[name]
+    return _LazyModule(name)
+
+
+def is_loaded(name):
+    '''실제로 import 가 끝난 모듈인지 여부 (다른 스레드에서 import 중인 모듈은 False)'''
+
+    module = sys.modules.get(name)
+    if module is None:
+        return False
+    return not getattr(getattr(module, '__spec__', None), '_initializing', False)
+
+
+# 모든 proxy 가 같이 쓰는 lock (proxy 마다 lock 을 두면 여러 모듈의 lazy import 가 엇갈려 진행될 수 있음)
+# 한 모듈의 import 중에 다른 lazy 모듈을 불러올 수 있으므로 RLock
+_load_lock = threading.RLock()
+
+
+class _LazyModule(types.ModuleType):
+    '''처음 속성에 접근할 때 실제 모듈을 import 하여 속성을 복사해 오는 proxy'''
+
+    def __init__(self, name):
+        super(_LazyModule, self).__init__(name)
+        self.__dict__['_lazy_module'] = None
+
+    def __getattr__(self, attr):
+        # 이미 복사된 속성은 여기까지 오지 않음 (모듈 __dict__ 에서 바로 찾음)
+        return getattr(self._lazy_load(), attr)
+
+    def __dir__(self):
+        return dir(self._lazy_load())
+
+    def _lazy_load(self):
+        module = self.__dict__['_lazy_module']
+        if module is None:
+            with _load_lock:
+                module = self.__dict__['_lazy_module']
+                if module is None:
+                    module = importlib.import_module(self.__name__)
+                    self.__dict__.update({k: v for k, v in module.__dict__.items() if k != '__name__'})
+                    self.__dict__['_lazy_module'] = module
+        return module
@@ -4,14 +4,212 @@
 import os
 import sys
 import time
+import random
 import logging
 import re
+import threading
 from datetime import datetime
 
-import pymysql
-import cx_Oracle
+from lazy_import import lazy_import
 
 import json_patch
+from instrumentation import timed_query
+
+# DB 드라이버는 처음 연결할 때 import (사용하지 않는 드라이버는 설치되어 있지 않아도 됨)
+pymysql = lazy_import('pymysql')
+cx_Oracle = lazy_import('cx_Oracle')
+
+
+###########################################################################################################
+# Oracle 연결/조회 재시도
+###########################################################################################################
+
+# 재시도 대기 시간: min(RETRY_MAX_SECONDS, RETRY_BASE_SECONDS * 2^n) 범위의 임의 값 (full jitter)
+# 전체 재시도는 ORACLE_RETRY_DEADLINE 초 안에서만 (넘으면 실패 처리)
+RETRY_BASE_SECONDS = 0.5
+RETRY_MAX_SECONDS = 30
+RETRY_DEADLINE_SECONDS = float(os.environ.get('ORACLE_RETRY_DEADLINE', 60))
+
+# 지정 시 조회 한 번의 최대 시간 (초, cx_Oracle callTimeout)
+CALL_TIMEOUT_SECONDS = float(os.environ.get('ORACLE_CALL_TIMEOUT', 0))
+
+# 재시도하면 성공할 수 있는 오류 (연결 끊김, DB 재시작/전환 중, listener 일시 장애 등)
+# 그 외 (인증 실패, SQL 오류 등) 는 재시도 없이 바로 실패
+RETRYABLE_ORA_CODES = {
+    28,     # session killed
+    1012,   # not logged on
+    1033,   # initialization or shutdown in progress
+    1034,   # ORACLE not available
+    1089,   # immediate shutdown in progress
+    1090,   # shutdown in progress
+    1092,   # instance terminated
+    2396,   # exceeded maximum idle time
+    3113,   # end-of-file on communication channel
+    3114,   # not connected to ORACLE
+    3135,   # connection lost contact
+    12153,  # not connected
+    12170,  # connect timeout occurred
+    12514,  # listener does not currently know of service
+    12516,  # listener could not find available handler
+    12518,  # listener could not hand off client connection
+    12519,  # no appropriate service handler found
+    12520,  # no available handler for the requested type of server
+    12521,  # listener does not currently know of instance
+    12528,  # all appropriate instances are blocking new connections
+    12537,  # connection closed
+    12541,  # no listener
+    12543,  # destination host unreachable
+    12547,  # lost contact
+    12560,  # protocol adapter error
+    12571,  # packet writer failure
+    25408,  # can not safely replay call
+}
+RETRYABLE_DPI_CODES = {
+    1010,   # not connected
+    1080,   # connection was closed
+}
+
+_ERROR_CODE = re.compile(r'\b(ORA|DPI)-(\d{4,5})\b')
+
+
+def oracle_error_code(e):
+    # ('ORA', 3113) / ('DPI', 1080) / None
+    m = _ERROR_CODE.search(str(e))
+    if m:
+        return m.group(1), int(m.group(2))
+    code = getattr(e.args[0], 'code', None) if e.args else None
+    if isinstance(code, int) and code > 0:
+        return 'ORA', code
+    return None
+
+
+def is_retryable(e):
+    # 재시도(재연결 후)하면 성공할 수 있는 오류인지
+    code = oracle_error_code(e)
+    if code is None:
+        # 코드가 없는 드라이버/네트워크 오류
+        return isinstance(e, (ConnectionError, TimeoutError))
+    kind, number = code
+    if kind == 'DPI':
+        return number in RETRYABLE_DPI_CODES
+    return number in RETRYABLE_ORA_CODES
+
+
+class Backoff(object):
+    '''
+    지수 backoff + full jitter, 전체 deadline 안에서만 대기
+    wait(): 다음 시도까지 대기 후 대기한 시간(초) 반환, deadline 을 넘으면 대기 없이 None
+    '''
+
+    def __init__(self, base=RETRY_BASE_SECONDS, cap=RETRY_MAX_SECONDS, deadline=RETRY_DEADLINE_SECONDS, sleep=time.sleep):
+        self.base = base
+        self.cap = cap
+        self.deadline_at = time.monotonic() + deadline
+        self.sleep = sleep
+        self.attempt = 0
+
+    def remaining(self):
+        return max(0.0, self.deadline_at - time.monotonic())
+
+    def wait(self):
+        remaining = self.remaining()
+        if remaining <= 0:
+            return None
+        delay = min(random.uniform(0, min(self.cap, self.base * 2 ** self.attempt)), remaining)
+        self.attempt += 1
+        self.sleep(delay)
+        return delay
+
+
+def _open_oracle(config):
+    # SID 로 연결, 실패하면 service_name 으로 연결
+    os.putenv('NLS_LANG', 'AMERICAN_AMERICA.AL32UTF8')
+    dsn_tns = cx_Oracle.makedsn(config['ip'], config['port'], config['db'])
+    try:
+        conn = cx_Oracle.connect(config['user'], config['password'], dsn_tns, threaded = True)
+    except Exception:
+        dsn_tns = cx_Oracle.makedsn(config['ip'], config['port'], service_name=config['db'])
+        conn = cx_Oracle.connect(config['user'], config['password'], dsn_tns, threaded = True)
+    if CALL_TIMEOUT_SECONDS > 0:
+        conn.callTimeout = int(CALL_TIMEOUT_SECONDS * 1000)
+    return conn
+
+
+def connect_oracle(config, backoff=None):
+    # 재시도 가능한 오류는 backoff 후 다시 연결, 그 외 오류 또는 deadline 초과 시 Exception('db connection failed')
+    retry = Backoff(**(backoff or {}))
+    while True:
+        try:
+            return _open_oracle(config)
+        except Exception as e:
+            delay = retry.wait() if is_retryable(e) else None
+            if delay is None:
+                logging.error('db connection failed ::: ' + json_patch.dump_json(config))
+                logging.error(str(e))
+                raise Exception('db connection failed')
+            logging.warning(f'[ConnectRetry] {retry.attempt} ({delay:.1f}s): {e}')
+
+
+###########################################################################################################
+# 연결 미리 생성 (prewarm)
+###########################################################################################################
+
+_prewarmed = {}
+_prewarm_lock = threading.Lock()
+
+
+def _conf_key(config):
+    return (config['ip'], config['port'], config['db'], config['user'])
+
+
+class _Prewarm(object):
+    '''백그라운드 thread 에서 만든 연결 (가져가지 않으면 연결 후 닫음)'''
+
+    def __init__(self, config, backoff):
+        self.conn = None
+        self.error = None
+        self.abandoned = False
+        self.lock = threading.Lock()
+        self.thread = threading.Thread(target=self._run, args=(config, backoff), name='oracle_prewarm', daemon=True)
+        self.thread.start()
+
+    def _run(self, config, backoff):
+        try:
+            conn = connect_oracle(config, backoff)
+        except Exception as e:
+            self.error = e
+            return
+        with self.lock:
+            if not self.abandoned:
+                self.conn = conn
+                return
+        conn.close()
+
+    def take(self, timeout):
+        # 연결이 끝날 때까지 최대 timeout 초 대기, 실패했거나 시간 안에 끝나지 않으면 None (error 에 실패 원인)
+        self.thread.join(timeout)
+        with self.lock:
+            if self.conn is None:
+                self.abandoned = True
+            return self.conn
+
+
+def prewarm(config, backoff=None):
+    '''
+    config 의 Oracle 연결을 백그라운드에서 미리 생성 (프로세스 시작 시 호출)
+    같은 config 로 처음 연결하는 OracleClient 가 이 연결을 사용 (연결 중이면 완료까지 대기)
+    '''
+    key = _conf_key(config)
+    with _prewarm_lock:
+        if key not in _prewarmed:
+            _prewarmed[key] = _Prewarm(config, backoff)
+        return _prewarmed[key]
+
+
+def _take_prewarmed(config):
+    # config 의 미리 만들고 있는 연결 (_Prewarm, 없으면 None), 한번만 가져갈 수 있음
+    with _prewarm_lock:
+        return _prewarmed.pop(_conf_key(config), None)
 
 
 class DBClient(object):
@@ -174,27 +372,33 @@ class MariaDBClient(DBClient):
 
 
 class OracleClient(DBClient):
-    '''Oracle DB 용 클라이언트'''
+    '''
+    Oracle DB 용 클라이언트
+    - 연결: 재시도 가능한 오류(RETRYABLE_ORA_CODES)는 backoff 후 ORACLE_RETRY_DEADLINE 초까지 재시도
+    - 조회: 재시도 가능한 오류는 재연결 후 max_retry 번까지 다시 조회 (모두 실패하면 예외)
+    - prewarm() 으로 미리 만든 연결이 있으면 사용
+    '''
+
+    def __init__(self, db_conf, max_retry=3, backoff=None):
+        # backoff: Backoff 인자 (base, cap, deadline, sleep)
+        self.backoff = backoff or {}
+        super(OracleClient, self).__init__(db_conf, max_retry)
 
     # for new connection
     def _connect(self):
+        # 미리 만든 연결을 기다리는 시간과 직접 연결하는 시간을 합쳐 하나의 deadline 안에서
         self.conn = None
-        os.putenv('NLS_LANG', 'AMERICAN_AMERICA.AL32UTF8')
-        dsn_tns = cx_Oracle.makedsn(self.config['ip'], self.config['port'], self.config['db'])
-        for retry in range(self.max_retry):
-            try:
-                self.conn = cx_Oracle.connect(self.config['user'], self.config['password'], dsn_tns, threaded = True)
-                break
-            except Exception as e:
-                try:
-                    dsn_tns = cx_Oracle.makedsn(self.config['ip'], self.config['port'], service_name=self.config['db'])
-                    self.conn = cx_Oracle.connect(self.config['user'], self.config['password'], dsn_tns, threaded = True)
-                    break
-                except:
-                    logging.error('db connection failed ::: ' + json_patch.dump_json(self.config))
-                    logging.error(str(e))
-                    raise Exception('db connection failed')
-            time.sleep(600)
+        retry = Backoff(**self.backoff)
+        warm = _take_prewarmed(self.config)
+        if warm is not None:
+            self.conn = warm.take(retry.remaining())
+            if self.conn is not None:
+                return
+            if warm.error is not None:
+                logging.warning(f'[Prewarm] failed: {warm.error}')
+                if not is_retryable(warm.error) or retry.remaining() <= 0:
+                    raise Exception('db connection failed') from warm.error
+        self.conn = connect_oracle(self.config, dict(self.backoff, deadline=retry.remaining()))
 
     def _kv_to_dict(self, cols, row):
         output = {}
@@ -207,44 +411,46 @@ class OracleClient(DBClient):
 
     # for select, show, ...
     def _get(self, query):
-        for retry in range(self.max_retry):
+        # select 는 다시 실행해도 같으므로 연결 오류 시 재연결 후 재시도 (재연결 포함 전체 deadline 안에서)
+        retry = Backoff(**self.backoff)
+        tries = max(1, self.max_retry)
+        for attempt in range(tries):
+            cur = None
             try:
                 cur = self.conn.cursor()
-                cur.execute(query)
-                rows = cur.fetchall()
+                with timed_query('oracle_select') as q:
+                    cur.execute(query)
+                    rows = cur.fetchall()
+                    q['rows'] = len(rows)
                 desc = cur.description
                 results = map(lambda row: self._kv_to_dict(map(lambda x: x[0], desc), row), rows) 
-                #cols = map(lambda x: x[0], cur.description)
                 cur.close()
                 return results
-                #return map(lambda row: self._kv_to_dict(cols, row), rows)
-                #results = map(lambda row: self._kv_to_dict(map(lambda x: x[0], cur.description), row), rows)
-                #cols = map(lambda x: x[0], cur.description)
-                #####
-                #json_patch.print_json(cols)
-                #json_patch.print_json(rows)
-                #####
-                #results = map(lambda row: self._kv_to_dict(map(lambda x: x[0], cur.description), row), rows)
-                #cur.close()
-                #return results
-                #return map(lambda row: dict(zip(cols, row)), rows)
-                #return map(lambda row: self._kv_to_dict(cols, row), rows)
-            # TODO: 재시도 해야할 오류 타입 파악
-            #except cx_Oracle.DatabaseError as e:
-            #    # reconnect and try again
-            #    logging.warn('[DatabaseError] ' + str(e))
-            #    cur.close()
-            #    self._reconnect()
             except Exception as e:
-                # no retry
-                logging.error('[SelectError] ' + str(e))
-                logging.error(query)
-                cur.close()
-                return []
+                self._close_cursor(cur)
+                if not is_retryable(e):
+                    # no retry
+                    logging.error('[SelectError] ' + str(e))
+                    logging.error(query)
+                    return []
+                delay = retry.wait() if attempt + 1 < tries else None
+                if delay is None:
+                    # 연결 장애로 빈 결과를 돌려주면 데이터가 없는 날로 처리되므로 예외
+                    logging.error('too many retry during select')
+                    logging.error(query)
+                    raise Exception('too many retry during select') from e
+                logging.warning(f'[DatabaseError] retry {attempt + 1} ({delay:.1f}s): {e}')
 
-        # when failed up to max_retry
-        logging.error('too many retry during select')
-        return []
+            # reconnect and try again
+            self._close()
+            self.conn = connect_oracle(self.config, dict(self.backoff, deadline=retry.remaining()))
+
+    def _close_cursor(self, cur):
+        if cur is not None:
+            try:
+                cur.close()
+            except Exception:
+                pass
 
     # for insert, update, ...
     def _set(self, query):
@@ -252,9 +458,10 @@ class OracleClient(DBClient):
             try:
                 cur = self.conn.cursor()
                 query = query.replace('`','\'\'')
-                cur.execute(query)
-                cur.close()
-                self.conn.commit()
+                with timed_query('oracle_execute'):
+                    cur.execute(query)
+                    cur.close()
+                    self.conn.commit()
                 return True
             # TODO: 재시도 해야할 오류 타입 파악
             #except cx_Oracle.DatabaseError as e:
@@ -4,7 +4,7 @@ import copy
 import logging
 from datetime import timedelta, datetime
 
-from oracle_client.db_client import MariaDBClient, OracleClient
+from oracle_client.db_client import MariaDBClient, OracleClient, prewarm
 from config import get_oracle_config
 
 _SCRIPT_DIR = os.path.abspath(os.path.dirname(__file__))
@@ -23,6 +23,11 @@ class DBClientForIssueStock(OracleClient):
             config['autocommit'] = False
         super(DBClientForIssueStock, self).__init__(config, max_retry)
 
+    @staticmethod
+    def prewarm():
+        # 처음 생성하는 DBClientForIssueStock 이 사용할 연결을 백그라운드에서 미리 생성
+        prewarm(get_oracle_config('./db.config'))
+
     # for nnd module
     def get_daily_issue_stocks(self, day):
         # day: iso-date format (YYYY-mm-dd)
@@ -32,7 +37,17 @@ class DBClientForIssueStock(OracleClient):
         rows = self.execute(query)
         logger.debug(query)
         return list(rows)
-    
+
+    def get_daily_issue_digest(self, day):
+        # day 행의 변경 감지용 digest (행 수, 종목명/이슈점수 hash 합계) - 행을 가져오지 않고 DB 에서 계산
+        # return: {'CNT': 행 수, 'HASH': hash 합계 (행이 없으면 None)}
+        query = """select count(*) as CNT, sum(ora_hash(STOCK || '|' || ISSUE)) as HASH from %s
+                   where WRITE_DT = '%s'
+                """ % (ISSUE_STOCK_TABLE, day)
+        rows = list(self.execute(query))
+        logger.debug(query)
+        return rows[0] if rows else {'CNT': 0, 'HASH': None}
+
     # for nnd module
     def get_issue_stocks_by_date(self, start_day, end_day):
         # start_day, end_day: iso-date format (YYYY-mm-dd)
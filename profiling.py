@@ -0,0 +1,212 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- 배치 실행용 opt-in 프로파일링 모듈
+- "--profile[=DIR]" 인자 또는 ISSUE_PROFILE_DIR 환경변수로 활성화 (비활성 상태에서는 비용 없음)
+- 실행 디렉토리(run directory)에 다음 결과를 기록
+    - profile.prof:        cProfile 결과 (pstats / snakeviz / gprof2dot 로 열람)
+    - profile.txt:         cumulative time 기준 상위 함수 목록
+    - profile.collapsed:   샘플링한 call stack (flamegraph.pl, speedscope 호환 collapsed 형식)
+    - tracemalloc_top.txt: 메모리 할당 상위 위치
+    - stage_memory.json:   instrumentation 단계 종료 시점마다 샘플링한 메모리 스냅샷
+'''
+
+import os
+import json
+import logging
+from contextlib import contextmanager
+from datetime import datetime
+
+import instrumentation
+
+
+logger = logging.getLogger('profiling')
+
+PROFILE_DIR_ENV = 'ISSUE_PROFILE_DIR'
+PROFILE_ARG = '--profile'
+DEFAULT_PROFILE_DIR = './profile'
+
+
+###########################################################################################################
+# public function/class
+###########################################################################################################
+
+
+def pop_profile_arg(argv):
+    '''
+    argv 에서 --profile[=DIR] 인자를 제거하고 (나머지 argv, profile 디렉토리) 를 반환
+    인자가 없으면 ISSUE_PROFILE_DIR 환경변수를 사용하고, 둘다 없으면 디렉토리는 None
+    '''
+
+    rest = []
+    profile_dir = None
+    for arg in argv:
+        if arg == PROFILE_ARG:
+            profile_dir = DEFAULT_PROFILE_DIR
+        elif arg.startswith(PROFILE_ARG + '='):
+            profile_dir = arg[len(PROFILE_ARG) + 1:] or DEFAULT_PROFILE_DIR
+        else:
+            rest.append(arg)
+
+    if profile_dir is None:
+        profile_dir = os.environ.get(PROFILE_DIR_ENV) or None
+
+    return rest, profile_dir
+
+
+@contextmanager
+def profile_run(name, profile_dir=None):
+    '''
+    profile_dir 가 지정된 경우에만 프로파일링하는 context manager
+        argv, profile_dir = profiling.pop_profile_arg(sys.argv)
+        with profiling.profile_run('issue_score_processing', profile_dir):
+            ...
+    '''
+
+    if not profile_dir:
+        yield None
+        return
+
+    profiler = Profiler(make_run_dir(profile_dir, name))
+    profiler.start()
+    try:
+        yield profiler
+    finally:
+        profiler.stop()
+
+
+def make_run_dir(base_dir, name):
+    run_dir = os.path.join(base_dir, '%s-%s-%d' % (name, datetime.now().strftime('%Y%m%d-%H%M%S'), os.getpid()))
+    os.makedirs(run_dir, exist_ok=True)
+    return run_dir
+
+
+class Profiler(object):
+    '''cProfile + stack sampling + tracemalloc 을 묶어서 실행'''
+
+    def __init__(self, run_dir, sample_interval=0.005, tracemalloc_frames=25, top=40):
+        self.run_dir = run_dir
+        self.sample_interval = sample_interval
+        self.tracemalloc_frames = tracemalloc_frames
+        self.top = top
+        self.profile = None
+        self.sampler = None
+        self.stage_memory = []
+
+    def start(self):
+        import cProfile
+        import tracemalloc
+
+        logger.info(f'profiling enabled: {self.run_dir}')
+        tracemalloc.start(self.tracemalloc_frames)
+        instrumentation.add_stage_hook(self._on_stage_end)
+        self.sampler = StackSampler(self.sample_interval)
+        self.sampler.start()
+        self.profile = cProfile.Profile()
+        self.profile.enable()
+
+    def stop(self):
+        import pstats
+        import tracemalloc
+
+        self.profile.disable()
+        self.sampler.stop()
+        instrumentation.remove_stage_hook(self._on_stage_end)
+
+        try:
+            self.profile.dump_stats(self._path('profile.prof'))
+            with open(self._path('profile.txt'), 'w', encoding='utf8') as f:
+                stats = pstats.Stats(self.profile, stream=f)
+                stats.sort_stats('cumulative').print_stats(self.top)
+                stats.sort_stats('tottime').print_stats(self.top)
+
+            self.sampler.write_collapsed(self._path('profile.collapsed'))
+
+            snapshot = tracemalloc.take_snapshot()
+            current, peak = tracemalloc.get_traced_memory()
+            with open(self._path('tracemalloc_top.txt'), 'w', encoding='utf8') as f:
+                f.write('current: %d bytes, peak: %d bytes\n\n' % (current, peak))
+                for stat in snapshot.statistics('lineno')[:self.top]:
+                    f.write('%s\n' % stat)
+                f.write('\n### traceback of top allocation ###\n')
+                for stat in snapshot.statistics('traceback')[:1]:
+                    f.write('\n'.join(stat.traceback.format()) + '\n')
+
+            with open(self._path('stage_memory.json'), 'w', encoding='utf8') as f:
+                json.dump(self.stage_memory, f, ensure_ascii=False, indent=4)
+        except Exception as e:
+            logger.error(f'profile output error {e}')
+        finally:
+            tracemalloc.stop()
+
+        logger.info(f'profile written: {self.run_dir}')
+
+    def _on_stage_end(self, record):
+        import tracemalloc
+
+        if not tracemalloc.is_tracing():
+            return
+        current, peak = tracemalloc.get_traced_memory()
+        top = tracemalloc.take_snapshot().statistics('lineno')[:10]
+        self.stage_memory.append({
+            'stage': record.name,
+            'seconds': record.seconds,
+            'traced_current_bytes': current,
+            'traced_peak_bytes': peak,
+            'peak_rss_bytes': record.peak_rss,
+            'top': [{'where': str(x.traceback), 'size': x.size, 'count': x.count} for x in top],
+        })
+        # 단계별 peak 를 구분하기 위해 초기화 (python >= 3.9)
+        if hasattr(tracemalloc, 'reset_peak'):
+            tracemalloc.reset_peak()
+
+    def _path(self, file_name):
+        return os.path.join(self.run_dir, file_name)
+
+
+class StackSampler(object):
+    '''
+    SIGPROF 타이머로 메인 스레드의 call stack 을 주기적으로 샘플링
+    (signal 을 사용할 수 없는 환경에서는 아무것도 하지 않음)
+    '''
+
+    def __init__(self, interval=0.005):
+        self.interval = interval
+        self.stacks = {}
+        self._old_handler = None
+        self._active = False
+
+    def start(self):
+        import signal
+        import threading
+
+        if not hasattr(signal, 'setitimer') or threading.current_thread() is not threading.main_thread():
+            logger.debug('stack sampling is not available')
+            return
+        self._old_handler = signal.signal(signal.SIGPROF, self._sample)
+        signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        self._active = True
+
+    def stop(self):
+        import signal
+
+        if not self._active:
+            return
+        signal.setitimer(signal.ITIMER_PROF, 0, 0)
+        signal.signal(signal.SIGPROF, self._old_handler or signal.SIG_DFL)
+        self._active = False
+
+    def write_collapsed(self, path):
+        with open(path, 'w', encoding='utf8') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('%s %d\n' % (stack, count))
+
+    def _sample(self, signum, frame):
+        names = []
+        while frame is not None:
+            code = frame.f_code
+            names.append('%s (%s:%d)' % (code.co_name, os.path.basename(code.co_filename), code.co_firstlineno))
+            frame = frame.f_back
+        stack = ';'.join(reversed(names))
+        self.stacks[stack] = self.stacks.get(stack, 0) + 1
@@ -0,0 +1,266 @@
+#!/usr/bin/env python3
+# -*- coding: utf8 -*-
+
+'''
+- issue_score_processing 의 record/replay 모드
+- record: 특정 일자의 Oracle nv_issue_score 행, stock_master 스냅샷, check_nan 조회 결과를
+          parquet 번들(디렉토리)로 저장 (ClickHouse 에는 쓰지 않음)
+- replay: 저장된 번들을 DBClientForIssueStock / ClickHouseReader 대신 사용하여
+          동일한 데이터로 파이프라인을 반복 실행하고 단계별 실행시간을 출력 (운영 DB 접근 없음)
+- parquet 저장에는 pyarrow 가 필요
+
+usage:
+    python replay.py record 2021-10-20 ./replay_bundles
+    python replay.py replay ./replay_bundles/2021-10-20 [repeat] [--lean] [--json=summary.json]
+'''
+
+import os
+import re
+import sys
+import json
+import logging
+import statistics
+from datetime import datetime
+
+from lazy_import import lazy_import
+
+import instrumentation
+import issue_score_processing
+
+
+pd = lazy_import('pandas')
+
+logger = logging.getLogger('replay')
+
+ISSUE_SCORE_FILE = 'issue_score.parquet'
+STOCK_MASTER_FILE = 'stock_master.parquet'
+CHECK_NAN_FILE = 'check_nan.parquet'
+META_FILE = 'meta.json'
+
+# check_nan 조회 결과를 한 파일에 모으기 위해 추가하는 조회 종목명 컬럼
+LOOKUP_COLUMN = '_LOOKUP_NAME'
+
+_LOOKUP_COND = re.compile(r"CMP_NM_KOR\s*==\s*'(.*)'")
+
+
+###########################################################################################################
+# record
+###########################################################################################################
+
+
+class RecordingIssueDB(object):
+    '''DBClientForIssueStock 결과를 기록'''
+
+    def __init__(self, bundle, inner):
+        self.bundle = bundle
+        self.inner = inner
+
+    def get_daily_issue_stocks(self, day):
+        rows = self.inner.get_daily_issue_stocks(day)
+        self.bundle.issue_rows.extend(rows)
+        return rows
+
+
+class RecordingReader(object):
+    '''ClickHouseReader.read_financial 결과를 stock_master 스냅샷 / check_nan 조회로 구분하여 기록'''
+
+    def __init__(self, bundle, inner):
+        self.bundle = bundle
+        self.inner = inner
+
+    def read_financial(self, table_name, cond):
+        df = self.inner.read_financial(table_name, cond)
+        m = _LOOKUP_COND.search(cond)
+        if m:
+            self.bundle.lookups[m.group(1)] = df
+        else:
+            self.bundle.stock_master = df
+        return df
+
+
+class RecordBundle(object):
+    '''record 중 수집한 데이터'''
+
+    def __init__(self, day):
+        self.day = day
+        self.issue_rows = []
+        self.stock_master = None
+        self.lookups = {}
+
+    def save(self, bundle_dir):
+        os.makedirs(bundle_dir, exist_ok=True)
+
+        issue_df = pd.DataFrame(self.issue_rows)
+        issue_df.to_parquet(os.path.join(bundle_dir, ISSUE_SCORE_FILE), index=False)
+        self.stock_master.to_parquet(os.path.join(bundle_dir, STOCK_MASTER_FILE), index=False)
+
+        found = [df.assign(**{LOOKUP_COLUMN: name}) for name, df in self.lookups.items() if not df.empty]
+        if found:
+            pd.concat(found, ignore_index=True).to_parquet(os.path.join(bundle_dir, CHECK_NAN_FILE), index=False)
+
+        meta = {
+            'day': self.day,
+            'recorded_at': datetime.now().strftime('%Y-%m-%d %H:%M:%S'),
+            'issue_rows': len(issue_df),
+            'stock_master_rows': len(self.stock_master),
+            'check_nan_found': sorted(name for name, df in self.lookups.items() if not df.empty),
+            'check_nan_missing': sorted(name for name, df in self.lookups.items() if df.empty),
+        }
+        with open(os.path.join(bundle_dir, META_FILE), 'w', encoding='utf8') as f:
+            json.dump(meta, f, ensure_ascii=False, indent=4)
+        return meta
+
+
+def record(day, base_dir):
+    '''day 의 입력 데이터를 base_dir/day 번들로 저장 (match 까지만 실행하고 쓰기는 하지 않음)'''
+
+    bundle = RecordBundle(day)
+    issue_score_processing.set_sources(
+        issue_db=lambda: RecordingIssueDB(bundle, issue_score_processing.DBClientForIssueStock()),
+        stock_master_reader=lambda: RecordingReader(bundle, issue_score_processing._clickhouse_reader()),
+    )
+    try:
+        issue_score_df = issue_score_processing.get_issue_score(day)
+        stock_master_df = issue_score_processing.get_stock_master()
+        issue_score_processing.match_issue_score(issue_score_df, stock_master_df)
+    finally:
+        issue_score_processing.set_sources()
+
+    bundle_dir = os.path.join(base_dir, day)
+    meta = bundle.save(bundle_dir)
+    logger.info(f'recorded {bundle_dir}: {meta}')
+    return bundle_dir
+
+
+###########################################################################################################
+# replay
+###########################################################################################################
+
+
+class ReplayBundle(object):
+    '''저장된 번들을 메모리에 로딩'''
+
+    def __init__(self, bundle_dir):
+        with open(os.path.join(bundle_dir, META_FILE), encoding='utf8') as f:
+            self.meta = json.load(f)
+        self.day = self.meta['day']
+        self.issue_score = pd.read_parquet(os.path.join(bundle_dir, ISSUE_SCORE_FILE))
+        self.stock_master = pd.read_parquet(os.path.join(bundle_dir, STOCK_MASTER_FILE))
+
+        self.lookups = {}
+        check_nan_path = os.path.join(bundle_dir, CHECK_NAN_FILE)
+        if os.path.exists(check_nan_path):
+            for name, df in pd.read_parquet(check_nan_path).groupby(LOOKUP_COLUMN, sort=False):
+                self.lookups[name] = df.drop(columns=LOOKUP_COLUMN).reset_index(drop=True)
+
+
+class ReplayIssueDB(object):
+    '''DBClientForIssueStock 대체'''
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def get_daily_issue_stocks(self, day):
+        if day != self.bundle.day:
+            logger.warning(f'replay bundle day {self.bundle.day} != requested {day}')
+        return self.bundle.issue_score.to_dict('records')
+
+
+class ReplayReader(object):
+    '''ClickHouseReader 대체'''
+
+    def __init__(self, bundle):
+        self.bundle = bundle
+
+    def read_financial(self, table_name, cond):
+        m = _LOOKUP_COND.search(cond)
+        if not m:
+            return self.bundle.stock_master.copy()
+        df = self.bundle.lookups.get(m.group(1))
+        if df is None:
+            return self.bundle.stock_master.iloc[0:0]
+        return df.copy()
+
+
+def replay(bundle_dir, repeat=1, lean=None):
+    '''번들 데이터로 fetch/match 를 repeat 번 실행하고 단계별 실행 결과 목록을 반환'''
+
+    bundle = ReplayBundle(bundle_dir)
+    issue_score_processing.set_sources(
+        issue_db=lambda: ReplayIssueDB(bundle),
+        stock_master_reader=lambda: ReplayReader(bundle),
+    )
+
+    runs = []
+    try:
+        for _ in range(repeat):
+            metrics = instrumentation.reset_metrics()
+            issue_score_df = issue_score_processing.get_issue_score(bundle.day)
+            stock_master_df = issue_score_processing.get_stock_master()
+            issue_score_processing.match_issue_score(issue_score_df, stock_master_df, lean=lean)
+            runs.append(metrics.summary())
+    finally:
+        issue_score_processing.set_sources()
+
+    return runs
+
+
+def summarize(runs):
+    '''단계별 실행시간 min/median/max 및 행 수'''
+
+    by_stage = {}
+    for run in runs:
+        for st in run['stages']:
+            agg = by_stage.setdefault(st['stage'], {'seconds': [], 'rows_in': st['rows_in'], 'rows_out': st['rows_out']})
+            agg['seconds'].append(st['seconds'])
+
+    return {
+        name: {
+            'min': min(x['seconds']),
+            'median': statistics.median(x['seconds']),
+            'max': max(x['seconds']),
+            'runs': len(x['seconds']),
+            'rows_in': x['rows_in'],
+            'rows_out': x['rows_out'],
+        } for name, x in by_stage.items()
+    }
+
+
+def print_summary(summary, out=sys.stdout):
+    out.write('%-20s %10s %10s %10s %8s %10s %10s\n' % ('stage', 'min(s)', 'median(s)', 'max(s)', 'runs', 'rows_in', 'rows_out'))
+    for name, x in summary.items():
+        out.write('%-20s %10.4f %10.4f %10.4f %8d %10s %10s\n' % (
+            name, x['min'], x['median'], x['max'], x['runs'], x['rows_in'], x['rows_out']))
+
+
+###########################################################################################################
+# main
+###########################################################################################################
+
+
+if __name__ == '__main__':
+
+    logging.basicConfig(format='%(asctime)s %(levelname)s %(message)s', level=logging.INFO)
+
+    usage = '''
+        usage1: %s record day bundle_base_dir
+        usage2: %s replay bundle_dir [repeat] [--lean] [--json=PATH]
+    ''' % (sys.argv[0], sys.argv[0])
+
+    args = [x for x in sys.argv[1:] if not x.startswith('--')]
+    opts = dict(x[2:].partition('=')[::2] for x in sys.argv[1:] if x.startswith('--'))
+
+    if len(args) == 3 and args[0] == 'record':
+        record(args[1], args[2])
+
+    elif len(args) in (2, 3) and args[0] == 'replay':
+        runs = replay(args[1], repeat=int(args[2]) if len(args) == 3 else 1, lean=True if 'lean' in opts else None)
+        summary = summarize(runs)
+        print_summary(summary)
+        if opts.get('json'):
+            with open(opts['json'], 'w', encoding='utf8') as f:
+                json.dump({'bundle': args[1], 'stages': summary, 'runs': runs}, f, ensure_ascii=False, indent=4)
+
+    else:
+        sys.stderr.write(usage)
+        sys.exit(1)